@@ -5,5 +5,6 @@ pip install -r requirements.txt
 
 python manage.py collectstatic --noinput
 python manage.py migrate
+python manage.py createcachetable
 
 python manage.py createsuperuser --noinput || true
@@ -2,32 +2,65 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
+from django import forms
 from django.contrib.auth.admin import UserAdmin
-from .models import PortalUser, Request, Report, RequestHistory
+from django.contrib.auth.forms import AdminUserCreationForm, UserChangeForm
+from django.core.validators import RegexValidator
+from .auth import make_pin
+from .models import ArchivedRequest, Job, PortalUser, Request, Report, RequestHistory
 
 # ------------------------------------------
 # 1. Register Custom User Model
 # ------------------------------------------
+class PINFormMixin(forms.ModelForm):
+    """Write-only PIN field; only the hash is stored (core/auth.py)."""
+    pin = forms.CharField(
+        label='PIN', required=False, max_length=4, widget=forms.PasswordInput(render_value=False),
+        validators=[RegexValidator(r'^\d{4}$', "Enter exactly 4 digits.")],
+        help_text="Leave blank to keep the current PIN.",
+    )
+
+    def save(self, commit=True):
+        if self.cleaned_data.get('pin'):
+            self.instance.pin_code = make_pin(self.cleaned_data['pin'])
+        return super().save(commit)
+
+
+class PortalUserChangeForm(PINFormMixin, UserChangeForm):
+    pass
+
+
+class PortalUserCreationForm(PINFormMixin, AdminUserCreationForm):
+    class Meta(AdminUserCreationForm.Meta):
+        model = PortalUser
+
+
 @admin.register(PortalUser)
 class PortalUserAdmin(UserAdmin):
     model = PortalUser
-    list_display = ('username', 'full_name', 'email', 'role', 'pin_code', 'is_staff', 'is_active')
+    form = PortalUserChangeForm
+    add_form = PortalUserCreationForm
+    list_display = ('username', 'full_name', 'email', 'role', 'has_pin', 'is_staff', 'is_active')
     list_filter = ('role', 'is_staff', 'is_active')
 
     fieldsets = UserAdmin.fieldsets + (
-        ('Role Information', {'fields': ('role', 'full_name', 'pin_code', 'reading_centre_code')}),
+        ('Role Information', {'fields': ('role', 'full_name', 'pin', 'reading_centre_code')}),
     )
     add_fieldsets = UserAdmin.add_fieldsets + (
-        ('Role Information', {'fields': ('role', 'full_name', 'pin_code', 'reading_centre_code')}),
+        ('Role Information', {'fields': ('role', 'full_name', 'pin', 'reading_centre_code')}),
     )
 
+    @admin.display(boolean=True, description='PIN set')
+    def has_pin(self, obj):
+        return bool(obj.pin_code)
+
 
 # ------------------------------------------
 # 2. Register Request Model
 # ------------------------------------------
 @admin.register(Request)
 class RequestAdmin(admin.ModelAdmin):
-    list_display = ('id', 'timestamp', 'doctor', 'centre_name', 'patient_id', 'on_meds', 'status')
+    list_display = ('id', 'timestamp', 'doctor', 'centre_name', 'patient_id', 'on_meds', 'status', 'completed_at')
     list_filter = ('status', 'centre_name', 'on_meds', 'meds_category')
     search_fields = ('patient_id', 'doctor__full_name')
 
@@ -43,7 +76,7 @@ class ReportAdmin(admin.ModelAdmin):
 
 
 # ------------------------------------------
-# 4. Register RequestHistory Model
+# 4. Register RequestHistory Model (append-only)
 # ------------------------------------------
 @admin.register(RequestHistory)
 class RequestHistoryAdmin(admin.ModelAdmin):
@@ -51,3 +84,32 @@ class RequestHistoryAdmin(admin.ModelAdmin):
     list_filter = ('action', 'timestamp')
     search_fields = ('request__patient_id', 'user__full_name')
     readonly_fields = ('timestamp',)
+
+    def has_change_permission(self, request, obj=None):
+        return False  # append-only (core/history.py)
+
+
+# ------------------------------------------
+# 5. Register Job Model (background queue)
+# ------------------------------------------
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'task')
+    readonly_fields = ('created_at', 'started_at', 'heartbeat_at', 'finished_at', 'locked_by', 'error', 'result')
+
+
+# ------------------------------------------
+# 6. Archived cases (read-only; written by archive_cases)
+# ------------------------------------------
+@admin.register(ArchivedRequest)
+class ArchivedRequestAdmin(admin.ModelAdmin):
+    list_display = ('id', 'timestamp', 'doctor', 'centre_name', 'patient_id', 'completed_at', 'archived_at')
+    list_filter = ('centre_name',)
+    search_fields = ('patient_id', 'doctor__full_name')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
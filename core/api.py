@@ -0,0 +1,300 @@
+# core/api.py
+"""
+Read-only JSON API for the lab queue, reports and case detail.
+
+    GET /api/queue/                  pending cases assigned to the lab tech (oldest first)
+    GET /api/reports/                completed cases (lab) / submitted cases (doctor), newest first
+    GET /api/cases/<pk>/             one case, with its report and recent history
+    POST /api/exports/               queue a CSV export as a background job (202)
+    GET /api/jobs/<pk>/              status of a background job queued by the user
+    GET /perf/stats/                 per-view timing percentiles (staff, core/instrumentation.py)
+
+Query parameters:
+
+* ``fields=id,patient_id,status`` - only these fields (see ``FIELDS``); only
+  their columns are read from the database.
+* ``q`` - same search as the list pages; ``after`` / ``limit`` - keyset paging.
+
+Every response carries an ETag built from ``MAX(updated_at)`` and ``COUNT(*)``
+of the matching rows (one index-only query). A poll with a matching
+``If-None-Match`` gets ``304 Not Modified`` before any row is loaded.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count, F, Max
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import instrumentation, jobs, throttle
+from .models import Job, Request, RequestHistory
+from .pagination import decode_cursor, encode_cursor, keyset_filter
+from .search import filter_search, is_ranked, rank_by_relevance
+
+# API field name -> values() lookup
+FIELDS = {
+    'id': 'id',
+    'patient_id': 'patient_id',
+    'centre_name': 'centre_name',
+    'eye': 'eye',
+    'sample': 'sample',
+    'duration_value': 'duration_value',
+    'duration_unit': 'duration_unit',
+    'impression': 'impression',
+    'stain': 'stain',
+    'status': 'status',
+    'assignment_status': 'assignment_status',
+    'timestamp': 'timestamp',
+    'assigned_date': 'assigned_date',
+    'completed_at': 'completed_at',
+    'updated_at': 'updated_at',
+    'doctor': 'doctor__full_name',
+    'assigned_to': 'assigned_to__full_name',
+    'lab_id': 'report__lab_id',
+    'rc_code': 'report__rc_code',
+    'quality': 'report__quality',
+    'sample_suitability': 'report__sample_suitability',
+    'report_text': 'report__report_text',
+    'comments': 'report__comments',
+    'auth_by': 'report__auth_by',
+}
+QUEUE_FIELDS = ('id', 'patient_id', 'centre_name', 'eye', 'sample', 'stain', 'doctor', 'timestamp')
+REPORT_FIELDS = ('id', 'patient_id', 'centre_name', 'status', 'assigned_to', 'lab_id', 'timestamp', 'completed_at')
+DETAIL_FIELDS = tuple(FIELDS) + ('history',)
+HISTORY_LIMIT = 20
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class BadRequest(Exception):
+    pass
+
+
+def api_view(test=None, methods=('GET', 'HEAD')):
+    """Session-authenticated API view: 401/403 as JSON instead of the login redirect."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return JsonResponse({'error': 'Authentication required'}, status=401)
+            if test and not test(request.user):
+                return JsonResponse({'error': 'Permission denied'}, status=403)
+            if request.method not in methods:
+                return JsonResponse({'error': 'Method not allowed'}, status=405)
+            try:
+                return view(request, *args, **kwargs)
+            except BadRequest as exc:
+                return JsonResponse({'error': str(exc)}, status=400)
+            except Http404:
+                return JsonResponse({'error': 'Not found'}, status=404)
+        return wrapper
+    return decorator
+
+
+def requested_fields(request, default, allowed=FIELDS):
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(default)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def make_etag(request, *parts):
+    """ETag over the path, query string and the data version ``parts``."""
+    digest = hashlib.sha1(request.get_full_path().encode())
+    for part in parts:
+        digest.update(b'\x1f' + str(part).encode())
+    return quote_etag(digest.hexdigest())
+
+
+def json_response(request, payload, etag, last_modified):
+    response = JsonResponse(payload)
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Always revalidate; the ETag makes that cheap
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified(request, etag, last_modified):
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified.timestamp() if last_modified else None
+    )
+    if response is not None:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _row(values, fields):
+    return {name: values[FIELDS[name]] for name in fields}
+
+
+def case_list(request, queryset, default_fields, descending, search_fields):
+    """Keyset-paged list of ``queryset`` with sparse fields and an ETag; searches come back ranked."""
+    fields = requested_fields(request, default_fields)
+    query = request.GET.get('q')
+    if query:
+        queryset = filter_search(queryset, query, fields=search_fields)
+
+    version = queryset.order_by().aggregate(last=Max('updated_at'), count=Count('pk'))
+    etag = make_etag(request, version['last'], version['count'])
+    cached = not_modified(request, etag, version['last'])
+    if cached is not None:
+        return cached
+
+    try:
+        limit = max(1, min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest("limit must be a number")
+    queryset = queryset.order_by(*(('-timestamp', '-id') if descending else ('timestamp', 'id')))
+    if query:
+        queryset = rank_by_relevance(queryset, query, search_fields)
+    # id/timestamp are always read for the cursor
+    lookups = {FIELDS[name] for name in fields} | {'id', 'timestamp'}
+    ranked = is_ranked(queryset)
+    if ranked:
+        # Best matches first; relevance has no stable cursor, so these page by offset
+        try:
+            offset = max(0, int(request.GET.get('offset', 0)))
+        except ValueError:
+            raise BadRequest("offset must be a number")
+        rows = list(queryset.values(*lookups)[offset:offset + limit + 1])
+    else:
+        after = decode_cursor(request.GET.get('after', ''))
+        if after:
+            queryset = queryset.filter(keyset_filter(*after, descending))
+        rows = list(queryset.values(*lookups)[:limit + 1])
+
+    params = request.GET.copy()
+    next_query = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if ranked:
+            params['offset'] = offset + limit
+        else:
+            params['after'] = encode_cursor(rows[-1])
+        next_query = params.urlencode()
+    return json_response(request, {
+        'count': version['count'],
+        'results': [_row(values, fields) for values in rows],
+        'next': f"{request.path}?{next_query}" if next_query else None,
+    }, etag, version['last'])
+
+
+# ==========================================
+# ENDPOINTS
+# ==========================================
+@api_view(lambda u: u.is_lab())
+def queue(request):
+    queryset = Request.objects.filter(assigned_to=request.user, status='Pending')
+    return case_list(request, queryset, QUEUE_FIELDS, descending=False,
+                     search_fields=('patient_id', 'centre_name', 'doctor'))
+
+
+@api_view(lambda u: u.is_doctor() or u.is_lab())
+def reports(request):
+    if request.user.is_doctor():
+        queryset = Request.objects.filter(doctor=request.user)
+        search_fields = ('patient_id', 'centre_name', 'status')
+    else:
+        queryset = Request.objects.filter(assigned_to=request.user, status='Completed')
+        search_fields = ('patient_id', 'centre_name')
+    return case_list(request, queryset, REPORT_FIELDS, descending=True, search_fields=search_fields)
+
+
+@api_view(lambda u: u.is_doctor() or u.is_lab())
+def case_detail(request, pk):
+    fields = requested_fields(request, DETAIL_FIELDS, allowed=DETAIL_FIELDS)
+    owner = Request.objects.filter(pk=pk).values_list('doctor_id', 'updated_at').first()
+    if owner is None or (request.user.is_doctor() and owner[0] != request.user.pk):
+        raise Http404("Case not found")
+
+    last_modified = owner[1]
+    parts = [last_modified]
+    if 'history' in fields:
+        history = RequestHistory.objects.filter(request_id=pk).aggregate(last=Max('timestamp'), count=Count('pk'))
+        parts += [history['last'], history['count']]
+        if history['last'] and history['last'] > last_modified:
+            last_modified = history['last']
+    etag = make_etag(request, *parts)
+    cached = not_modified(request, etag, last_modified)
+    if cached is not None:
+        return cached
+
+    model_fields = [name for name in fields if name != 'history']
+    payload = {}
+    if model_fields:
+        values = Request.objects.filter(pk=pk).values(*{FIELDS[name] for name in model_fields}).get()
+        payload = _row(values, model_fields)
+    if 'history' in fields:
+        payload['history'] = list(
+            RequestHistory.objects.filter(request_id=pk).order_by('-timestamp')
+            .values('action', 'note', 'timestamp', by=F('user__full_name'))[:HISTORY_LIMIT]
+        )
+    return json_response(request, payload, etag, last_modified)
+
+
+# ==========================================
+# BACKGROUND JOBS
+# ==========================================
+def job_payload(job):
+    payload = {
+        'id': job.pk,
+        'task': job.task,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'progress': job.progress,
+        'total': job.total,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'error': job.error.strip().splitlines()[-1] if job.error else None,
+        'result': job.result,
+        'download': None,
+    }
+    if job.status == 'done' and (job.result or {}).get('file'):
+        payload['download'] = reverse('download_job_file', args=[job.pk])
+    return payload
+
+
+@api_view(lambda u: u.is_doctor() or u.is_lab(), methods=('POST',))
+def export_csv(request):
+    job = jobs.enqueue('export_csv', user=request.user, user_id=request.user.pk)
+    status_url = reverse('api_job', args=[job.pk])
+    response = JsonResponse({**job_payload(job), 'status_url': status_url}, status=202)
+    response['Location'] = status_url
+    return response
+
+
+@api_view()
+def job_status(request, pk):
+    lookup = {} if request.user.is_staff else {'created_by': request.user}
+    job = get_object_or_404(Job, pk=pk, **lookup)
+    response = JsonResponse(job_payload(job))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# ==========================================
+# PERFORMANCE (staff)
+# ==========================================
+@api_view(lambda u: u.is_staff)
+def performance_stats(request):
+    """Per-view percentiles from ServerTimingMiddleware (this worker process only) and
+    sign-in outcomes (all workers, from the shared THROTTLE_CACHE)."""
+    response = JsonResponse({
+        'enabled': bool(getattr(settings, 'PERF_INSTRUMENTATION', False)),
+        'views': instrumentation.snapshot(),
+        'login': throttle.metrics(),
+    })
+    patch_cache_control(response, private=True, no_store=True)
+    return response
@@ -0,0 +1,133 @@
+# core/archive.py
+"""
+Hot/cold archival of completed cases.
+
+    python manage.py archive_cases                  # older than ARCHIVE_AFTER_DAYS
+    python manage.py archive_cases --days 180 --batch-size 200 --sleep 0.5
+
+Completed cases whose report was finished more than ``ARCHIVE_AFTER_DAYS``
+ago are copied, with their report and history, into ``ArchivedRequest`` /
+``ArchivedReport`` / ``ArchivedRequestHistory`` and removed from the working
+tables, so the lab queue, report lists, exports and API only ever scan
+recent and pending cases.
+
+Each batch is its own short transaction: pick up to ``batch_size`` ids
+(``SKIP LOCKED`` where supported, so a case being edited is simply left for
+the next run), bulk-insert the copies, delete the originals with one plain
+``DELETE`` per table. The deletes skip the per-row signal handlers; what they would do is done once per batch
+instead (search index, counter cache). Cached PDFs and slide files stay
+where they are - archived rows keep the same ids and file names.
+
+Archived cases are read through ``archived_cases_for()`` and
+``search_archive()``: plain indexed lookups per user plus ``icontains``
+search, which is slower than the working-table search but the archive is
+rarely browsed.
+"""
+import time
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import counters
+from .models import (
+    ArchivedReport, ArchivedRequest, ArchivedRequestHistory, CaseEvent, Report, Request, RequestHistory,
+)
+from .search import unindex_requests
+
+DEFAULT_AFTER_DAYS = 365
+DEFAULT_BATCH_SIZE = 500
+# Every table with a foreign key to Request, deleted before it (a test checks the list)
+CASE_CHILDREN = ((CaseEvent, 'request_id'), (RequestHistory, 'request_id'), (Report, 'request_id'))
+
+
+def cutoff(days=None):
+    """Cases completed before this moment are due for the archive."""
+    if days is None:
+        days = getattr(settings, 'ARCHIVE_AFTER_DAYS', DEFAULT_AFTER_DAYS)
+    return timezone.now() - timedelta(days=days)
+
+
+def due_cases(before):
+    return Request.objects.filter(status='Completed', completed_at__lt=before).order_by('completed_at', 'id')
+
+
+def _copy(row, model):
+    """Unsaved ``model`` instance with the same column values as ``row``."""
+    return model(**{field.attname: getattr(row, field.attname) for field in row._meta.concrete_fields})
+
+
+def archive_batch(before, batch_size=DEFAULT_BATCH_SIZE):
+    """Move up to ``batch_size`` due cases into the archive; returns how many moved."""
+    with transaction.atomic():
+        due = due_cases(before)
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return 0
+
+        cases = list(Request.objects.filter(pk__in=ids))
+        ArchivedRequest.objects.bulk_create([_copy(case, ArchivedRequest) for case in cases])
+        ArchivedReport.objects.bulk_create(
+            [_copy(report, ArchivedReport) for report in Report.objects.filter(request_id__in=ids)]
+        )
+        ArchivedRequestHistory.objects.bulk_create(
+            [_copy(entry, ArchivedRequestHistory) for entry in RequestHistory.objects.filter(request_id__in=ids)]
+        )
+
+        # One plain DELETE per table, children first. QuerySet.delete() would load every
+        # row to send post_delete (search index, PDF cache, counters), which is done once
+        # per batch below instead.
+        with connection.cursor() as cursor:
+            for model, column in (*CASE_CHILDREN, (Request, 'id')):
+                cursor.execute(
+                    f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+                    f'WHERE {connection.ops.quote_name(column)} IN ({", ".join(["%s"] * len(ids))})',
+                    ids,
+                )
+        unindex_requests(ids)
+
+    owners = {user_id for case in cases for user_id in (case.doctor_id, case.assigned_to_id)}
+    counters.invalidate(*owners)
+    return len(ids)
+
+
+def archive_cases(before, batch_size=DEFAULT_BATCH_SIZE, max_batches=None, pause=0.0, progress=None):
+    """Archive due cases batch by batch until none are left; returns the total moved."""
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(before, batch_size)
+        if not moved:
+            break
+        total += moved
+        batches += 1
+        if progress:
+            progress(total)
+        if pause:
+            time.sleep(pause)  # let other writers in between batches
+    return total
+
+
+# ==========================================
+# READING THE ARCHIVE
+# ==========================================
+def archived_cases_for(user):
+    """The archived cases ``user`` may see: submitted ones for doctors, assigned ones for techs."""
+    cases = ArchivedRequest.objects.select_related('report', 'doctor', 'assigned_to')
+    if user.is_doctor():
+        return cases.filter(doctor=user)
+    if user.is_lab():
+        return cases.filter(assigned_to=user)
+    return cases.none()
+
+
+def search_archive(queryset, query):
+    """``icontains`` match on patient id, centre, doctor and report lab id (no search index)."""
+    fields = ('patient_id', 'centre_name', 'doctor__full_name', 'report__lab_id')
+    return queryset.filter(reduce(or_, (Q(**{f'{field}__icontains': query}) for field in fields)))
+
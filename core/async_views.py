@@ -0,0 +1,162 @@
+# core/async_views.py
+"""
+Async variants of the I/O-bound views, used when the site runs under ASGI
+(``SERVER_MODE=asgi``, see gunicorn.conf.py and ``ASYNC_VIEWS`` in settings).
+
+Queries go through the async ORM and downloads/exports stream from async
+iterators, so a slow client holds a coroutine rather than a whole worker.
+Template rendering and the search term resolution stay synchronous and run
+in a thread via ``sync_to_async``.
+
+``case_events`` (the server-sent events stream, see core/events.py) is routed
+in both modes; only under ASGI does it hold the connection open.
+"""
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+
+from . import events
+from .media import aserve_file
+from .models import Report, Request
+from .views import (
+    CSV_CHUNK_SIZE, DOCTOR_CSV_HEADER, LAB_CSV_HEADER, DoctorReportListView, LabQueueListView,
+    LabReportListView, csv_filename, doctor_csv_cases, doctor_csv_row, lab_csv_cases, lab_csv_row, stream_csv,
+)
+
+
+async def _resolve_user(request):
+    """Load the user once so sync code (templates, querysets) never hits the DB for it."""
+    request.user = await request.auser()
+    return request.user
+
+
+# ==========================================
+# LIST VIEWS
+# ==========================================
+async def _render_list(request, view_class, *args, **kwargs):
+    await _resolve_user(request)
+    view = view_class()
+    view.setup(request, *args, **kwargs)
+
+    queryset = await sync_to_async(view.get_queryset)()
+    view.object_list = queryset
+    page = await view.apaginate_keyset(queryset)
+    extra = {}
+    if hasattr(view, 'aget_summary'):
+        extra['summary'] = await view.aget_summary()
+
+    context = await sync_to_async(view.get_context_data)(keyset_page=page, **extra)
+    return await sync_to_async(render)(request, view.template_name, context)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_doctor(), login_url='login')
+async def doctor_reports(request):
+    return await _render_list(request, DoctorReportListView)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_lab(), login_url='login')
+async def lab_queue(request):
+    return await _render_list(request, LabQueueListView)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_lab(), login_url='login')
+async def lab_reports(request):
+    return await _render_list(request, LabReportListView)
+
+
+# ==========================================
+# CSV EXPORT
+# ==========================================
+async def _aiter_rows(queryset, chunk_size):
+    """Async iteration over a server-side cursor, one chunk per thread hop.
+
+    Stands in for ``QuerySet.aiterator()``, which runs the query on the event
+    loop for ``values_list()`` querysets.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)  # lazy: executes in the thread below
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while True:
+        chunk = await next_chunk()
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            break
+
+
+@login_required
+@user_passes_test(lambda u: u.is_doctor(), login_url='login')
+async def export_doctor_csv(request):
+    """Async twin of views.export_doctor_csv."""
+    user = await _resolve_user(request)
+    cases = _aiter_rows(doctor_csv_cases(user), CSV_CHUNK_SIZE)
+    rows = (doctor_csv_row(values) async for values in cases)
+    return stream_csv(csv_filename('doctor_cases'), DOCTOR_CSV_HEADER, rows)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_lab(), login_url='login')
+async def export_lab_csv(request):
+    """Async twin of views.export_lab_csv."""
+    user = await _resolve_user(request)
+    cases = _aiter_rows(lab_csv_cases(user), CSV_CHUNK_SIZE)
+    rows = (lab_csv_row(values) async for values in cases)
+    return stream_csv(csv_filename('lab_cases'), LAB_CSV_HEADER, rows)
+
+
+# ==========================================
+# DOWNLOAD LAB PDF
+# ==========================================
+@login_required
+@user_passes_test(lambda u: u.is_doctor(), login_url='login')
+async def download_lab_pdf(request, pk):
+    """Async twin of views.download_lab_pdf."""
+    user = await _resolve_user(request)
+    case = await aget_object_or_404(Request.objects.select_related('report'), pk=pk, doctor=user,
+                                    status='Completed')
+
+    try:
+        report = case.report
+    except Report.DoesNotExist:
+        messages.error(request, "Report not found for this case.")
+        return redirect('doctor_reports')
+
+    if not report.microbiology_pdf:
+        messages.error(request, "No PDF has been uploaded for this report yet.")
+        return redirect('doctor_reports')
+
+    try:
+        return await aserve_file(request, report.microbiology_pdf.name,
+                                 filename=f"microbio_report_{case.patient_id}.pdf",
+                                 as_attachment=True, content_type='application/pdf')
+    except Http404:
+        messages.error(request, "PDF file not found on server.")
+        return redirect('doctor_reports')
+
+
+# ==========================================
+# LIVE UPDATES (server-sent events)
+# ==========================================
+@login_required
+@user_passes_test(lambda u: u.is_doctor() or u.is_lab(), login_url='login')
+async def case_events(request):
+    """``text/event-stream`` of the user's case events, resuming after ``Last-Event-ID``."""
+    user = await _resolve_user(request)
+    last_id = events.last_event_id(request)
+    if last_id is None:
+        # New page: only what happens from now on
+        last_id = await events.alatest_id(user.pk)
+
+    response = StreamingHttpResponse(events.stream(user.pk, last_id, follow=settings.ASYNC_VIEWS),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Don't let nginx buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,22 +1,80 @@
 # core/auth.py
 """
-Custom authentication backend for PIN + Username login
+Authentication backends: PIN + Username login, and throttled passwords
+
+PINs are stored as ``hmac_sha256$<salt>$<digest>``: an HMAC keyed with
+SECRET_KEY (SECRET_KEY_FALLBACKS are accepted too). A slow password hash
+would not protect a 10,000-value keyspace against offline guessing, while
+the server-side key does, and checking it costs microseconds. Online
+guessing is stopped by core/throttle.py, which both backends consult before
+any database work. ``/login/`` and the admin sign in with passwords through
+``ThrottledModelBackend``, so they share the PIN lockout counters.
 """
-from django.contrib.auth.backends import ModelBackend
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from django.utils.crypto import constant_time_compare, get_random_string, salted_hmac
+
+from . import throttle
+
+PIN_ALGORITHM = 'hmac_sha256'
+
+
+def _pin_digest(raw_pin, salt, secret):
+    return salted_hmac(f'core.auth.pin.{salt}', str(raw_pin), secret=secret, algorithm='sha256').hexdigest()
+
+
+def make_pin(raw_pin):
+    """Encoded form of ``raw_pin`` for ``PortalUser.pin_code``."""
+    salt = get_random_string(12)
+    return f"{PIN_ALGORITHM}${salt}${_pin_digest(raw_pin, salt, settings.SECRET_KEY)}"
+
 
-User = get_user_model()
+def check_pin(raw_pin, encoded):
+    """Whether ``raw_pin`` matches the stored ``encoded`` PIN (False if none is set)."""
+    algorithm, _, rest = (encoded or '').partition('$')
+    salt, _, digest = rest.partition('$')
+    if algorithm != PIN_ALGORITHM or not digest:
+        return False
+    secrets = [settings.SECRET_KEY, *getattr(settings, 'SECRET_KEY_FALLBACKS', [])]
+    return any(constant_time_compare(_pin_digest(raw_pin, salt, secret), digest) for secret in secrets)
+
+
+def _check_not_locked(request, username):
+    if throttle.retry_after(request, username):
+        throttle.record('throttled')
+        raise PermissionDenied  # stops authenticate() trying the other backends
+
+
+def _register(request, username, user):
+    if user is None:
+        throttle.register_failure(request, username)
+    else:
+        throttle.register_success(request, username)
+    return user
 
 
 class PINAuthBackend(ModelBackend):
     """Custom backend for PIN-based authentication."""
-    
+
     def authenticate(self, request, username=None, pin=None, **kwargs):
         """Authenticate using username and 4-digit PIN."""
-        try:
-            user = User.objects.get(username=username)
-            if user.pin_code == str(pin) and user.is_active:
-                return user
-        except User.DoesNotExist:
+        if username is None or pin is None:
+            return None
+        _check_not_locked(request, username)
+
+        user = get_user_model()._default_manager.filter(username=username).first()
+        if user is None or not check_pin(pin, user.pin_code) or not self.user_can_authenticate(user):
+            user = None
+        return _register(request, username, user)
+
+
+class ThrottledModelBackend(ModelBackend):
+    """Django's username + password backend behind the same lockout as PINs."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None or password is None:
             return None
-        return None
+        _check_not_locked(request, username)
+        return _register(request, username, super().authenticate(request, username, password, **kwargs))
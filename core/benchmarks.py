@@ -0,0 +1,215 @@
+# core/benchmarks.py
+"""
+Request scenarios covering the URLs in core/urls.py, run in-process.
+
+Shared by the ``benchmark_views`` command (timings at production-like sizes)
+and the query-budget tests (query counts at two small sizes). Scenarios
+work on the data set from core/seeding.py: ``build_context()`` picks the
+benchmark doctor and tech plus a few cases in the states the scenarios
+need, and ``run_scenario()`` requests one scenario with the test client,
+consumes the whole body (streams included) and counts SQL queries.
+
+Scenarios that write (submit, assign, complete, ...) run inside a
+transaction that is rolled back, so every run sees the same data.
+"""
+import statistics
+import time
+from io import BytesIO
+
+from asgiref.sync import async_to_sync
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+
+from . import pdf_cache
+from .models import PortalUser, Request
+from .seeding import DOCTOR_PREFIX, TECH_PREFIX, bench_requests
+
+# URL names in core/urls.py without a scenario, and why
+SKIPPED = {
+    'root_redirect': "redirect only",
+    'login': "auth form",
+    'logout': "auth",
+    'download_lab_pdf': "synthetic cases have no uploaded lab PDF",
+    'download_job_file': "needs a finished background job",
+    'api_job': "needs a background job",
+    'performance_stats': "staff diagnostics",
+    'archive_report_pdf': "needs archived cases (run archive_cases on the seeded data)",
+}
+
+
+def tiny_png():
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new('RGB', (8, 8), 'purple').save(buf, 'PNG')
+    return SimpleUploadedFile('bench.png', buf.getvalue(), content_type='image/png')
+
+
+def sample_data(prefix='', **extra):
+    data = {
+        f'{prefix}patient_id': 'BENCH-SUBMIT', f'{prefix}centre_name': 'North Eye Clinic', f'{prefix}eye': 'OD',
+        f'{prefix}sample': 'Corneal Scraping', f'{prefix}duration_value': 3, f'{prefix}duration_unit': 'Days',
+        f'{prefix}impression': 'Fungal', f'{prefix}stain': 'Grams', f'{prefix}image': tiny_png(),
+    }
+    data.update(extra)
+    return data
+
+
+def batch_data(count=10):
+    data = {'samples-TOTAL_FORMS': count, 'samples-INITIAL_FORMS': 0, 'samples-MIN_NUM_FORMS': 0,
+            'samples-MAX_NUM_FORMS': 1000}
+    for i in range(count):
+        data.update(sample_data(f'samples-{i}-', **{f'samples-{i}-patient_id': f'BENCH-BATCH-{i}'}))
+    return data
+
+
+REPORT_DATA = {'rc_code': 'RC', 'lab_id': 'BENCH', 'quality': 'Good', 'sample_suitability': 'on',
+               'report_text': 'Benchmark report', 'auth_by': 'Bench'}
+
+
+class Scenario:
+    def __init__(self, name, url_name, role, method='get', args=None, params=None, data=None, writes=False,
+                 before=None):
+        self.name, self.url_name, self.role, self.method = name, url_name, role, method
+        self.args, self.params, self.data, self.writes, self.before = args, params, data, writes, before
+
+
+def _invalidate_pdf(ctx):
+    pdf_cache.invalidate(ctx['completed'].pk)
+
+
+SCENARIOS = [
+    Scenario('dashboard', 'dashboard', 'doctor'),
+    Scenario('doctor_submit', 'doctor_submit', 'doctor'),
+    Scenario('doctor_submit POST', 'doctor_submit', 'doctor', 'post', data=lambda ctx: sample_data(), writes=True),
+    Scenario('doctor_batch_submit POST x10', 'doctor_batch_submit', 'doctor', 'post', data=lambda ctx: batch_data(),
+             writes=True),
+    Scenario('doctor_reports', 'doctor_reports', 'doctor'),
+    Scenario('doctor_reports ?q=', 'doctor_reports', 'doctor', params={'q': 'north'}),
+    Scenario('export_doctor_csv', 'export_doctor_csv', 'doctor'),
+    Scenario('generate_report_pdf (cold)', 'generate_report_pdf', 'doctor', args=lambda ctx: [ctx['completed'].pk],
+             before=_invalidate_pdf),
+    Scenario('generate_report_pdf (cached)', 'generate_report_pdf', 'doctor', args=lambda ctx: [ctx['completed'].pk]),
+    Scenario('serve_slide', 'serve_slide', 'doctor', args=lambda ctx: [ctx['completed'].pk]),
+    Scenario('serve_slide_variant', 'serve_slide_variant', 'doctor', args=lambda ctx: [ctx['completed'].pk, 'thumbnail']),
+    Scenario('lab_queue', 'lab_queue', 'tech'),
+    Scenario('lab_queue ?q=', 'lab_queue', 'tech', params={'q': 'north'}),
+    Scenario('lab_reports', 'lab_reports', 'tech'),
+    Scenario('lab_reports ?q=', 'lab_reports', 'tech', params={'q': 'north'}),
+    Scenario('lab_process', 'lab_process', 'tech', args=lambda ctx: [ctx['pending'].pk]),
+    Scenario('lab_process POST', 'lab_process', 'tech', 'post', args=lambda ctx: [ctx['pending'].pk],
+             data=lambda ctx: dict(REPORT_DATA), writes=True),
+    Scenario('assign_case POST', 'assign_case', 'tech', 'post', args=lambda ctx: [ctx['unassigned'].pk], writes=True),
+    Scenario('export_lab_csv', 'export_lab_csv', 'tech'),
+    Scenario('lab_report_export', 'lab_report_export', 'tech'),
+    Scenario('api_queue', 'api_queue', 'tech'),
+    Scenario('api_reports', 'api_reports', 'doctor'),
+    Scenario('api_case', 'api_case', 'doctor', args=lambda ctx: [ctx['completed'].pk]),
+    Scenario('api_export_csv POST', 'api_export_csv', 'doctor', 'post', writes=True),
+    Scenario('case_events', 'case_events', 'tech', params={'last_event_id': 0}),
+    Scenario('case_archive', 'case_archive', 'doctor'),
+    Scenario('case_archive ?q=', 'case_archive', 'doctor', params={'q': 'north'}),
+    Scenario('export_archive_csv', 'export_archive_csv', 'tech'),
+]
+
+
+def uncovered_url_names():
+    """Named routes in core/urls.py with neither a scenario nor a SKIPPED entry."""
+    from .urls import urlpatterns
+
+    names = {pattern.name for pattern in urlpatterns if pattern.name}
+    return sorted(names - {s.url_name for s in SCENARIOS} - set(SKIPPED))
+
+
+def build_context():
+    """The users and cases scenarios refer to; raises ValueError if the data set is too small."""
+    doctor = PortalUser.objects.filter(username__startswith=DOCTOR_PREFIX).order_by('username').first()
+    tech = PortalUser.objects.filter(username__startswith=TECH_PREFIX).order_by('username').first()
+    if doctor is None or tech is None:
+        raise ValueError("No benchmark users; seed the data set first")
+    cases = bench_requests().order_by('pk')
+    ctx = {
+        'doctor': doctor,
+        'tech': tech,
+        'completed': cases.filter(doctor=doctor, status='Completed').first(),
+        'pending': cases.filter(assigned_to=tech, status='Pending').first(),
+        'unassigned': cases.filter(status='Pending', assignment_status='Unassigned').first(),
+    }
+    if None in ctx.values():
+        raise ValueError("Data set too small for every scenario; seed at least 100 requests")
+    return ctx
+
+
+async def _aconsume(stream):
+    return sum([len(chunk) async for chunk in stream])
+
+
+def _fetch(client, scenario, url, data):
+    start = time.perf_counter()
+    if scenario.method == 'post':
+        response = client.post(url, data or {})
+    else:
+        response = client.get(url, scenario.params or {})
+    if response.streaming and response.is_async:
+        size = async_to_sync(_aconsume)(response.streaming_content)
+    elif response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return (time.perf_counter() - start) * 1000, response, size
+
+
+def _discard_uploads(last_pk):
+    """Delete slide files written by a submit that is about to be rolled back."""
+    created = Request.objects.filter(pk__gt=last_pk or 0).exclude(image='')
+    for name in created.values_list('image', flat=True):
+        default_storage.delete(name)
+
+
+def run_scenario(scenario, ctx, repeat=5):
+    """Run ``scenario`` once to warm up, then ``repeat`` timed times; returns a result dict."""
+    client = Client()
+    client.force_login(ctx[scenario.role])
+    url = reverse(scenario.url_name, args=scenario.args(ctx) if scenario.args else None)
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries[-1] += 1
+        return execute(sql, params, many, context)
+
+    timings = []
+    for run in range(repeat + 1):
+        if scenario.before:
+            scenario.before(ctx)
+        data = scenario.data(ctx) if scenario.data else None
+        queries.append(0)
+        with connection.execute_wrapper(count):
+            if scenario.writes:
+                with transaction.atomic():
+                    last_pk = Request.objects.order_by('-pk').values_list('pk', flat=True).first()
+                    elapsed, response, size = _fetch(client, scenario, url, data)
+                    _discard_uploads(last_pk)
+                    transaction.set_rollback(True)
+            else:
+                elapsed, response, size = _fetch(client, scenario, url, data)
+        if run:
+            timings.append(elapsed)
+
+    timings.sort()
+    cuts = statistics.quantiles(timings, n=20, method='inclusive') if len(timings) > 1 else timings * 19
+    return {
+        'scenario': scenario.name,
+        'url': url + (f"?{'&'.join(f'{k}={v}' for k, v in scenario.params.items())}" if scenario.params else ''),
+        'status': response.status_code,
+        'runs': len(timings),
+        'min_ms': round(timings[0], 2),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(cuts[18], 2),
+        'max_ms': round(timings[-1], 2),
+        # for writes this includes the savepoint and the last-pk lookup
+        'queries': max(queries[1:]),
+        'bytes': size,
+    }
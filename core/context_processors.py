@@ -0,0 +1,10 @@
+# core/context_processors.py
+
+from django.utils.functional import SimpleLazyObject
+
+from .counters import user_counts
+
+
+def case_counts(request):
+    """``case_counts`` for the nav menus; only looked up if a template uses it."""
+    return {'case_counts': SimpleLazyObject(lambda: user_counts(request.user))}
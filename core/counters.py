@@ -0,0 +1,85 @@
+# core/counters.py
+"""
+Per-user case counters for toolbars, list headers and the nav menu.
+
+``user_counts(user)`` returns ``{'total', 'pending', 'completed', 'assigned'}``
+over the user's cases (submitted ones for doctors, assigned ones for lab
+techs), computed with a single aggregate query and then kept in Django's
+cache. The signal handlers in ``core/signals.py`` drop a user's entry
+whenever one of their cases is saved or deleted, so the common path costs no
+SQL at all.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Request
+
+CACHE_VERSION = 1
+EMPTY = {'total': 0, 'pending': 0, 'completed': 0, 'assigned': 0}
+
+
+def cache_key(user_id):
+    return f"core:counters:v{CACHE_VERSION}:{user_id}"
+
+
+def _timeout():
+    return getattr(settings, 'COUNTER_CACHE_TIMEOUT', 300)
+
+
+def _scope(user):
+    """Queryset of the cases ``user`` counts, or None if the role has none."""
+    if user.is_doctor():
+        return Request.objects.filter(doctor=user)
+    if user.is_lab():
+        return Request.objects.filter(assigned_to=user)
+    return None
+
+
+def _aggregates():
+    return {
+        'total': Count('pk'),
+        'pending': Count('pk', filter=Q(status='Pending')),
+        'completed': Count('pk', filter=Q(status='Completed')),
+        'assigned': Count('pk', filter=Q(status='Pending', assignment_status='Assigned')),
+    }
+
+
+def user_counts(user):
+    """Cached counters for ``user``."""
+    if not user.is_authenticated:
+        return dict(EMPTY)
+    key = cache_key(user.pk)
+    counts = cache.get(key)
+    if counts is None:
+        scope = _scope(user)
+        counts = scope.aggregate(**_aggregates()) if scope is not None else dict(EMPTY)
+        cache.set(key, counts, _timeout())
+    return counts
+
+
+async def auser_counts(user):
+    """``user_counts`` for async views."""
+    if not user.is_authenticated:
+        return dict(EMPTY)
+    key = cache_key(user.pk)
+    counts = await cache.aget(key)
+    if counts is None:
+        scope = _scope(user)
+        counts = await scope.aaggregate(**_aggregates()) if scope is not None else dict(EMPTY)
+        await cache.aset(key, counts, _timeout())
+    return counts
+
+
+def invalidate(*user_ids):
+    """Forget the counters of ``user_ids``.
+
+    Runs immediately and again on commit, so a request that reads the old
+    rows before the writing transaction commits cannot re-cache stale counts.
+    """
+    keys = [cache_key(pk) for pk in set(user_ids) if pk is not None]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,209 @@
+# core/events.py
+"""
+Live case updates pushed to open pages as server-sent events.
+
+The views that write ``RequestHistory`` also ``publish()`` a ``CaseEvent``
+for whoever should hear about it:
+
+* ``assigned``     - a case landed in a lab tech's queue (tech)
+* ``completed``    - the lab finished the report (doctor)
+* ``pdf_uploaded`` - the report came with a microbiology PDF (doctor)
+
+Events are rows, so any worker can serve any user's stream and a reconnecting
+browser resumes from its ``Last-Event-ID``. On commit, ``broker`` wakes the
+streams held by this process at once; streams in other worker processes pick
+the row up on their next poll (``EVENTS_POLL_INTERVAL`` seconds, which is also
+the keep-alive period).
+
+Under WSGI the stream is not held open: each request returns what is pending
+and tells the browser to reconnect after ``EVENTS_POLL_INTERVAL``. Under ASGI
+an open stream closes its database connection between polls, and past
+``EVENTS_MAX_STREAMS`` open streams per process new ones get the WSGI
+behaviour, so open tabs cannot exhaust the thread pool or the database.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Max
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import CaseEvent
+
+# Reconnect delay the browser uses after a dropped (ASGI) stream
+RECONNECT_MS = 3000
+BATCH_SIZE = 100
+
+# Where each kind of event links to
+EVENT_URLS = {
+    'assigned': 'lab_process',
+    'completed': 'generate_report_pdf',
+    'pdf_uploaded': 'download_lab_pdf',
+}
+
+
+def _poll_interval():
+    return getattr(settings, 'EVENTS_POLL_INTERVAL', 15)
+
+
+def _max_streams():
+    return getattr(settings, 'EVENTS_MAX_STREAMS', 100)
+
+
+# ==========================================
+# IN-PROCESS BROKER
+# ==========================================
+class Broker:
+    """Wakes the event streams of this process when one of their users gets an event."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = defaultdict(set)  # user id -> {(loop, asyncio.Event)}
+
+    def subscribe(self, user_id):
+        """A waiter for ``user_id``'s events, or None when ``EVENTS_MAX_STREAMS`` are already open."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if sum(len(waiters) for waiters in self._waiters.values()) >= _max_streams():
+                return None
+            self._waiters[user_id].add(waiter)
+        return waiter
+
+    def unsubscribe(self, user_id, waiter):
+        with self._lock:
+            waiters = self._waiters.get(user_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[user_id]
+
+    def notify(self, user_ids):
+        """Safe to call from any thread (sync views run outside the event loop)."""
+        with self._lock:
+            waiters = [waiter for pk in set(user_ids) for waiter in self._waiters.get(pk, ())]
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed; its stream is gone
+
+
+broker = Broker()
+
+
+# ==========================================
+# PUBLISHING
+# ==========================================
+def case_event(kind, case, recipient_id):
+    """Unsaved ``CaseEvent`` for ``case``; the payload is what the page needs to update itself."""
+    return CaseEvent(
+        recipient_id=recipient_id,
+        request_id=case.pk,
+        kind=kind,
+        payload={
+            'id': case.pk,
+            'patient_id': case.patient_id,
+            'centre_name': case.centre_name,
+            'status': case.status,
+            'url': reverse(EVENT_URLS[kind], args=[case.pk]),
+        },
+    )
+
+
+def publish(*events):
+    """Store ``events`` (in the caller's transaction) and wake their recipients on commit."""
+    events = [event for event in events if event.recipient_id is not None]
+    if not events:
+        return
+    CaseEvent.objects.bulk_create(events)
+    recipients = {event.recipient_id for event in events}
+    transaction.on_commit(lambda: broker.notify(recipients))
+
+
+def prune(days=None):
+    """Delete events older than ``days`` (default ``EVENTS_RETENTION_DAYS``); returns the count."""
+    if days is None:
+        days = getattr(settings, 'EVENTS_RETENTION_DAYS', 7)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = CaseEvent.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+# ==========================================
+# STREAMING
+# ==========================================
+def _release_connection():
+    """Close this thread's DB connection while the stream waits.
+
+    Async ORM calls run in the request's own thread, so an open stream would
+    otherwise hold a connection (CONN_MAX_AGE) for as long as the tab stays
+    open. Inside a transaction (tests) the connection is left alone.
+    """
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def last_event_id(request):
+    """The id the browser has seen, from ``Last-Event-ID`` (or ``?last_event_id=``)."""
+    raw = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+async def alatest_id(user_id):
+    result = await CaseEvent.objects.filter(recipient_id=user_id).aaggregate(last=Max('id'))
+    return result['last'] or 0
+
+
+def format_event(pk, kind, payload):
+    data = json.dumps(payload, cls=DjangoJSONEncoder)
+    return f"id: {pk}\nevent: {kind}\ndata: {data}\n\n"
+
+
+async def stream(user_id, last_id, follow=True):
+    """SSE text for ``user_id``'s events after ``last_id``.
+
+    With ``follow`` (and a free stream slot) the generator never ends: it waits
+    for the broker (or the poll interval) and sends a keep-alive comment when
+    nothing happened.
+    """
+    interval = _poll_interval()
+    # Past EVENTS_MAX_STREAMS open streams, answer like WSGI: pending events, then reconnect later
+    waiter = broker.subscribe(user_id) if follow else None
+    retry_ms = RECONNECT_MS if waiter is not None else int(interval * 1000)
+    try:
+        # An id-only message sets the browser's Last-Event-ID even before any event
+        yield f"retry: {retry_ms}\nid: {last_id}\n\n"
+
+        while True:
+            if waiter is not None:
+                waiter[1].clear()
+            while True:
+                rows = [
+                    row async for row in CaseEvent.objects.filter(recipient_id=user_id, id__gt=last_id)
+                    .order_by('id').values_list('id', 'kind', 'payload')[:BATCH_SIZE]
+                ]
+                for pk, kind, payload in rows:
+                    last_id = pk
+                    yield format_event(pk, kind, payload)
+                if len(rows) < BATCH_SIZE:
+                    break
+            if waiter is None:
+                return
+            await sync_to_async(_release_connection)()
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout=interval)
+            except TimeoutError:
+                yield ": keep-alive\n\n"
+    finally:
+        if waiter is not None:
+            broker.unsubscribe(user_id, waiter)
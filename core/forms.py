@@ -33,7 +33,7 @@ class DoctorRequestForm(forms.ModelForm):
     
     class Meta:
         model = Request
-        exclude = ('doctor', 'timestamp', 'status', 'assignment_status', 'assigned_date')
+        exclude = ('doctor', 'timestamp', 'status', 'assignment_status', 'assigned_date', 'completed_at')
         labels = {
             'patient_id': 'Patient ID',
             'centre_name': 'Clinic/Centre Name',
@@ -82,6 +82,63 @@ class DoctorRequestForm(forms.ModelForm):
             Submit('submit', '📤 Submit for Lab Analysis', css_class='btn-primary mt-4')
         )
 
+# ==========================================
+# DOCTOR BATCH SUBMISSION
+# ==========================================
+BATCH_MAX_SAMPLES = 50
+
+
+class BatchSampleForm(DoctorRequestForm):
+    """One sample of a batch; the tech is chosen once for the whole batch."""
+    assigned_to = None
+
+    class Meta(DoctorRequestForm.Meta):
+        # Dropping the declared field alone lets ModelForm rebuild it from the model
+        exclude = DoctorRequestForm.Meta.exclude + ('assigned_to',)
+
+
+class BatchOptionsForm(forms.Form):
+    assigned_to = forms.ModelChoiceField(
+        queryset=PortalUser.objects.filter(role='Lab', is_active=True).order_by('full_name'),
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label='Assign all samples to (or Auto-Assign)',
+        empty_label="--- Auto-Assign across the least busy techs ---"
+    )
+
+
+class BaseBatchSampleFormSet(forms.BaseModelFormSet):
+    def clean(self):
+        super().clean()
+        if any(self.errors):
+            return
+        seen = set()
+        filled = 0
+        for form in self.forms:
+            if not form.has_changed():
+                continue
+            filled += 1
+            key = (form.cleaned_data.get('patient_id'), form.cleaned_data.get('eye'), form.cleaned_data.get('sample'))
+            if key in seen:
+                raise forms.ValidationError(
+                    f"Patient {key[0]} has the same eye and sample type twice in this batch."
+                )
+            seen.add(key)
+        if not filled:
+            raise forms.ValidationError("Add at least one sample.")
+
+
+BatchSampleFormSet = forms.modelformset_factory(
+    Request,
+    form=BatchSampleForm,
+    formset=BaseBatchSampleFormSet,
+    extra=5,
+    max_num=BATCH_MAX_SAMPLES,
+    validate_max=True,
+    absolute_max=BATCH_MAX_SAMPLES,
+)
+
+
 # ==========================================
 # LAB FORM (Phase 4)
 # ==========================================
@@ -131,4 +188,43 @@ class LabReportForm(forms.ModelForm):
     def save(self, commit=True):
         # Default save behavior for lab report
         instance = super().save(commit=commit)
-        return instance
\ No newline at end of file
+        return instance
+
+# ==========================================
+# BATCH PDF EXPORT (core/pdf_export.py)
+# ==========================================
+class ReportExportForm(forms.Form):
+    date_from = forms.DateField(required=False, label='Completed from',
+                                widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    date_to = forms.DateField(required=False, label='Completed to',
+                              widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    centre_name = forms.CharField(required=False, max_length=200, label='Centre',
+                                  widget=forms.TextInput(attrs={'class': 'form-control'}))
+    doctor = forms.ModelChoiceField(
+        queryset=PortalUser.objects.filter(role='Doctor').order_by('full_name'),
+        required=False, empty_label='--- Any doctor ---',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    tech = forms.ModelChoiceField(
+        queryset=PortalUser.objects.filter(role='Lab').order_by('full_name'),
+        required=False, empty_label='--- Any lab tech ---', label='Lab tech',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        date_from, date_to = cleaned.get('date_from'), cleaned.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError("The start date must not be after the end date.")
+        return cleaned
+
+    def job_filters(self):
+        """The cleaned filters as JSON-friendly job kwargs."""
+        data = self.cleaned_data
+        return {
+            'date_from': data['date_from'].isoformat() if data['date_from'] else None,
+            'date_to': data['date_to'].isoformat() if data['date_to'] else None,
+            'centre_name': data['centre_name'] or None,
+            'doctor_id': data['doctor'].pk if data['doctor'] else None,
+            'tech_id': data['tech'].pk if data['tech'] else None,
+        }
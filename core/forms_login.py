@@ -1,8 +1,12 @@
 # core/forms_login.py
 """
-Custom login form for PIN-based authentication
+Login forms: PIN-based, and the password form behind ``/login/``
 """
 from django import forms
+from django.contrib.auth import authenticate
+from django.contrib.auth.forms import AuthenticationForm
+
+from . import throttle
 from .models import PortalUser
 
 
@@ -27,8 +31,10 @@ class PINLoginForm(forms.Form):
         })
     )
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, request=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.request = request
+        self.user_cache = None
         # Dynamically fetch active users for the dropdown
         active_users = PortalUser.objects.filter(is_active=True).order_by('full_name')
         self.fields['username'].choices = [
@@ -42,11 +48,29 @@ class PINLoginForm(forms.Form):
         pin = cleaned_data.get('pin')
         
         if username and pin:
-            try:
-                user = PortalUser.objects.get(username=username, is_active=True)
-                if user.pin_code != str(pin):
-                    raise forms.ValidationError("Invalid PIN. Please try again.")
-            except PortalUser.DoesNotExist:
-                raise forms.ValidationError("User not found.")
+            # Throttled and checked by core.auth.PINAuthBackend
+            self.user_cache = authenticate(self.request, username=username, pin=pin)
+            if self.user_cache is None:
+                wait = throttle.retry_after(self.request, username)
+                if wait:
+                    raise forms.ValidationError(f"Too many attempts. Try again in {wait} seconds.")
+                raise forms.ValidationError("Invalid PIN. Please try again.")
         
         return cleaned_data
+
+    def get_user(self):
+        return self.user_cache
+
+
+class ThrottledAuthenticationForm(AuthenticationForm):
+    """Password login form that says when the account or client is locked out."""
+
+    def clean(self):
+        try:
+            return super().clean()
+        except forms.ValidationError:
+            # Throttled and checked by core.auth.ThrottledModelBackend
+            wait = throttle.retry_after(self.request, self.cleaned_data.get('username'))
+            if wait:
+                raise forms.ValidationError(f"Too many attempts. Try again in {wait} seconds.", code='throttled')
+            raise
@@ -0,0 +1,222 @@
+# core/history.py
+"""
+Case history: an append-only log, written in batches, pruned by month.
+
+Views record workflow steps inside ``writing()``, which is a
+``transaction.atomic()`` block that collects the block's ``record()`` calls
+and inserts them with one ``bulk_create`` just before the block ends:
+
+    with history.writing():
+        assign_to_tech(case, tech)
+        history.record(case, user, 'Assigned', f"Assigned to {tech.full_name}")
+
+The entries commit or roll back with the change they describe. Nested
+``writing()`` blocks join the outer one; entries recorded in a nested block
+that raises are dropped with its savepoint. ``record()`` outside a block
+inserts straight away (in whatever transaction is open).
+
+Entries are never updated (``RequestHistory.save()`` refuses) and are read
+only as "latest N per request", served by ``reqhist_request_ts_idx``.
+
+On PostgreSQL, migration 0019 turns ``core_requesthistory`` into a table
+range-partitioned by month on ``timestamp`` (``core_requesthistory_YYYYMM``
+plus a ``_default`` partition for anything outside them).
+``ensure_partitions()`` creates the coming months' partitions and moves rows
+that landed in the default one; ``prune()`` drops whole months past the
+retention period instead of deleting row by row. Other databases keep the
+single table and get batched deletes. ``compact_history`` runs all of it.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Request, RequestHistory
+
+TABLE = RequestHistory._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+DEFAULT_MONTHS_AHEAD = 3
+DEFAULT_BATCH_SIZE = 5000
+
+_buffer = ContextVar('core_history_buffer', default=None)
+
+
+# ==========================================
+# BUFFERED WRITES
+# ==========================================
+def record(case, user, action, note=''):
+    """Log ``action`` on ``case``; inside ``writing()`` the insert waits for the end of the block."""
+    entry = RequestHistory(request=case, user=user, action=action, note=note)
+    buffer = _buffer.get()
+    if buffer is None:
+        entry.save()
+    else:
+        buffer.append(entry)
+    return entry
+
+
+@contextmanager
+def writing():
+    """Atomic block whose ``record()`` entries are inserted together, before it commits."""
+    buffer = _buffer.get()
+    if buffer is not None:
+        mark = len(buffer)
+        try:
+            with transaction.atomic():
+                yield
+        except BaseException:
+            del buffer[mark:]  # rolled back with the savepoint
+            raise
+        return
+
+    token = _buffer.set([])
+    try:
+        with transaction.atomic():
+            yield
+            entries = _buffer.get()
+            if entries:
+                RequestHistory.objects.bulk_create(entries)
+    finally:
+        _buffer.reset(token)
+
+
+# ==========================================
+# MONTHLY PARTITIONS (PostgreSQL)
+# ==========================================
+def month_start(moment):
+    """First instant (UTC) of the month ``moment`` falls in."""
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(start, months):
+    index = start.year * 12 + start.month - 1 + months
+    return start.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(start):
+    return f'{TABLE}_{start:%Y%m}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions():
+    """Month start of each monthly partition, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class parent ON parent.oid = i.inhparent WHERE parent.relname = %s",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f'{TABLE}_'
+    return sorted(
+        datetime.strptime(name[len(prefix):], '%Y%m').replace(tzinfo=dt_timezone.utc)
+        for name in names if name != DEFAULT_PARTITION
+    )
+
+
+def _bound(moment):
+    return f"'{moment:%Y-%m-%d %H:%M:%S}+00'"
+
+
+def create_partition(start):
+    """Add the partition for the month at ``start``, moving its rows out of the default partition."""
+    name, end = partition_name(start), add_months(start, 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} '
+                       f'WHERE "timestamp" >= %s AND "timestamp" < %s', [start, end])
+        cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s', [start, end])
+        cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} '
+                       f'FOR VALUES FROM ({_bound(start)}) TO ({_bound(end)})')
+
+
+def ensure_partitions(months_ahead=None, now=None):
+    """Create missing partitions for this month, the next ``months_ahead`` and any month
+    with rows in the default partition. Returns the months created; no-op unless partitioned."""
+    if not is_partitioned():
+        return []
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'HISTORY_PARTITIONS_AHEAD', DEFAULT_MONTHS_AHEAD)
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    wanted = {add_months(current, i) for i in range(months_ahead + 1)}
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', \"timestamp\" AT TIME ZONE 'UTC') "
+                       f"FROM {DEFAULT_PARTITION}")
+        wanted.update(row[0].replace(tzinfo=dt_timezone.utc) for row in cursor.fetchall())
+    missing = sorted(wanted - set(partitions()))
+    for start in missing:
+        create_partition(start)
+    return missing
+
+
+# ==========================================
+# RETENTION AND COMPACTION
+# ==========================================
+def _delete_ids(ids, batch_size):
+    # Nothing references history entries and no signals listen to them, so
+    # delete() takes Django's fast path: one DELETE per chunk, no rows loaded
+    deleted = 0
+    for offset in range(0, len(ids), batch_size):
+        chunk = ids[offset:offset + batch_size]
+        with transaction.atomic():
+            count, _ = RequestHistory.objects.filter(pk__in=chunk).delete()
+            deleted += count
+    return deleted
+
+
+def prune(before, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete entries older than ``before``; whole months go as ``DROP TABLE`` where partitioned."""
+    deleted = 0
+    if is_partitioned():
+        for start in partitions():
+            if add_months(start, 1) > before:
+                break
+            name = partition_name(start)
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'SELECT count(*) FROM {name}')
+                deleted += cursor.fetchone()[0]
+                cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+    while True:
+        ids = list(RequestHistory.objects.filter(timestamp__lt=before).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += _delete_ids(ids, batch_size)
+
+
+def compact(keep_latest, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete all but the newest ``keep_latest`` entries of each request (the only ones ever shown).
+
+    Works through ``batch_size`` requests at a time, so neither the ranking
+    nor the ids to delete ever cover the whole table.
+    """
+    deleted = 0
+    last_request = 0
+    while True:
+        request_ids = list(
+            Request.objects.filter(pk__gt=last_request).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not request_ids:
+            return deleted
+        last_request = request_ids[-1]
+        ranked = RequestHistory.objects.filter(request_id__in=request_ids).annotate(
+            row_number=Window(RowNumber(), partition_by=F('request'),
+                              order_by=[F('timestamp').desc(), F('pk').desc()])
+        )
+        deleted += _delete_ids(list(ranked.filter(row_number__gt=keep_latest).values_list('pk', flat=True)),
+                               batch_size)
@@ -0,0 +1,84 @@
+# core/hooks.py
+"""
+Plumbing shared by the per-request checks in core/instrumentation.py and
+core/nplusone.py.
+
+``add_execute_wrapper()`` puts a ``connection.execute_wrapper`` on every
+database connection of the process: the ones already open, each new one
+(``connection_created``), and, at the start of every request, the ones of
+the thread serving it. Connections are per thread, so that last step is
+what catches the queries async views push to ``sync_to_async`` threads.
+
+``RequestScopeMiddleware`` is the sync/async-capable middleware both
+build on: each request runs inside the context manager returned by
+``scope()``, and ``finish()`` may then amend the response.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_execute_wrappers = []
+
+
+# ==========================================
+# SQL HOOKS
+# ==========================================
+def _install_wrappers(connection, **kwargs):
+    for wrapper in _execute_wrappers:
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+
+def _install_on_open_connections(**kwargs):
+    """Connections are per thread; request_started runs in the thread the request's ORM calls use."""
+    for connection in connections.all(initialized_only=True):
+        _install_wrappers(connection)
+
+
+def add_execute_wrapper(wrapper):
+    """Run ``wrapper`` around every query, on all connections present and future. Idempotent."""
+    if wrapper not in _execute_wrappers:
+        _execute_wrappers.append(wrapper)
+    connection_created.connect(_install_wrappers, dispatch_uid='core_hooks_sql')
+    request_started.connect(_install_on_open_connections, dispatch_uid='core_hooks_request')
+    _install_on_open_connections()
+
+
+# ==========================================
+# MIDDLEWARE
+# ==========================================
+class RequestScopeMiddleware:
+    """Runs each request inside ``scope(request)``; off unless the ``enabled_by`` setting is true."""
+    sync_capable = True
+    async_capable = True
+    enabled_by = None
+
+    def __init__(self, get_response):
+        if not getattr(settings, self.enabled_by, False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def scope(self, request):
+        """Context manager around the rest of the stack; what it yields is passed to ``finish()``."""
+        raise NotImplementedError
+
+    def finish(self, request, response, state):
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with self.scope(request) as state:
+            response = self.get_response(request)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        with self.scope(request) as state:
+            response = await self.get_response(request)
+        return self.finish(request, response, state)
@@ -0,0 +1,88 @@
+# core/imaging.py
+"""
+Derivative images for uploaded microscopy slides.
+
+Each upload gets three derivatives next to the original:
+
+* thumbnail - small JPEG for list/detail previews
+* preview   - screen-resolution WebP (JPEG if Pillow lacks WebP) for viewing
+* print     - JPEG sized for the 4in x 3in slot in the report PDF at 300 dpi
+
+They are written by a background job queued with the submission
+(``schedule_derivatives``, run by ``manage.py run_worker``) or in bulk by
+``manage.py generate_derivatives``.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+
+# (field, max box in px, Pillow format, extension, save options)
+DERIVATIVES = (
+    ('image_thumbnail', (320, 320), 'JPEG', 'jpg', {'quality': 80, 'optimize': True}),
+    ('image_preview', (1600, 1600), 'WEBP', 'webp', {'quality': 82, 'method': 4}),
+    ('image_print', (1200, 900), 'JPEG', 'jpg', {'quality': 90, 'optimize': True}),
+)
+DERIVATIVE_FIELDS = tuple(field for field, *_ in DERIVATIVES)
+
+
+def _webp_supported():
+    from PIL import features
+
+    return features.check('webp')
+
+
+def _render(source, box, fmt, options):
+    image = source.copy()
+    image.thumbnail(box)
+    buf = BytesIO()
+    image.save(buf, fmt, **options)
+    return buf.getvalue()
+
+
+def generate_derivatives(request_obj, force=False):
+    """Write missing derivatives for ``request_obj``. Returns True if any were written."""
+    from PIL import Image, ImageOps
+
+    if not request_obj.image:
+        return False
+    todo = [d for d in DERIVATIVES if force or not getattr(request_obj, d[0])]
+    if not todo:
+        return False
+
+    with request_obj.image.open('rb') as fh:
+        source = ImageOps.exif_transpose(Image.open(fh))
+        source = source.convert('RGB')
+
+    stem = os.path.splitext(os.path.basename(request_obj.image.name))[0]
+    for field, box, fmt, ext, options in todo:
+        if fmt == 'WEBP' and not _webp_supported():
+            fmt, ext, options = 'JPEG', 'jpg', {'quality': 82, 'optimize': True}
+        old = getattr(request_obj, field)
+        if old:
+            old.delete(save=False)
+        suffix = field.replace('image_', '')
+        getattr(request_obj, field).save(f"{stem}_{suffix}.{ext}", ContentFile(_render(source, box, fmt, options)),
+                                         save=False)
+
+    request_obj.save(update_fields=[d[0] for d in todo])
+    return True
+
+
+def schedule_derivatives(*request_ids):
+    """Queue derivative generation for ``request_ids`` as background jobs (one INSERT)."""
+    from .jobs import enqueue_many
+
+    enqueue_many('generate_derivatives', [{'request_id': pk} for pk in request_ids])
+
+
+def image_for_pdf(request_obj):
+    """Path of the best image to embed in the report PDF, or None."""
+    for field in (request_obj.image_print, request_obj.image):
+        if field:
+            try:
+                if os.path.exists(field.path):
+                    return field.path
+            except (NotImplementedError, ValueError):
+                continue
+    return None
@@ -0,0 +1,208 @@
+# core/instrumentation.py
+"""
+Per-request performance instrumentation (off unless ``PERF_INSTRUMENTATION``).
+
+``ServerTimingMiddleware`` measures, for every request:
+
+* ``db``    - number of SQL queries and their total time
+* ``tpl``   - time spent rendering templates
+* ``view``  - time from the view being called to its response (templates included)
+* ``total`` - the whole middleware stack
+* the response size in bytes (unknown for streaming responses)
+
+and reports them three ways: a ``Server-Timing`` header (shown by browser dev
+tools), one JSON log line on the ``core.performance`` logger, and per-view
+samples kept in memory for ``snapshot()`` (p50/p90/p95/p99, served to staff
+at ``/perf/stats/``). Samples are per worker process and reset on restart.
+
+The numbers are collected in a ``Stats`` object held in a context variable,
+so queries and renders that async views push to ``sync_to_async`` threads
+are counted too. SQL goes through a ``connection.execute_wrapper`` that is
+added to every connection of the process (core/hooks.py); templates are
+timed by wrapping the Django template backend's ``render``.
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+from .hooks import RequestScopeMiddleware, add_execute_wrapper
+
+logger = logging.getLogger('core.performance')
+
+PERCENTILES = (50, 90, 95, 99)
+
+_current = ContextVar('core_request_stats', default=None)
+
+
+class Stats:
+    """What one request spent its time on (milliseconds)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+
+
+# ==========================================
+# SQL AND TEMPLATE HOOKS
+# ==========================================
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_ms += (time.perf_counter() - start) * 1000
+
+
+def _patch_template_render():
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'timed', False):
+        return
+    original = Template.render
+
+    @wraps(original)
+    def render(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return original(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            stats.template_ms += (time.perf_counter() - start) * 1000
+
+    render.timed = True
+    Template.render = render
+
+
+def install():
+    """Hook SQL (all connections, present and future) and template rendering. Idempotent."""
+    add_execute_wrapper(_record_query)
+    _patch_template_render()
+
+
+# ==========================================
+# PER-VIEW SAMPLES
+# ==========================================
+_samples = defaultdict(lambda: deque(maxlen=getattr(settings, 'PERF_SAMPLE_SIZE', 1000)))
+_samples_lock = threading.Lock()
+
+
+def record(view_name, sample):
+    with _samples_lock:
+        _samples[view_name].append(sample)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    rank = max(1, -(-pct * len(values) // 100))  # ceil
+    return values[rank - 1]
+
+
+def _summary(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    summary = {f'p{pct}': round(percentile(values, pct), 2) for pct in PERCENTILES}
+    summary['max'] = round(values[-1], 2)
+    return summary
+
+
+def snapshot():
+    """Percentiles per view over the retained samples of this process."""
+    with _samples_lock:
+        samples = {name: list(rows) for name, rows in _samples.items()}
+    return {
+        name: {
+            'count': len(rows),
+            **{key: _summary(row[key] for row in rows)
+               for key in ('total_ms', 'view_ms', 'db_ms', 'queries', 'template_ms', 'bytes')},
+        }
+        for name, rows in sorted(samples.items())
+    }
+
+
+def reset():
+    with _samples_lock:
+        _samples.clear()
+
+
+# ==========================================
+# MIDDLEWARE
+# ==========================================
+def _response_size(response):
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+    return len(response.content)
+
+
+def _server_timing(sample):
+    parts = [f'db;dur={sample["db_ms"]:.1f};desc="{sample["queries"]} queries"',
+             f'tpl;dur={sample["template_ms"]:.1f}']
+    if sample['view_ms'] is not None:
+        parts.append(f'view;dur={sample["view_ms"]:.1f}')
+    parts.append(f'total;dur={sample["total_ms"]:.1f}')
+    return ', '.join(parts)
+
+
+class ServerTimingMiddleware(RequestScopeMiddleware):
+    """Put first in MIDDLEWARE so ``total`` covers the whole stack."""
+    enabled_by = 'PERF_INSTRUMENTATION'
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        install()
+
+    @contextmanager
+    def scope(self, request):
+        stats = Stats()
+        token = _current.set(stats)
+        try:
+            yield stats
+        finally:
+            _current.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = _current.get()
+        if stats is not None:
+            stats.view_started = time.perf_counter()
+
+    def finish(self, request, response, stats):
+        now = time.perf_counter()
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        sample = {
+            'total_ms': (now - stats.started) * 1000,
+            'view_ms': (now - stats.view_started) * 1000 if stats.view_started else None,
+            'db_ms': stats.db_ms,
+            'queries': stats.queries,
+            'template_ms': stats.template_ms,
+            'bytes': _response_size(response),
+        }
+        response['Server-Timing'] = _server_timing(sample)
+        record(view_name, sample)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            **{key: round(value, 2) if isinstance(value, float) else value for key, value in sample.items()},
+        }))
+        return response
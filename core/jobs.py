@@ -0,0 +1,214 @@
+# core/jobs.py
+"""
+Database-backed background jobs.
+
+    job = jobs.enqueue('export_csv', user=request.user, user_id=request.user.pk)
+    python manage.py run_worker
+
+Tasks are plain functions registered with ``@task('name')`` in
+core/tasks.py; they get the ``Job`` plus its ``kwargs`` and return a
+JSON-serialisable result. The job row is written in the caller's
+transaction, so a worker never sees a job for data that was rolled back.
+
+Workers claim jobs with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it (PostgreSQL, MySQL 8). On SQLite, where writers are
+serialised anyway, a conditional ``UPDATE ... WHERE status = 'queued'``
+decides who gets the job. A failed job is retried after
+``JOB_RETRY_BACKOFF * 2 ** (attempts - 1)`` seconds until ``max_attempts``;
+a job whose worker died is requeued once it has not sent a heartbeat for
+``JOB_LOCK_TIMEOUT`` seconds, or marked failed if it is out of attempts (a
+job that keeps killing its worker must not loop forever). Tasks that can run
+longer than that report in with ``set_progress()`` or ``heartbeat()``.
+
+With ``JOBS_INLINE`` the job runs in the web process right after commit
+(development and tests, where there is no worker).
+"""
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+MAX_BACKOFF = 3600
+ERROR_LIMIT = 4000
+
+
+def task(name):
+    """Register the decorated function as task ``name``."""
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    if name not in TASKS:
+        import_module('core.tasks')
+    try:
+        return TASKS[name]
+    except KeyError:
+        raise LookupError(f"Unknown job task {name!r}") from None
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ==========================================
+# ENQUEUE
+# ==========================================
+def _new_job(name, user, kwargs, max_attempts):
+    get_task(name)  # fail at enqueue time, not in the worker
+    return Job(
+        task=name,
+        kwargs=kwargs,
+        created_by=user if user is not None and user.is_authenticated else None,
+        max_attempts=max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 3),
+    )
+
+
+def _run_inline(job_ids):
+    transaction.on_commit(lambda: [run(job) for job in Job.objects.filter(pk__in=job_ids).order_by('pk')])
+
+
+def enqueue(name, *, user=None, max_attempts=None, **kwargs):
+    """Queue task ``name`` with ``kwargs``; returns the saved ``Job``."""
+    job = _new_job(name, user, kwargs, max_attempts)
+    job.save()
+    if getattr(settings, 'JOBS_INLINE', False):
+        _run_inline([job.pk])
+    return job
+
+
+def enqueue_many(name, kwargs_list, *, user=None, max_attempts=None):
+    """Queue one ``name`` job per kwargs dict with a single INSERT."""
+    created = Job.objects.bulk_create([_new_job(name, user, kwargs, max_attempts) for kwargs in kwargs_list])
+    if created and getattr(settings, 'JOBS_INLINE', False):
+        _run_inline([job.pk for job in created])
+    return created
+
+
+# ==========================================
+# WORKER SIDE
+# ==========================================
+def backoff(attempts):
+    base = getattr(settings, 'JOB_RETRY_BACKOFF', 30)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), MAX_BACKOFF))
+
+
+def _claimed(pk, worker, now):
+    """Mark queued job ``pk`` as ours; False if another worker got there first."""
+    return bool(Job.objects.filter(pk=pk, status='queued').update(
+        status='running', locked_by=worker, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1,
+    ))
+
+
+def claim(worker=None):
+    """Lock and return the next due job, or None if there is nothing to do."""
+    worker = worker or worker_name()
+    now = timezone.now()
+    due = Job.objects.filter(status='queued', run_after__lte=now).order_by('run_after', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pk = due.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            if pk is None or not _claimed(pk, worker, now):
+                return None
+    else:
+        for pk in due.values_list('pk', flat=True)[:10]:
+            if _claimed(pk, worker, now):
+                break
+        else:
+            return None
+    return Job.objects.get(pk=pk)
+
+
+def requeue_stale():
+    """Take back running jobs whose worker stopped sending heartbeats.
+
+    Jobs with attempts left go back to the queue; the rest are marked failed.
+    Returns ``(requeued, failed)``.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 900))
+    stale = Job.objects.filter(status='running').annotate(
+        last_seen=Coalesce('heartbeat_at', 'started_at'),
+    ).filter(last_seen__lt=cutoff)
+    failed = Job.objects.filter(pk__in=stale.filter(attempts__gte=F('max_attempts')).values('pk')).update(
+        status='failed', locked_by='', finished_at=now,
+        error=f"Worker stopped responding (no heartbeat for {getattr(settings, 'JOB_LOCK_TIMEOUT', 900)}s) "
+              "on the last attempt",
+    )
+    requeued = Job.objects.filter(pk__in=stale.filter(attempts__lt=F('max_attempts')).values('pk')).update(
+        status='queued', locked_by='', run_after=now,
+    )
+    if failed:
+        logger.error("Marked %s stale job(s) failed: out of attempts", failed)
+    return requeued, failed
+
+
+def run(job):
+    """Run a claimed (or inline) job and record the outcome; returns True on success."""
+    if job.status == 'queued':
+        # Inline: nobody claimed it
+        job.status, job.attempts = 'running', job.attempts + 1
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'attempts'])
+    try:
+        result = get_task(job.task)(job, **job.kwargs)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s", job.pk, job.task, job.attempts)
+        job.error = traceback.format_exc()[-ERROR_LIMIT:]
+        if job.attempts < job.max_attempts:
+            job.status, job.run_after = 'queued', timezone.now() + backoff(job.attempts)
+        else:
+            job.status, job.finished_at = 'failed', timezone.now()
+        job.locked_by = ''
+        job.save(update_fields=['status', 'run_after', 'finished_at', 'error', 'locked_by'])
+        return False
+
+    job.status, job.result, job.finished_at = 'done', result, timezone.now()
+    job.save(update_fields=['status', 'result', 'finished_at'])
+    return True
+
+
+def set_progress(job, progress, total=None):
+    """Record how far a long task got (shown by the job status endpoint); also a heartbeat."""
+    job.progress = progress
+    if total is not None:
+        job.total = total
+    job.heartbeat_at = timezone.now()
+    Job.objects.filter(pk=job.pk).update(progress=job.progress, total=job.total, heartbeat_at=job.heartbeat_at)
+
+
+def heartbeat(job):
+    """Tell ``requeue_stale`` the job's worker is still alive (for tasks without progress counts)."""
+    job.heartbeat_at = timezone.now()
+    Job.objects.filter(pk=job.pk).update(heartbeat_at=job.heartbeat_at)
+
+
+def work(worker=None, max_jobs=None, stop=lambda: False):
+    """Run due jobs until the queue is empty (or ``max_jobs`` ran); returns how many ran."""
+    worker = worker or worker_name()
+    count = 0
+    while not stop() and (max_jobs is None or count < max_jobs):
+        close_old_connections()
+        job = claim(worker)
+        if job is None:
+            break
+        run(job)
+        count += 1
+    close_old_connections()
+    return count
@@ -0,0 +1,38 @@
+# core/management/commands/archive_cases.py
+"""
+Move completed cases older than ARCHIVE_AFTER_DAYS into the archive tables
+(core/archive.py), in short batches. Safe to run while the site is up, e.g.
+nightly from the scheduler.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.archive import DEFAULT_AFTER_DAYS, DEFAULT_BATCH_SIZE, archive_cases, cutoff, due_cases
+
+
+class Command(BaseCommand):
+    help = "Archive completed cases (with reports and history) older than the retention age."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ARCHIVE_AFTER_DAYS', DEFAULT_AFTER_DAYS),
+                            help="Archive cases completed more than this many days ago")
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                            help="Cases moved per transaction")
+        parser.add_argument('--max-batches', type=int, help="Stop after this many batches")
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between batches")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the cases that are due")
+
+    def handle(self, *args, **options):
+        before = cutoff(options['days'])
+        if options['dry_run']:
+            self.stdout.write(f"{due_cases(before).count()} case(s) completed before {before:%Y-%m-%d} are due.")
+            return
+
+        def progress(total):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {total} archived")
+
+        moved = archive_cases(before, batch_size=options['batch_size'], max_batches=options['max_batches'],
+                              pause=options['sleep'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} case(s) completed before {before:%Y-%m-%d}."))
@@ -0,0 +1,81 @@
+# core/management/commands/benchmark_search.py
+"""
+Time the list-view search against the current database.
+
+    python manage.py benchmark_search --seed 1000000
+    python manage.py benchmark_search --query P0042 --query north --repeat 20
+
+``--seed`` bulk-inserts synthetic cases first (run it on a scratch database).
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from core.models import PortalUser, Request
+from core.search import filter_search, index_requests
+from core.seeding import CENTRES
+
+
+class Command(BaseCommand):
+    help = "Benchmark indexed search versus plain icontains on the Request table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Insert this many synthetic requests first")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--query', action='append', dest='queries', help="Search term (repeatable)")
+        parser.add_argument('--repeat', type=int, default=10, help="Runs per query")
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'], options['batch_size'])
+
+        total = Request.objects.count()
+        queries = options['queries'] or ['P00042', 'north', 'cornea unit', 'Pending']
+        self.stdout.write(f"Requests in table: {total:,}")
+        self.stdout.write(f"{'query':<16}{'matches':>10}{'indexed p50 ms':>16}{'icontains p50 ms':>18}")
+
+        for query in queries:
+            indexed = filter_search(Request.objects.all(), query, fields=('patient_id', 'centre_name', 'status'))
+            plain = Request.objects.filter(
+                Q(patient_id__icontains=query) | Q(centre_name__icontains=query) | Q(status__icontains=query)
+            )
+            matches = indexed.count()
+            fast = self.time_query(indexed, options['repeat'])
+            slow = self.time_query(plain, options['repeat'])
+            self.stdout.write(f"{query:<16}{matches:>10,}{fast:>16.1f}{slow:>18.1f}")
+
+    def time_query(self, qs, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(qs.order_by('-timestamp', '-id').values_list('pk', flat=True)[:25])
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def seed(self, count, batch_size):
+        doctor, _ = PortalUser.objects.get_or_create(
+            username='bench_doctor', defaults={'role': 'Doctor', 'full_name': 'Benchmark Doctor'}
+        )
+        rng = random.Random(42)
+        start = Request.objects.count()
+        for offset in range(0, count, batch_size):
+            batch = [
+                Request(
+                    doctor=doctor,
+                    centre_name=rng.choice(CENTRES),
+                    patient_id=f"P{start + offset + i:07d}",
+                    stain='Grams',
+                    image='slides/benchmark.png',
+                    status=rng.choice(['Pending', 'Completed']),
+                )
+                for i in range(min(batch_size, count - offset))
+            ]
+            with transaction.atomic():
+                # bulk_create skips post_save, so refresh the search index explicitly
+                index_requests(Request.objects.bulk_create(batch))
+            self.stdout.write(f"Seeded {offset + len(batch):,}/{count:,}", ending='\r')
+        self.stdout.write('')
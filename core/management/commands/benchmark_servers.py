@@ -0,0 +1,134 @@
+# core/management/commands/benchmark_servers.py
+"""
+Compare concurrent-request throughput of the WSGI and ASGI deployments.
+
+    python manage.py benchmark_servers --user drsmith
+    python manage.py benchmark_servers --user labtech --path /lab/queue/ --path /lab/export-csv/ \
+        --concurrency 100 --requests 2000 --workers 4
+
+Each mode is started with ``gunicorn -c gunicorn.conf.py`` (SERVER_MODE=wsgi,
+then asgi) on a free local port, and the paths are fetched concurrently with a
+session cookie for ``--user``. Run it against a database with realistic data
+(``benchmark_search --seed`` or a copy of production).
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import PortalUser
+
+MODES = ('wsgi', 'asgi')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent throughput of the WSGI and ASGI server modes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help="Username whose session the requests use")
+        parser.add_argument('--path', action='append', dest='paths', help="URL path to fetch (repeatable)")
+        parser.add_argument('--mode', action='append', dest='modes', choices=MODES, help="Limit to one mode")
+        parser.add_argument('--concurrency', type=int, default=50, help="Simultaneous client connections")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per mode")
+        parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes")
+        parser.add_argument('--startup-timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            user = PortalUser.objects.get(username=options['user'])
+        except PortalUser.DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}")
+
+        paths = options['paths'] or (['/doctor/reports/', '/doctor/export-csv/'] if user.is_doctor()
+                                     else ['/lab/queue/', '/lab/reports/', '/lab/export-csv/'])
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.session_for(user)}"
+
+        self.stdout.write(f"{options['requests']} requests, concurrency {options['concurrency']}, "
+                          f"{options['workers']} workers, paths: {', '.join(paths)}")
+        self.stdout.write(f"{'mode':<6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for mode in options['modes'] or MODES:
+            stats = self.run_mode(mode, paths, cookie, options)
+            self.stdout.write(
+                f"{mode:<6}{stats['throughput']:>10.1f}{stats['p50']:>10.1f}{stats['p95']:>10.1f}"
+                f"{stats['p99']:>10.1f}{stats['errors']:>8}"
+            )
+
+    def session_for(self, user):
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
+
+    def run_mode(self, mode, paths, cookie, options):
+        port = free_port()
+        env = dict(os.environ, SERVER_MODE=mode, WEB_CONCURRENCY=str(options['workers']))
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            if not wait_for_port(port, options['startup_timeout']):
+                raise CommandError(f"{mode} server did not start on port {port}")
+            urls = [f'http://127.0.0.1:{port}{path}' for path in paths]
+            return self.load(urls, cookie, options['concurrency'], options['requests'])
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    def load(self, urls, cookie, concurrency, total):
+        def fetch(url):
+            req = urllib.request.Request(url, headers={'Cookie': cookie})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=60) as resp:
+                    while resp.read(64 * 1024):
+                        pass
+                    ok = resp.status == 200
+            except (urllib.error.URLError, OSError):
+                ok = False
+            return (time.perf_counter() - start) * 1000, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(fetch, islice(cycle(urls), total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(ms for ms, _ in results)
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'throughput': total / elapsed,
+            'p50': cuts[49],
+            'p95': cuts[94],
+            'p99': cuts[98],
+            'errors': sum(1 for _, ok in results if not ok),
+        }
@@ -0,0 +1,118 @@
+# core/management/commands/benchmark_views.py
+"""
+Time every page and endpoint in core/urls.py at several data-set sizes.
+
+    python manage.py benchmark_views --sizes 1000 100000 1000000 --output bench.json
+    python manage.py benchmark_views --sizes 1000 --compare bench-main.json --fail-on-regression
+
+For each size the benchmark data set is grown with ``core.seeding`` (same
+rows as ``seed_benchmark_data``), then each scenario in core/benchmarks.py is requested
+in-process with the test client as a benchmark doctor or tech: ``--repeat`` timed runs
+after one warm-up, full body consumed (streams included), SQL queries
+counted. Scenarios that write (submit, assign, complete, ...) run inside a
+transaction that is rolled back, so every run sees the same data.
+
+Results go to ``--output`` as JSON (one entry per size and scenario, plus
+the git commit), which ``--compare`` reads back to flag p50 regressions.
+Run it on a scratch database: it adds up to the largest size in rows.
+"""
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from core.benchmarks import SCENARIOS, SKIPPED, build_context, run_scenario, uncovered_url_names
+from core.seeding import bench_requests, seed_cases
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Benchmark every core URL at growing data-set sizes and write JSON results."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per scenario")
+        parser.add_argument('--only', action='append', help="Run scenarios whose name contains this (repeatable)")
+        parser.add_argument('--output', default='benchmark-views.json')
+        parser.add_argument('--compare', help="Earlier --output file to compare p50 timings against")
+        parser.add_argument('--threshold', type=float, default=1.25, help="p50 ratio that counts as a regression")
+        parser.add_argument('--fail-on-regression', action='store_true')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in SCENARIOS if not options['only'] or any(o in s.name for o in options['only'])]
+        self.report_coverage()
+
+        results = []
+        with override_settings(ALLOWED_HOSTS=['testserver', *settings.ALLOWED_HOSTS]):
+            for size in sorted(options['sizes']):
+                seed_cases(size, seed=options['seed'])
+                rows = bench_requests().count()
+                try:
+                    ctx = build_context()
+                except ValueError as exc:
+                    raise CommandError(exc)
+                self.stdout.write(f"\n{rows:,} requests")
+                self.stdout.write(f"{'scenario':<34}{'status':>7}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'bytes':>12}")
+                for scenario in scenarios:
+                    result = {'size': size, 'rows': rows, **run_scenario(scenario, ctx, options['repeat'])}
+                    results.append(result)
+                    self.stdout.write(
+                        f"{scenario.name:<34}{result['status']:>7}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+                        f"{result['queries']:>9}{result['bytes']:>12,}"
+                    )
+
+        document = {
+            'commit': git_commit(),
+            'created_at': datetime.now(dt_timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        with open(options['output'], 'w') as fh:
+            json.dump(document, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"\nWrote {len(results)} results to {options['output']}"))
+
+        if options['compare']:
+            self.compare(options['compare'], results, options['threshold'], options['fail_on_regression'])
+
+    def report_coverage(self):
+        for name, reason in sorted(SKIPPED.items()):
+            self.stdout.write(f"skipped {name}: {reason}")
+        missing = uncovered_url_names()
+        if missing:
+            self.stdout.write(self.style.WARNING(f"No scenario for: {', '.join(missing)}"))
+
+    def compare(self, path, results, threshold, fail):
+        with open(path) as fh:
+            previous = {(r['size'], r['scenario']): r for r in json.load(fh)['results']}
+        regressions = []
+        self.stdout.write(f"\n{'size':>9}  {'scenario':<34}{'before':>10}{'after':>10}{'ratio':>8}")
+        for result in results:
+            before = previous.get((result['size'], result['scenario']))
+            if not before or not before['p50_ms']:
+                continue
+            ratio = result['p50_ms'] / before['p50_ms']
+            flag = ''
+            if ratio > threshold:
+                regressions.append(result['scenario'])
+                flag = '  REGRESSION'
+            self.stdout.write(f"{result['size']:>9,}  {result['scenario']:<34}{before['p50_ms']:>10.1f}"
+                              f"{result['p50_ms']:>10.1f}{ratio:>8.2f}{flag}")
+        if regressions and fail:
+            raise CommandError(f"{len(regressions)} scenario(s) slower than {threshold}x: {', '.join(regressions)}")
@@ -0,0 +1,47 @@
+# core/management/commands/compact_history.py
+"""
+Case history maintenance (core/history.py), e.g. monthly from the scheduler:
+create the coming months' partitions (PostgreSQL), drop entries past
+HISTORY_RETENTION_MONTHS and, with --keep-latest, trim each request's
+history to the entries the case views can show.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.history import (
+    DEFAULT_BATCH_SIZE, DEFAULT_MONTHS_AHEAD, add_months, compact, ensure_partitions, month_start, prune,
+)
+
+
+class Command(BaseCommand):
+    help = "Maintain history partitions and delete history entries past the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=getattr(settings, 'HISTORY_RETENTION_MONTHS', 0),
+                            help="Delete entries from before the last this many whole months (0 = keep all)")
+        parser.add_argument('--keep-latest', type=int,
+                            help="Also delete all but this many newest entries per request")
+        parser.add_argument('--months-ahead', type=int,
+                            default=getattr(settings, 'HISTORY_PARTITIONS_AHEAD', DEFAULT_MONTHS_AHEAD),
+                            help="Monthly partitions to create in advance (PostgreSQL)")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows per DELETE")
+
+    def handle(self, *args, **options):
+        if options['months'] < 0 or (options['keep_latest'] is not None and options['keep_latest'] < 1):
+            raise CommandError("--months must be >= 0 and --keep-latest >= 1")
+
+        created = ensure_partitions(options['months_ahead'])
+        if created:
+            self.stdout.write(f"Created partitions for {', '.join(f'{m:%Y-%m}' for m in created)}.")
+
+        if options['months']:
+            before = add_months(month_start(timezone.now()), -options['months'])
+            deleted = prune(before, options['batch_size'])
+            self.stdout.write(f"Deleted {deleted} entr{'y' if deleted == 1 else 'ies'} before {before:%Y-%m-%d}.")
+
+        if options['keep_latest']:
+            trimmed = compact(options['keep_latest'], options['batch_size'])
+            self.stdout.write(f"Trimmed {trimmed} entr{'y' if trimmed == 1 else 'ies'} "
+                              f"beyond the newest {options['keep_latest']} per request.")
+        self.stdout.write(self.style.SUCCESS("History maintenance done."))
@@ -0,0 +1,33 @@
+# core/management/commands/generate_derivatives.py
+"""
+Backfill thumbnail / preview / print derivatives for slide images.
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.imaging import generate_derivatives
+from core.models import Request
+
+
+class Command(BaseCommand):
+    help = "Generate missing slide image derivatives (thumbnail, preview, print)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate even if derivatives exist")
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        qs = Request.objects.exclude(image='')
+        if not options['force']:
+            qs = qs.filter(Q(image_thumbnail='') | Q(image_preview='') | Q(image_print=''))
+
+        done = failed = 0
+        for request_obj in qs.order_by('pk').iterator(chunk_size=options['batch_size']):
+            try:
+                if generate_derivatives(request_obj, force=options['force']):
+                    done += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"Request {request_obj.pk}: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {done} request(s); {failed} failed."))
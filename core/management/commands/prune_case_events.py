@@ -0,0 +1,20 @@
+# core/management/commands/prune_case_events.py
+"""
+Delete delivered live-update events (core/events.py) older than the retention period.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.events import prune
+
+
+class Command(BaseCommand):
+    help = "Delete old server-sent case events."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'EVENTS_RETENTION_DAYS', 7),
+                            help="Keep events newer than this many days")
+
+    def handle(self, *args, **options):
+        deleted = prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} event(s) older than {options['days']} day(s)."))
@@ -0,0 +1,31 @@
+# core/management/commands/reconcile_workload.py
+"""
+Recompute every lab tech's pending_workload counter from the Request table.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import PortalUser
+from core.workload import workload_drift
+
+
+class Command(BaseCommand):
+    help = "Fix drift in the per-tech pending workload counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without fixing it")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = workload_drift()
+            for tech, stored, actual in drift:
+                self.stdout.write(f"{tech.username}: stored {stored}, actual {actual}")
+                if not options['dry_run']:
+                    PortalUser.objects.filter(pk=tech.pk).update(pending_workload=actual)
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("All workload counters are correct."))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} counter(s) out of sync (dry run, nothing changed)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} counter(s)."))
@@ -0,0 +1,46 @@
+# core/management/commands/run_worker.py
+"""
+Run queued background jobs (core/jobs.py).
+
+    python manage.py run_worker            # poll forever
+    python manage.py run_worker --once     # drain the queue and exit (cron, tests)
+
+Start as many as needed; jobs are claimed with row locks so each runs once.
+SIGTERM/SIGINT let the current job finish before the worker exits.
+"""
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = "Process background jobs from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when no job is due")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds between polls of an empty queue")
+        parser.add_argument('--max-jobs', type=int, default=None, help="Exit after this many jobs")
+        parser.add_argument('--worker-id', default=None, help="Name recorded on claimed jobs (default host:pid)")
+
+    def handle(self, *args, **options):
+        worker = options['worker_id'] or jobs.worker_name()
+        stopping = []
+        if not options['once']:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda *_: stopping.append(True))
+
+        total = 0
+        while not stopping:
+            requeued, failed = jobs.requeue_stale()
+            if requeued or failed:
+                self.stdout.write(self.style.WARNING(f"Stale jobs: {requeued} requeued, {failed} failed"))
+            remaining = None if options['max_jobs'] is None else options['max_jobs'] - total
+            total += jobs.work(worker, max_jobs=remaining, stop=lambda: bool(stopping))
+            if options['once'] or (options['max_jobs'] is not None and total >= options['max_jobs']):
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"{worker}: ran {total} job(s)"))
@@ -0,0 +1,47 @@
+# core/management/commands/seed_benchmark_data.py
+"""
+Fill the database with deterministic synthetic cases (see core/seeding.py).
+
+    python manage.py seed_benchmark_data --requests 100000
+    python manage.py seed_benchmark_data --requests 1000000 --doctors 200 --techs 20 --seed 7
+
+Tops the benchmark data set up to ``--requests`` rows, so it can be re-run
+with a larger number to grow it. Keep ``--doctors``/``--techs``/``--seed``
+the same between runs. Users are ``bench_doc_000``..., ``bench_tech_000``...
+with the password ``benchmark``. Run it on a scratch database.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.seeding import PASSWORD, bench_requests, seed_cases
+
+
+class Command(BaseCommand):
+    help = "Bulk-create synthetic doctors, techs, requests, history, reports and slide images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help="Total benchmark requests wanted")
+        parser.add_argument('--doctors', type=int, default=20)
+        parser.add_argument('--techs', type=int, default=5)
+        parser.add_argument('--images', type=int, default=12, help="Distinct synthetic slide images")
+        parser.add_argument('--completed-ratio', type=float, default=0.6)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(done, total):
+            self.stdout.write(f"Seeded {done:,}/{total:,}", ending='\r')
+
+        created = seed_cases(
+            options['requests'], doctors=options['doctors'], techs=options['techs'], images=options['images'],
+            seed=options['seed'], completed_ratio=options['completed_ratio'], batch_size=options['batch_size'],
+            progress=progress,
+        )
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created:,} requests in {time.perf_counter() - started:.1f}s; "
+            f"{bench_requests().count():,} benchmark requests in total (password: {PASSWORD})"
+        ))
@@ -0,0 +1,89 @@
+# core/management/commands/startup_profile.py
+"""
+Measure what a fresh worker imports before it can serve its first request.
+
+    python manage.py startup_profile
+    python manage.py startup_profile --mode asgi --top 30 --budget-ms 800
+
+Boots the WSGI (or ASGI) application plus the URLconf in a clean interpreter
+under ``python -X importtime``, prints the slowest modules and fails when the
+boot time goes over ``--budget-ms`` (default ``STARTUP_BUDGET_MS``) or when a
+module listed in ``STARTUP_FORBIDDEN_MODULES`` (ReportLab, Pillow, ...) is
+imported at boot.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a gunicorn worker does before its first response
+BOOT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from microbio_portal.{mode} import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"boot_ms": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(stderr):
+    """Return ``[(module, self_us, cumulative_us, depth)]`` from ``-X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Report per-module import time for worker boot and enforce the startup budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=('wsgi', 'asgi'), default=getattr(settings, 'SERVER_MODE', 'wsgi'))
+        parser.add_argument('--budget-ms', type=float, default=getattr(settings, 'STARTUP_BUDGET_MS', None),
+                            help="Fail when worker boot takes longer than this")
+        parser.add_argument('--top', type=int, default=20, help="How many modules to list")
+        parser.add_argument('--sort', choices=('self', 'cumulative'), default='cumulative')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'microbio_portal.settings'))
+        env.pop('PYTHONIMPORTTIME', None)
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT.format(mode=options['mode'])],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode:
+            raise CommandError(f"Worker boot failed:\n{proc.stderr[-2000:]}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        rows = parse_importtime(proc.stderr)
+
+        key = 1 if options['sort'] == 'self' else 2
+        self.stdout.write(f"{'self ms':>9}{'cumul ms':>10}  module")
+        for module, self_us, cumulative_us, depth in sorted(rows, key=lambda r: r[key], reverse=True)[:options['top']]:
+            self.stdout.write(f"{self_us / 1000:>9.1f}{cumulative_us / 1000:>10.1f}  {'  ' * depth}{module}")
+
+        boot_ms = result['boot_ms']
+        imported_ms = sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+        self.stdout.write(f"\n{options['mode']} boot: {boot_ms:.0f} ms ({len(rows)} modules, {imported_ms:.0f} ms importing)")
+
+        problems = []
+        forbidden = getattr(settings, 'STARTUP_FORBIDDEN_MODULES', ())
+        loaded = set(result['modules'])
+        eager = sorted(name for name in forbidden if name in loaded)
+        if eager:
+            problems.append(f"imported at boot: {', '.join(eager)}")
+        if options['budget_ms'] is not None and boot_ms > options['budget_ms']:
+            problems.append(f"boot took {boot_ms:.0f} ms, budget is {options['budget_ms']:.0f} ms")
+        if problems:
+            raise CommandError("Startup budget exceeded: " + "; ".join(problems))
+        self.stdout.write(self.style.SUCCESS("Within startup budget"))
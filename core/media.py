@@ -0,0 +1,160 @@
+# core/media.py
+"""
+Authenticated file serving for slide images and report PDFs.
+
+Views check permissions and then call ``serve_file`` with a storage name,
+which either hands the transfer to the front-end proxy or streams the file
+itself:
+
+* ``MEDIA_ACCEL_REDIRECT_PREFIX`` set (nginx): respond with
+  ``X-Accel-Redirect: <prefix><storage name>`` and an empty body.
+* ``MEDIA_SENDFILE_HEADER`` set (Apache/lighttpd, e.g. ``X-Sendfile``):
+  respond with that header pointing at the absolute file path.
+* Neither: a ``FileResponse`` (sendfile via ``wsgi.file_wrapper`` where the
+  server supports it) with ETag / If-None-Match and single-range
+  ``Range`` requests, read in fixed-size chunks.
+
+Async views use ``aserve_file``: the stat/open work runs in a worker thread
+and the body is an async iterator, so a slow download does not tie up the
+event loop (or the single thread Django uses for sync iterators under ASGI).
+"""
+import asyncio
+import mimetypes
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _content_disposition(filename, as_attachment):
+    if not filename:
+        return None
+    return f'{"attachment" if as_attachment else "inline"}; filename="{filename}"'
+
+
+def _parse_range(header, size):
+    """Return ``(start, end)`` (inclusive) for a single byte range.
+
+    Returns None when the header should be ignored (malformed or multi-range)
+    and raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        # Suffix range: the final N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        return None
+    if start > end or start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def _aread_range(path, start, length):
+    fh = await asyncio.to_thread(open, path, 'rb')
+    try:
+        await asyncio.to_thread(fh.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(fh.read, min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(fh.close)
+
+
+def serve_file(request, name, storage=None, filename=None, as_attachment=False, content_type=None, etag=None,
+               stream_async=False):
+    """Serve the stored file ``name`` after the caller has checked permissions.
+
+    ``stream_async`` makes the body an async iterator (see ``aserve_file``).
+    """
+    storage = storage or default_storage
+    try:
+        path = storage.path(name)
+    except (NotImplementedError, ValueError):
+        raise Http404("File not available")
+    if not os.path.exists(path):
+        raise Http404("File not found")
+
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    disposition = _content_disposition(filename, as_attachment)
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', None)
+    sendfile_header = getattr(settings, 'MEDIA_SENDFILE_HEADER', None)
+    if accel_prefix or sendfile_header:
+        response = HttpResponse(content_type=content_type)
+        if accel_prefix:
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + name.lstrip('/')
+        else:
+            response[sendfile_header] = path
+        if disposition:
+            response['Content-Disposition'] = disposition
+        return response
+
+    stat = os.stat(path)
+    etag = quote_etag(etag or f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        return not_modified
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', etag) == etag:
+        try:
+            byte_range = _parse_range(range_header, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        read = _aread_range if stream_async else _read_range
+        response = StreamingHttpResponse(read(path, start, length), status=206, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    elif stream_async:
+        response = StreamingHttpResponse(_aread_range(path, 0, stat.st_size), content_type=content_type)
+        response['Content-Length'] = str(stat.st_size)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    if disposition:
+        response['Content-Disposition'] = disposition
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
+
+
+async def aserve_file(request, name, **kwargs):
+    """``serve_file`` for async views."""
+    return await sync_to_async(serve_file, thread_sensitive=False)(request, name, stream_async=True, **kwargs)
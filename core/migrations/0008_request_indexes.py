@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-16 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_report_microbiology_pdf_report_pdf_uploaded_date"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["assigned_to", "status", "timestamp"],
+                name="req_tech_status_ts_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["doctor", "timestamp"], name="req_doctor_ts_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="requesthistory",
+            index=models.Index(
+                fields=["request", "-timestamp"], name="reqhist_request_ts_idx"
+            ),
+        ),
+    ]
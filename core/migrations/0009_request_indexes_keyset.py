@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-16 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_request_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="request",
+            name="req_tech_status_ts_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="request",
+            name="req_doctor_ts_idx",
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["assigned_to", "status", "timestamp", "id"],
+                name="req_tech_status_ts_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["doctor", "timestamp", "id"], name="req_doctor_ts_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-16 09:00
+
+from django.db import migrations, models
+
+
+def backfill_pending_workload(apps, schema_editor):
+    PortalUser = apps.get_model("core", "PortalUser")
+    Request = apps.get_model("core", "Request")
+    counts = (
+        Request.objects.filter(status="Pending", assigned_to__isnull=False)
+        .values("assigned_to")
+        .annotate(n=models.Count("id"))
+    )
+    for row in counts:
+        PortalUser.objects.filter(pk=row["assigned_to"]).update(
+            pending_workload=row["n"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0009_request_indexes_keyset"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="portaluser",
+            name="pending_workload",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Pending cases assigned (lab techs)"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="portaluser",
+            index=models.Index(
+                fields=["role", "is_active", "pending_workload"],
+                name="user_lab_workload_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_pending_workload, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-16 09:00
+
+from django.db import migrations, models
+
+
+def backfill_completed_at(apps, schema_editor):
+    Request = apps.get_model("core", "Request")
+    RequestHistory = apps.get_model("core", "RequestHistory")
+    latest_completion = (
+        RequestHistory.objects.filter(
+            request=models.OuterRef("pk"), action="Report Completed"
+        )
+        .order_by("-timestamp")
+        .values("timestamp")[:1]
+    )
+    Request.objects.filter(status="Completed", completed_at__isnull=True).update(
+        completed_at=models.Subquery(latest_completion)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_portaluser_pending_workload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="request",
+            name="completed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["doctor", "completed_at"], name="req_doctor_completed_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_completed_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-16 09:00
+
+from django.db import migrations
+
+# PostgreSQL: trigram GIN indexes matching the UPPER(col) LIKE that icontains emits
+PG_TRIGRAM_INDEXES = [
+    ("req_patient_trgm_idx", "core_request", "patient_id"),
+    ("req_centre_trgm_idx", "core_request", "centre_name"),
+    ("user_fullname_trgm_idx", "core_portaluser", "full_name"),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, table, column in PG_TRIGRAM_INDEXES:
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+                f"USING gin (UPPER({column}) gin_trgm_ops)"
+            )
+    elif connection.vendor == "sqlite":
+        # Trigram tokenizer needs SQLite >= 3.34; older builds keep plain icontains
+        if connection.Database.sqlite_version_info < (3, 34, 0):
+            return
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS core_request_fts USING fts5("
+            "patient_id, centre_name, tokenize='trigram')"
+        )
+        schema_editor.execute(
+            "INSERT INTO core_request_fts(rowid, patient_id, centre_name) "
+            "SELECT id, patient_id, centre_name FROM core_request"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        for name, _, _ in PG_TRIGRAM_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+    elif connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS core_request_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_request_completed_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
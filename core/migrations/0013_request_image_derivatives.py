@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-16 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_request_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="request",
+            name="image_preview",
+            field=models.ImageField(
+                blank=True, editable=False, upload_to="slides/derived/%Y/%m/%d/"
+            ),
+        ),
+        migrations.AddField(
+            model_name="request",
+            name="image_print",
+            field=models.ImageField(
+                blank=True, editable=False, upload_to="slides/derived/%Y/%m/%d/"
+            ),
+        ),
+        migrations.AddField(
+            model_name="request",
+            name="image_thumbnail",
+            field=models.ImageField(
+                blank=True, editable=False, upload_to="slides/derived/%Y/%m/%d/"
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-16 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_request_image_derivatives"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="request",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["assigned_to", "status", "updated_at"],
+                name="req_tech_status_upd_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["doctor", "updated_at"], name="req_doctor_upd_idx"
+            ),
+        ),
+    ]
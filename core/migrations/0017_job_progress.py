@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-16 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="progress",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="total",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
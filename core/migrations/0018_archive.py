@@ -0,0 +1,260 @@
+# Generated by Django 6.0 on 2026-10-16 09:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_job_progress"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedRequest",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("timestamp", models.DateTimeField()),
+                ("centre_name", models.CharField(max_length=100)),
+                ("patient_id", models.CharField(max_length=50)),
+                (
+                    "eye",
+                    models.CharField(
+                        choices=[
+                            ("OD", "Right Eye (OD)"),
+                            ("OS", "Left Eye (OS)"),
+                            ("OU", "Both Eyes (OU)"),
+                            ("NA", "Not Applicable (NA)"),
+                        ],
+                        max_length=5,
+                    ),
+                ),
+                (
+                    "sample",
+                    models.CharField(
+                        choices=[
+                            ("Corneal Scraping", "Corneal Scraping"),
+                            ("Conjunctival Swab", "Conjunctival Swab"),
+                            ("Tear Film", "Tear Film"),
+                            ("Contact Lens", "Contact Lens"),
+                            ("Eyelid", "Eyelid"),
+                            ("Other", "Other"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                ("duration_value", models.PositiveIntegerField()),
+                (
+                    "duration_unit",
+                    models.CharField(
+                        choices=[
+                            ("Days", "Days"),
+                            ("Weeks", "Weeks"),
+                            ("Months", "Months"),
+                            ("Years", "Years"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("on_meds", models.BooleanField(default=False)),
+                (
+                    "meds_category",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("Antibiotics", "Antibiotics"),
+                            ("Antifungals", "Antifungals"),
+                            ("Antiviral", "Antiviral"),
+                            ("Steroid", "Steroid"),
+                            ("Others", "Others (Text)"),
+                        ],
+                        default="",
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "meds_custom",
+                    models.CharField(blank=True, default="", max_length=250),
+                ),
+                (
+                    "impression",
+                    models.CharField(
+                        choices=[
+                            ("Bacterial", "Bacterial"),
+                            ("Fungal", "Fungal"),
+                            ("Acanthamoeba", "Acanthamoeba"),
+                            ("Pythium", "Pythium"),
+                            ("Viral", "Viral"),
+                            ("Others", "Others"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                ("stain", models.CharField(max_length=150)),
+                ("image", models.ImageField(upload_to="slides/%Y/%m/%d/")),
+                (
+                    "image_thumbnail",
+                    models.ImageField(blank=True, upload_to="slides/derived/%Y/%m/%d/"),
+                ),
+                (
+                    "image_preview",
+                    models.ImageField(blank=True, upload_to="slides/derived/%Y/%m/%d/"),
+                ),
+                (
+                    "image_print",
+                    models.ImageField(blank=True, upload_to="slides/derived/%Y/%m/%d/"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Pending", "Pending Analysis"),
+                            ("Completed", "Report Completed"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "assignment_status",
+                    models.CharField(
+                        choices=[
+                            ("Unassigned", "Unassigned"),
+                            ("Assigned", "Assigned"),
+                            ("In Progress", "In Progress"),
+                            ("Completed", "Completed"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("assigned_date", models.DateTimeField(blank=True, null=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField()),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "ordering": ["-timestamp"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedRequestHistory",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("action", models.CharField(max_length=100)),
+                ("note", models.TextField(blank=True)),
+                ("timestamp", models.DateTimeField()),
+            ],
+            options={
+                "ordering": ["-timestamp"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="request",
+            index=models.Index(
+                fields=["status", "completed_at", "id"], name="req_status_completed_idx"
+            ),
+        ),
+        migrations.CreateModel(
+            name="ArchivedReport",
+            fields=[
+                (
+                    "request",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="report",
+                        serialize=False,
+                        to="core.archivedrequest",
+                    ),
+                ),
+                ("rc_code", models.CharField(max_length=50)),
+                ("lab_id", models.CharField(max_length=50)),
+                (
+                    "quality",
+                    models.CharField(
+                        choices=[
+                            ("Good", "Good"),
+                            ("Moderate", "Moderate"),
+                            ("Bad", "Bad"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("sample_suitability", models.BooleanField(default=True)),
+                ("suitability_reason", models.TextField(blank=True)),
+                ("report_text", models.TextField()),
+                ("comments", models.TextField(blank=True)),
+                ("auth_by", models.CharField(max_length=100)),
+                (
+                    "microbiology_pdf",
+                    models.FileField(
+                        blank=True, null=True, upload_to="reports/%Y/%m/%d/"
+                    ),
+                ),
+                ("pdf_uploaded_date", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="archivedrequest",
+            name="assigned_to",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="archived_assigned_requests",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedrequest",
+            name="doctor",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="archived_requests",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedrequesthistory",
+            name="request",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="history_entries",
+                to="core.archivedrequest",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedrequesthistory",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedrequest",
+            index=models.Index(
+                fields=["doctor", "timestamp", "id"], name="arcreq_doctor_ts_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedrequest",
+            index=models.Index(
+                fields=["assigned_to", "timestamp", "id"], name="arcreq_tech_ts_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedrequesthistory",
+            index=models.Index(
+                fields=["request", "-timestamp"], name="arcreqhist_request_ts_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 6.0 on 2026-10-16 09:00
+
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+# PostgreSQL only: core_requesthistory becomes a table range-partitioned by
+# month on "timestamp" (see core/history.py). The primary key of a
+# partitioned table has to include the partition key, so it is (id,
+# "timestamp"); Django still addresses rows by id, which the sequence keeps
+# unique. Other databases keep the plain table.
+COLUMNS = '"id", "action", "note", "timestamp", "request_id", "user_id"'
+MONTHS_AHEAD = 3
+
+
+def _months(first, last):
+    index = first.year * 12 + first.month - 1
+    while True:
+        start = datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+        if start > last:
+            return
+        yield start
+        index += 1
+
+
+def _bound(moment):
+    return f"'{moment:%Y-%m-%d %H:%M:%S}+00'"
+
+
+def _add_keys(schema_editor, table):
+    execute = schema_editor.execute
+    execute(
+        f"ALTER TABLE {table} ADD FOREIGN KEY (request_id) REFERENCES core_request (id) "
+        "DEFERRABLE INITIALLY DEFERRED"
+    )
+    execute(
+        f"ALTER TABLE {table} ADD FOREIGN KEY (user_id) REFERENCES core_portaluser (id) "
+        "DEFERRABLE INITIALLY DEFERRED"
+    )
+    execute(
+        f'CREATE INDEX reqhist_request_ts_idx ON {table} (request_id, "timestamp" DESC)'
+    )
+    execute(f"CREATE INDEX core_requesthistory_user_id_idx ON {table} (user_id)")
+
+
+def partition_history(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    execute = schema_editor.execute
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT MIN("timestamp") FROM core_requesthistory')
+        oldest = cursor.fetchone()[0]
+    now = datetime.now(timezone.utc)
+    first = oldest.astimezone(timezone.utc) if oldest else now
+    last = datetime(
+        now.year + (now.month + MONTHS_AHEAD - 1) // 12,
+        (now.month + MONTHS_AHEAD - 1) % 12 + 1,
+        1,
+        tzinfo=timezone.utc,
+    )
+
+    execute(
+        "CREATE TABLE core_requesthistory_partitioned ("
+        "id bigint NOT NULL, action varchar(100) NOT NULL, note text NOT NULL, "
+        '"timestamp" timestamp with time zone NOT NULL, request_id bigint NOT NULL, user_id bigint NULL'
+        ') PARTITION BY RANGE ("timestamp")'
+    )
+    execute(
+        "CREATE TABLE core_requesthistory_default PARTITION OF core_requesthistory_partitioned DEFAULT"
+    )
+    months = list(_months(first, last))
+    for start, end in zip(months, months[1:] + [None]):
+        end = end or datetime(
+            start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=timezone.utc
+        )
+        execute(
+            f"CREATE TABLE core_requesthistory_{start:%Y%m} PARTITION OF core_requesthistory_partitioned "
+            f"FOR VALUES FROM ({_bound(start)}) TO ({_bound(end)})"
+        )
+    execute(
+        f"INSERT INTO core_requesthistory_partitioned ({COLUMNS}) SELECT {COLUMNS} FROM core_requesthistory"
+    )
+    execute("DROP TABLE core_requesthistory")
+    execute("ALTER TABLE core_requesthistory_partitioned RENAME TO core_requesthistory")
+
+    execute(
+        "CREATE SEQUENCE core_requesthistory_id_seq OWNED BY core_requesthistory.id"
+    )
+    execute(
+        "SELECT setval('core_requesthistory_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM core_requesthistory"
+    )
+    execute(
+        "ALTER TABLE core_requesthistory ALTER COLUMN id SET DEFAULT nextval('core_requesthistory_id_seq')"
+    )
+    execute('ALTER TABLE core_requesthistory ADD PRIMARY KEY (id, "timestamp")')
+    _add_keys(schema_editor, "core_requesthistory")
+
+
+def unpartition_history(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    execute = schema_editor.execute
+    execute(
+        "CREATE TABLE core_requesthistory_plain ("
+        "id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY, action varchar(100) NOT NULL, "
+        'note text NOT NULL, "timestamp" timestamp with time zone NOT NULL, request_id bigint NOT NULL, '
+        "user_id bigint NULL)"
+    )
+    execute(
+        f"INSERT INTO core_requesthistory_plain ({COLUMNS}) SELECT {COLUMNS} FROM core_requesthistory"
+    )
+    execute("DROP TABLE core_requesthistory")
+    execute("ALTER TABLE core_requesthistory_plain RENAME TO core_requesthistory")
+    execute(
+        "SELECT setval(pg_get_serial_sequence('core_requesthistory', 'id'), COALESCE(MAX(id), 0) + 1, false) "
+        "FROM core_requesthistory"
+    )
+    _add_keys(schema_editor, "core_requesthistory")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_archive"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_history, unpartition_history),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-16 09:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.crypto import get_random_string, salted_hmac
+
+# A frozen copy of core.auth.make_pin as of this migration, so later changes
+# to the PIN format cannot change what this migration writes.
+PIN_ALGORITHM = "hmac_sha256"
+
+
+def make_pin(raw_pin):
+    salt = get_random_string(12)
+    digest = salted_hmac(
+        f"core.auth.pin.{salt}",
+        str(raw_pin),
+        secret=settings.SECRET_KEY,
+        algorithm="sha256",
+    ).hexdigest()
+    return f"{PIN_ALGORITHM}${salt}${digest}"
+
+
+def hash_pins(apps, schema_editor):
+    PortalUser = apps.get_model("core", "PortalUser")
+    for user in PortalUser.objects.exclude(pin_code="").exclude(
+        pin_code__startswith=f"{PIN_ALGORITHM}$"
+    ):
+        user.pin_code = make_pin(user.pin_code)
+        user.save(update_fields=["pin_code"])
+
+
+def clear_pins(apps, schema_editor):
+    # Hashed PINs cannot be turned back into plain ones; PIN sign-in stays off until reset
+    PortalUser = apps.get_model("core", "PortalUser")
+    PortalUser.objects.update(pin_code="")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_requesthistory_partitions"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="portaluser",
+            name="pin_code",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Hashed 4-digit PIN for login",
+                max_length=128,
+            ),
+        ),
+        migrations.RunPython(hash_pins, clear_pins),
+    ]
@@ -2,7 +2,10 @@
 # core/models.py
 
 from django.db import models
+from django.db.models import ExpressionWrapper, F, Prefetch, Window
+from django.db.models.functions import RowNumber
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 # ==========================================
 # 1. CUSTOM USER MODEL
@@ -16,8 +19,17 @@ class PortalUser(AbstractUser):
     # Link the custom fields
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='Doctor')
     full_name = models.CharField(max_length=100)
-    pin_code = models.CharField(max_length=4, default='0000', help_text="4-digit PIN for login")
+    # Encoded by core.auth.make_pin(); empty = no PIN sign-in
+    pin_code = models.CharField(max_length=128, blank=True, default='', help_text="Hashed 4-digit PIN for login")
     reading_centre_code = models.CharField(max_length=50, blank=True, null=True, help_text="Lab reading centre code")
+    # Denormalized count of Pending cases assigned to this lab tech (see core/workload.py)
+    pending_workload = models.PositiveIntegerField(default=0, help_text="Pending cases assigned (lab techs)")
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Least-busy auto-assignment
+            models.Index(fields=['role', 'is_active', 'pending_workload'], name='user_lab_workload_idx'),
+        ]
 
     # Helper methods for role checking
     def is_doctor(self):
@@ -33,6 +45,28 @@ class PortalUser(AbstractUser):
 # ==========================================
 # 2. CORE DATA MODELS
 # ==========================================
+class RequestQuerySet(models.QuerySet):
+    def with_case_details(self, history_limit=20):
+        """Load report, doctor and tech with each row, plus the latest
+        ``history_limit`` history entries per request as ``history_list``.
+
+        The query count stays constant regardless of how many rows are listed.
+        """
+        return self.select_related('report', 'doctor', 'assigned_to').prefetch_related(
+            Prefetch(
+                'history_entries',
+                queryset=RequestHistory.objects.latest_per_request(history_limit),
+                to_attr='history_list',
+            )
+        )
+
+    def with_turnaround(self):
+        """Annotate ``turnaround`` (completed_at - timestamp); NULL while pending."""
+        return self.annotate(
+            turnaround=ExpressionWrapper(F('completed_at') - F('timestamp'), output_field=models.DurationField())
+        )
+
+
 class Request(models.Model):
     STATUS_CHOICES = (
         ('Pending', 'Pending Analysis'),
@@ -106,6 +140,10 @@ class Request(models.Model):
     
     # Technical & Status
     image = models.ImageField(upload_to='slides/%Y/%m/%d/') # Image storage
+    # Derivatives of `image`, written by core/imaging.py after upload
+    image_thumbnail = models.ImageField(upload_to='slides/derived/%Y/%m/%d/', blank=True, editable=False)
+    image_preview = models.ImageField(upload_to='slides/derived/%Y/%m/%d/', blank=True, editable=False)
+    image_print = models.ImageField(upload_to='slides/derived/%Y/%m/%d/', blank=True, editable=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending')
     
     # Assignment system
@@ -113,9 +151,28 @@ class Request(models.Model):
                                    limit_choices_to={'role': 'Lab'}, related_name='assigned_requests')
     assignment_status = models.CharField(max_length=20, choices=ASSIGNMENT_STATUS_CHOICES, default='Unassigned')
     assigned_date = models.DateTimeField(null=True, blank=True)
+    # Set when the lab completes the report (mirrors the 'Report Completed' history entry)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Bumped on every save and whenever the case's Report changes (ETags in core/api.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RequestQuerySet.as_manager()
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Lab queue / lab reports: filter by tech + status, keyset on (timestamp, id)
+            models.Index(fields=['assigned_to', 'status', 'timestamp', 'id'], name='req_tech_status_ts_idx'),
+            # Doctor reports: filter by doctor, keyset on (timestamp, id)
+            models.Index(fields=['doctor', 'timestamp', 'id'], name='req_doctor_ts_idx'),
+            # Turnaround-time sorting / filtering
+            models.Index(fields=['doctor', 'completed_at'], name='req_doctor_completed_idx'),
+            # JSON API ETags: MAX(updated_at) / COUNT per list, answered from the index
+            models.Index(fields=['assigned_to', 'status', 'updated_at'], name='req_tech_status_upd_idx'),
+            models.Index(fields=['doctor', 'updated_at'], name='req_doctor_upd_idx'),
+            # archive_cases: completed cases, oldest completion first
+            models.Index(fields=['status', 'completed_at', 'id'], name='req_status_completed_idx'),
+        ]
 
     def __str__(self):
         return f"Req {self.id} - {self.patient_id} ({self.status})"
@@ -152,17 +209,195 @@ class Report(models.Model):
         return f"Report for {self.request.patient_id}"
 
 
+class RequestHistoryQuerySet(models.QuerySet):
+    def latest_per_request(self, limit=20):
+        """Keep only the newest ``limit`` entries of each request (ROW_NUMBER window)."""
+        return self.select_related('user').annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('request'),
+                order_by=F('timestamp').desc(),
+            )
+        ).filter(row_number__lte=limit)
+
+
 class RequestHistory(models.Model):
-    """Simple history tracking for Requests. Records actions taken, by whom, and a note."""
+    """Append-only history of a Request: actions taken, by whom, and a note.
+
+    Written through core/history.py; month-partitioned on PostgreSQL.
+    """
     request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name='history_entries')
     user = models.ForeignKey(PortalUser, null=True, blank=True, on_delete=models.SET_NULL)
     action = models.CharField(max_length=100)
     note = models.TextField(blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    objects = RequestHistoryQuerySet.as_manager()
+
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Case history: latest entries per request
+            models.Index(fields=['request', '-timestamp'], name='reqhist_request_ts_idx'),
+        ]
 
     def __str__(self):
         who = self.user.full_name if self.user else 'System'
-        return f"{self.timestamp} - {self.action} by {who}"
\ No newline at end of file
+        return f"{self.timestamp} - {self.action} by {who}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("History entries are append-only")
+        super().save(*args, **kwargs)
+
+# ==========================================
+# 3. LIVE UPDATES (server-sent events, core/events.py)
+# ==========================================
+class CaseEvent(models.Model):
+    """A change pushed to one user's open pages; the id is the SSE event id."""
+    KIND_CHOICES = (
+        ('assigned', 'Case assigned'),
+        ('completed', 'Case completed'),
+        ('pdf_uploaded', 'PDF uploaded'),
+    )
+
+    recipient = models.ForeignKey(PortalUser, on_delete=models.CASCADE, related_name='case_events')
+    request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Event streams: "recipient's events after id N"
+            models.Index(fields=['recipient', 'id'], name='caseevent_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for {self.recipient_id} (request {self.request_id})"
+
+
+# ==========================================
+# 4. BACKGROUND JOBS (core/jobs.py)
+# ==========================================
+class Job(models.Model):
+    """A unit of slow work for ``manage.py run_worker``."""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    task = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # Not picked up before this time (retry backoff)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # Set by long tasks through jobs.set_progress(): ``progress`` of ``total`` items done
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+
+    created_by = models.ForeignKey(PortalUser, null=True, blank=True, on_delete=models.SET_NULL, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched by the running task (jobs.set_progress / jobs.heartbeat); stale = worker gone
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Worker poll: next queued job that is due
+            models.Index(fields=['status', 'run_after', 'id'], name='job_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} {self.task} ({self.status})"
+
+
+# ==========================================
+# 5. ARCHIVE (core/archive.py)
+# ==========================================
+# Completed cases past ARCHIVE_AFTER_DAYS move here with their report and
+# history, keeping the working tables small. The columns mirror Request,
+# Report and RequestHistory (same names, same primary keys) so rows copy
+# across field by field and the PDF/CSV code works on either.
+class ArchivedRequest(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    timestamp = models.DateTimeField()
+    doctor = models.ForeignKey(PortalUser, on_delete=models.PROTECT, related_name='archived_requests')
+    centre_name = models.CharField(max_length=100)
+    patient_id = models.CharField(max_length=50)
+    eye = models.CharField(max_length=5, choices=Request.EYE_CHOICES)
+    sample = models.CharField(max_length=50, choices=Request.SAMPLE_CHOICES)
+    duration_value = models.PositiveIntegerField()
+    duration_unit = models.CharField(max_length=10, choices=Request.DURATION_UNIT_CHOICES)
+    on_meds = models.BooleanField(default=False)
+    meds_category = models.CharField(max_length=50, choices=Request.MED_CATEGORY_CHOICES, blank=True, default='')
+    meds_custom = models.CharField(max_length=250, blank=True, default='')
+    impression = models.CharField(max_length=50, choices=Request.IMPRESSION_CHOICES)
+    stain = models.CharField(max_length=150)
+    image = models.ImageField(upload_to='slides/%Y/%m/%d/')
+    image_thumbnail = models.ImageField(upload_to='slides/derived/%Y/%m/%d/', blank=True)
+    image_preview = models.ImageField(upload_to='slides/derived/%Y/%m/%d/', blank=True)
+    image_print = models.ImageField(upload_to='slides/derived/%Y/%m/%d/', blank=True)
+    status = models.CharField(max_length=10, choices=Request.STATUS_CHOICES)
+    assigned_to = models.ForeignKey(PortalUser, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='archived_assigned_requests')
+    assignment_status = models.CharField(max_length=20, choices=Request.ASSIGNMENT_STATUS_CHOICES)
+    assigned_date = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            # Archive lists: per doctor / per tech, keyset on (timestamp, id)
+            models.Index(fields=['doctor', 'timestamp', 'id'], name='arcreq_doctor_ts_idx'),
+            models.Index(fields=['assigned_to', 'timestamp', 'id'], name='arcreq_tech_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived req {self.id} - {self.patient_id}"
+
+
+class ArchivedReport(models.Model):
+    request = models.OneToOneField(ArchivedRequest, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='report')
+    rc_code = models.CharField(max_length=50)
+    lab_id = models.CharField(max_length=50)
+    quality = models.CharField(max_length=10, choices=Report.QUALITY_CHOICES)
+    sample_suitability = models.BooleanField(default=True)
+    suitability_reason = models.TextField(blank=True)
+    report_text = models.TextField()
+    comments = models.TextField(blank=True)
+    auth_by = models.CharField(max_length=100)
+    microbiology_pdf = models.FileField(upload_to='reports/%Y/%m/%d/', blank=True, null=True)
+    pdf_uploaded_date = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Archived report for {self.request_id}"
+
+
+class ArchivedRequestHistory(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    request = models.ForeignKey(ArchivedRequest, on_delete=models.CASCADE, related_name='history_entries')
+    user = models.ForeignKey(PortalUser, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    action = models.CharField(max_length=100)
+    note = models.TextField(blank=True)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['request', '-timestamp'], name='arcreqhist_request_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.timestamp} - {self.action} (archived)"
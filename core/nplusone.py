@@ -0,0 +1,137 @@
+# core/nplusone.py
+"""
+Development-time N+1 query detection.
+
+    with detect_repeated_queries(threshold=5, action='raise'):
+        response = client.get(url)
+
+Every SQL statement run inside the block is reduced to its *shape* (literals
+and ``IN (...)`` lists replaced, whitespace collapsed). When the same shape
+runs ``threshold`` times the block either logs a warning on the
+``core.nplusone`` logger or raises ``RepeatedQueryError``, in both cases
+with the project frames of the stack that issued it - normally a template
+loop or a per-row attribute access that wants ``select_related`` /
+``prefetch_related``.
+
+``NPlusOneMiddleware`` wraps each request in the same check. It is active
+only when ``NPLUSONE_DETECTION`` is on (defaults to ``DEBUG``); see
+``NPLUSONE_THRESHOLD`` and ``NPLUSONE_RAISE`` in settings.
+
+The detector lives in a context variable and the SQL hook is added to every
+connection (core/hooks.py), so queries that async views run in
+``sync_to_async`` threads are checked too.
+"""
+import logging
+import re
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+from .hooks import RequestScopeMiddleware, add_execute_wrapper
+
+logger = logging.getLogger('core.nplusone')
+
+DEFAULT_THRESHOLD = 5
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \(\s*%s(?:\s*,\s*%s)*\s*\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+# Transaction bookkeeping repeats legitimately
+_IGNORED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK', 'BEGIN', 'COMMIT')
+
+_current = ContextVar('core_nplusone_detector', default=None)
+
+
+class RepeatedQueryError(AssertionError):
+    """The same query shape ran ``threshold`` times in one request or block."""
+
+
+def query_shape(sql):
+    """``sql`` with literals and ``IN`` lists normalised, so per-row variants compare equal."""
+    shape = _STRING.sub('%s', sql)
+    shape = _NUMBER.sub('%s', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def _project_stack():
+    """The calling stack, trimmed to this project's own frames (falls back to the full stack)."""
+    base = str(Path(settings.BASE_DIR))
+    frames = traceback.extract_stack()[:-3]
+    own = [f for f in frames if f.filename.startswith(base) and 'site-packages' not in f.filename
+           and not f.filename.endswith('nplusone.py')]
+    return ''.join(traceback.format_list(own or frames))
+
+
+class Detector:
+    """Counts query shapes and reports each shape once, when it reaches ``threshold``."""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, action='log', label=''):
+        if action not in ('log', 'raise'):
+            raise ValueError("action must be 'log' or 'raise'")
+        self.threshold, self.action, self.label = threshold, action, label
+        self.counts = Counter()
+        self.reported = []
+
+    def check(self, sql):
+        if sql.lstrip().upper().startswith(_IGNORED):
+            return
+        shape = query_shape(sql)
+        self.counts[shape] += 1
+        if self.counts[shape] != self.threshold:
+            return
+        self.reported.append(shape)
+        message = (f"Query shape repeated {self.threshold} times{' in ' + self.label if self.label else ''} "
+                   f"(likely N+1):\n    {shape}\nIssued from:\n{_project_stack()}")
+        if self.action == 'raise':
+            raise RepeatedQueryError(message)
+        logger.warning(message)
+
+
+# ==========================================
+# SQL HOOK
+# ==========================================
+def _check_query(execute, sql, params, many, context):
+    detector = _current.get()
+    if detector is not None:
+        detector.check(sql)
+    return execute(sql, params, many, context)
+
+
+def install():
+    """Hook SQL on all connections, present and future. Idempotent."""
+    add_execute_wrapper(_check_query)
+
+
+@contextmanager
+def detect_repeated_queries(threshold=DEFAULT_THRESHOLD, action='raise', label=''):
+    """Check the queries run inside the block; yields the ``Detector``."""
+    install()
+    detector = Detector(threshold, action, label)
+    token = _current.set(detector)
+    try:
+        yield detector
+    finally:
+        _current.reset(token)
+
+
+# ==========================================
+# MIDDLEWARE
+# ==========================================
+class NPlusOneMiddleware(RequestScopeMiddleware):
+    """Development only: check every request for repeated query shapes."""
+    enabled_by = 'NPLUSONE_DETECTION'
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.threshold = getattr(settings, 'NPLUSONE_THRESHOLD', DEFAULT_THRESHOLD)
+        self.action = 'raise' if getattr(settings, 'NPLUSONE_RAISE', False) else 'log'
+        install()
+
+    def scope(self, request):
+        return detect_repeated_queries(self.threshold, self.action, f'{request.method} {request.path}')
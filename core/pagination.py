@@ -0,0 +1,109 @@
+# core/pagination.py
+"""
+Keyset (cursor) pagination for the list views.
+
+Pages are keyed on (timestamp, id) so each page is an index range scan,
+whatever page the user is on. OFFSET pagination gets slower the further
+back one browses because the skipped rows still have to be read.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+from .search import is_ranked
+
+
+def encode_cursor(obj):
+    """Opaque cursor for the row ``obj`` (a model instance or a ``values()`` dict)."""
+    ts, pk = (obj['timestamp'], obj['id']) if isinstance(obj, dict) else (obj.timestamp, obj.pk)
+    raw = f"{ts.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """Return ``(timestamp, pk)`` from a cursor, or ``None`` if it is malformed."""
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        ts, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(ts), int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def keyset_filter(ts, pk, descending):
+    """Rows strictly after ``(ts, pk)`` in the listing order."""
+    if descending:
+        return Q(timestamp__lte=ts) & (Q(timestamp__lt=ts) | Q(pk__lt=pk))
+    return Q(timestamp__gte=ts) & (Q(timestamp__gt=ts) | Q(pk__gt=pk))
+
+
+class KeysetPaginationMixin:
+    """ListView mixin that pages ``get_queryset()`` by (timestamp, id).
+
+    The queryset must already be ordered by ``('-timestamp', '-id')`` (or
+    ``('timestamp', 'id')`` with ``keyset_descending = False``). Adds
+    ``next_page_query`` / ``prev_page_query`` (urlencoded, search term kept)
+    to the context. Searches ranked by relevance (core/search.py) have no
+    stable cursor and page by ``offset`` instead; they are rarely browsed deep.
+    """
+    page_size = 25
+    keyset_descending = True
+
+    def keyset_page_queryset(self, queryset):
+        """Apply the request's cursor; returns ``(sliced queryset, walking_backwards)``."""
+        if is_ranked(queryset):
+            offset = self.search_offset()
+            return queryset[offset:offset + self.page_size + 1], False
+        after = decode_cursor(self.request.GET.get('after', ''))
+        before = None if after else decode_cursor(self.request.GET.get('before', ''))
+
+        if after:
+            queryset = queryset.filter(keyset_filter(*after, self.keyset_descending))
+        elif before:
+            # Walk backwards from the cursor, then restore display order
+            queryset = queryset.filter(keyset_filter(*before, not self.keyset_descending)).reverse()
+        return queryset[:self.page_size + 1], bool(before)
+
+    def keyset_page(self, rows, backwards):
+        """Trim the fetched rows to a page; returns ``(rows, has_next, has_prev)``."""
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+            return rows, True, has_more
+        return rows, has_more, bool(self.request.GET.get('after'))
+
+    def paginate_keyset(self, queryset):
+        page_queryset, backwards = self.keyset_page_queryset(queryset)
+        return self.keyset_page(list(page_queryset), backwards)
+
+    async def apaginate_keyset(self, queryset):
+        page_queryset, backwards = self.keyset_page_queryset(queryset)
+        return self.keyset_page([obj async for obj in page_queryset], backwards)
+
+    def search_offset(self):
+        try:
+            return max(0, int(self.request.GET.get('offset', 0)))
+        except ValueError:
+            return 0
+
+    def _page_query(self, key, value):
+        params = self.request.GET.copy()
+        for name in ('after', 'before', 'offset'):
+            params.pop(name, None)
+        params[key] = value
+        return params.urlencode()
+
+    def get_context_data(self, *, keyset_page=None, **kwargs):
+        queryset = kwargs.pop('object_list', self.object_list)
+        rows, has_next, has_prev = keyset_page or self.paginate_keyset(queryset)
+        ctx = super().get_context_data(object_list=rows, **kwargs)
+        if is_ranked(queryset):
+            offset = self.search_offset()
+            ctx['next_page_query'] = self._page_query('offset', offset + self.page_size) if has_next else None
+            ctx['prev_page_query'] = self._page_query('offset', max(0, offset - self.page_size)) if offset else None
+            return ctx
+        ctx['next_page_query'] = self._page_query('after', encode_cursor(rows[-1])) if rows and has_next else None
+        ctx['prev_page_query'] = self._page_query('before', encode_cursor(rows[0])) if rows and has_prev else None
+        return ctx
@@ -0,0 +1,96 @@
+# core/pdf_cache.py
+"""
+On-disk cache for generated report PDFs.
+
+Files live in the default storage under ``<REPORT_PDF_CACHE_DIR>/<request id>/<hash>.pdf``.
+The hash covers every Request/Report field printed on the PDF plus the slide
+image, so a changed report can never be served from a stale file. The
+post_save handlers in ``core/signals.py`` clear a request's folder whenever its
+Request or Report is saved, which keeps old versions from piling up.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# Bump when the PDF layout in rendering.render_report_pdf() changes
+PDF_LAYOUT_VERSION = 1
+
+REQUEST_FIELDS = (
+    'patient_id', 'centre_name', 'eye', 'sample', 'duration_value', 'duration_unit', 'on_meds',
+    'meds_category', 'meds_custom', 'impression', 'stain', 'timestamp', 'completed_at',
+)
+REPORT_FIELDS = (
+    'lab_id', 'rc_code', 'quality', 'sample_suitability', 'suitability_reason', 'report_text',
+    'comments', 'auth_by',
+)
+
+
+def cache_dir(request_id):
+    return f"{getattr(settings, 'REPORT_PDF_CACHE_DIR', 'pdf_cache')}/{request_id}"
+
+
+def _image_signature(image):
+    if not image:
+        return ''
+    try:
+        stat = os.stat(image.path)
+        return f"{image.name}:{stat.st_size}:{stat.st_mtime_ns}"
+    except (OSError, NotImplementedError, ValueError):
+        return image.name
+
+
+def report_fingerprint(request_obj, report_obj):
+    """Hash of everything that ends up in the rendered PDF."""
+    digest = hashlib.sha256(f"v{PDF_LAYOUT_VERSION}".encode())
+    for obj, fields in ((request_obj, REQUEST_FIELDS), (report_obj, REPORT_FIELDS)):
+        for field in fields:
+            digest.update(b'\x1f' + str(getattr(obj, field)).encode())
+    for image in (request_obj.image, request_obj.image_print):
+        digest.update(b'\x1f' + _image_signature(image).encode())
+    return digest.hexdigest()[:32]
+
+
+def cached_pdf_name(request_id, fingerprint):
+    return f"{cache_dir(request_id)}/{fingerprint}.pdf"
+
+
+def modified_time(name):
+    """Epoch mtime of a cached PDF, or None if it is not cached."""
+    try:
+        return default_storage.get_modified_time(name).timestamp()
+    except (OSError, NotImplementedError):
+        return None
+
+
+def store_pdf(request_id, fingerprint, pdf_bytes):
+    """Save a freshly rendered PDF and return its storage name."""
+    name = cached_pdf_name(request_id, fingerprint)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(pdf_bytes))
+
+
+def invalidate(request_id):
+    """Remove every cached PDF for a request."""
+    folder = cache_dir(request_id)
+    try:
+        _, files = default_storage.listdir(folder)
+    except (OSError, NotImplementedError):
+        return
+    for filename in files:
+        default_storage.delete(f"{folder}/{filename}")
+
+
+def ensure_pdf(request_obj, report_obj):
+    """Storage name of the report's PDF, rendering and caching it first if needed."""
+    fingerprint = report_fingerprint(request_obj, report_obj)
+    name = cached_pdf_name(request_obj.pk, fingerprint)
+    if modified_time(name) is None:
+        # ReportLab is only imported by the first PDF render in each process
+        from .rendering import render_report_pdf
+
+        name = store_pdf(request_obj.pk, fingerprint, render_report_pdf(request_obj, report_obj))
+    return name
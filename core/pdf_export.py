@@ -0,0 +1,158 @@
+# core/pdf_export.py
+"""
+Batch export of report PDFs as one ZIP (audits, reading-centre reviews).
+
+Runs as the ``export_pdf_zip`` background job. PDFs already in the cache
+(core/pdf_cache.py) are copied straight into the archive; the rest are
+rendered in a process pool, since ReportLab is CPU-bound and holds the GIL,
+and written to the ZIP in the order they finish. Freshly rendered PDFs are
+stored in the cache as well, so single downloads get them for free.
+
+The pool children only lay out the PDF: the parent streams the rows (with
+their related objects) in chunks and pickles each across, so no child ever
+opens a database connection and the whole export is never in memory at once.
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import ExitStack
+from datetime import date
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from . import jobs, pdf_cache
+from .models import Request
+
+EXPORT_DIR = 'exports'
+# Seconds between progress writes to the Job row
+PROGRESS_INTERVAL = 1.0
+# Cases (with report, doctor and tech) fetched per database round trip
+CHUNK_SIZE = 200
+
+
+def export_queryset(date_from=None, date_to=None, centre_name=None, doctor_id=None, tech_id=None):
+    """Completed cases with a report matching the export filters, oldest first."""
+    cases = Request.objects.filter(status='Completed', report__isnull=False)
+    if date_from:
+        cases = cases.filter(completed_at__date__gte=date.fromisoformat(date_from))
+    if date_to:
+        cases = cases.filter(completed_at__date__lte=date.fromisoformat(date_to))
+    if centre_name:
+        cases = cases.filter(centre_name__iexact=centre_name)
+    if doctor_id:
+        cases = cases.filter(doctor_id=doctor_id)
+    if tech_id:
+        cases = cases.filter(assigned_to_id=tech_id)
+    return cases.select_related('report', 'doctor', 'assigned_to').order_by('completed_at', 'id')
+
+
+def _render(request_obj, report_obj):
+    """Pool entry point: PDF bytes for one report."""
+    from .rendering import render_report_pdf
+
+    return render_report_pdf(request_obj, report_obj)
+
+
+def _setup_child():
+    import django
+
+    django.setup()
+
+
+def process_count():
+    return getattr(settings, 'PDF_EXPORT_PROCESSES', 0) or os.cpu_count() or 1
+
+
+def _pool(processes):
+    # fork shares the parent's loaded settings; spawn-only platforms set Django up again
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('fork'))
+    return ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_setup_child)
+
+
+def _arcname(case):
+    return get_valid_filename(f"{case.patient_id}_{case.pk}.pdf")
+
+
+class Progress:
+    """Throttled ``jobs.set_progress``: at most one UPDATE per ``PROGRESS_INTERVAL``."""
+
+    def __init__(self, job, total):
+        self.job, self.total, self.done, self.saved_at = job, total, 0, time.monotonic()
+        jobs.set_progress(job, 0, total)
+
+    def step(self):
+        self.done += 1
+        now = time.monotonic()
+        if self.done == self.total or now - self.saved_at >= PROGRESS_INTERVAL:
+            jobs.set_progress(self.job, self.done)
+            self.saved_at = now
+
+
+def write_zip(archive, cases, progress, processes):
+    """Add one PDF per case to ``archive``; returns ``(cached, rendered)`` counts.
+
+    ``cases`` is read once, as it streams in: cached PDFs are copied at once and
+    at most ``processes * 2`` renders are in flight, so memory stays flat
+    however many cases there are.
+    """
+    counts = {'cached': 0, 'rendered': 0}
+
+    def add(case, fingerprint, pdf_bytes):
+        pdf_cache.store_pdf(case.pk, fingerprint, pdf_bytes)
+        archive.writestr(_arcname(case), pdf_bytes)
+        counts['rendered'] += 1
+        progress.step()
+
+    def collect(pending, return_when):
+        finished, _ = wait(pending, return_when=return_when)
+        for future in finished:
+            case, fingerprint = pending.pop(future)
+            add(case, fingerprint, future.result())
+
+    pending = {}
+    with ExitStack() as stack:
+        pool = stack.enter_context(_pool(processes)) if processes > 1 else None
+        for case in cases:
+            fingerprint = pdf_cache.report_fingerprint(case, case.report)
+            name = pdf_cache.cached_pdf_name(case.pk, fingerprint)
+            if pdf_cache.modified_time(name) is not None:
+                with default_storage.open(name, 'rb') as fh:
+                    archive.writestr(_arcname(case), fh.read())
+                counts['cached'] += 1
+                progress.step()
+            elif pool is None:
+                add(case, fingerprint, _render(case, case.report))
+            else:
+                # Keep a bounded number of renders in flight so finished PDFs don't pile up in memory
+                if len(pending) >= processes * 2:
+                    collect(pending, FIRST_COMPLETED)
+                pending[pool.submit(_render, case, case.report)] = (case, fingerprint)
+        if pending:
+            collect(pending, ALL_COMPLETED)
+    return counts['cached'], counts['rendered']
+
+
+def export_pdf_zip(job, **filters):
+    """Build the ZIP for ``filters`` (see ``export_queryset``) and save it for download."""
+    cases = export_queryset(**filters)
+    total = cases.count()
+    progress = Progress(job, total)
+    filename = f'report_pdfs_{timezone.now().strftime("%Y%m%d_%H%M%S")}.zip'
+
+    with tempfile.TemporaryFile() as fh:
+        # PDFs are compressed already; storing them keeps the ZIP step cheap
+        with zipfile.ZipFile(fh, 'w', zipfile.ZIP_STORED) as archive:
+            cached, rendered = write_zip(archive, cases.iterator(chunk_size=CHUNK_SIZE), progress,
+                                         min(process_count(), total))
+        fh.seek(0)
+        name = default_storage.save(f"{EXPORT_DIR}/{job.pk}/{filename}", File(fh))
+    return {'file': name, 'filename': filename, 'reports': total, 'cached': cached, 'rendered': rendered}
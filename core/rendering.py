@@ -0,0 +1,208 @@
+# core/rendering.py
+"""
+Report PDF rendering.
+
+Kept out of views.py so ReportLab is only imported when a PDF is actually
+rendered (cache miss in ``generate_report_pdf``), not at worker boot.
+"""
+from io import BytesIO
+
+from django.utils import timezone
+
+# ReportLab PDF Imports
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.lib.units import inch
+
+from .imaging import image_for_pdf
+
+
+def render_report_pdf(request_obj, report_obj):
+    """Builds the professional PDF report with official layout and returns its bytes."""
+    # Create PDF buffer
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, 
+                            leftMargin=0.5*inch, rightMargin=0.5*inch, 
+                            topMargin=0.5*inch, bottomMargin=0.5*inch)
+    
+    styles = getSampleStyleSheet()
+    story = []
+    
+    # Define official fonts and styles
+    # Title
+    title_style = styles['Heading1'].clone('OfficialTitle')
+    title_style.fontName = 'Helvetica-Bold'
+    title_style.fontSize = 18
+    title_style.textColor = colors.HexColor('#003366')
+    title_style.alignment = 1  # CENTER
+    title_style.spaceAfter = 20
+    
+    # Section Header
+    section_header_style = styles['Heading2'].clone('SectionHeader')
+    section_header_style.fontName = 'Helvetica-Bold'
+    section_header_style.fontSize = 12
+    section_header_style.textColor = colors.white
+    section_header_style.backColor = colors.HexColor('#003366')
+    section_header_style.padding = 6
+    section_header_style.borderPadding = 6
+    section_header_style.spaceBefore = 12
+    section_header_style.spaceAfter = 10
+    
+    # Normal Text
+    normal_style = styles['Normal']
+    normal_style.fontSize = 10
+    normal_style.leading = 14
+
+    # --- 1. Report Title ---
+    story.append(Paragraph("OCULAR MICROBIOLOGY LABORATORY REPORT", title_style))
+    story.append(Spacer(1, 0.2 * inch))
+
+    # --- 2. TABLE 1: Patient & Clinical Details ---
+    story.append(Paragraph("PATIENT & CLINICAL DETAILS", section_header_style))
+    
+    # Format medications
+    meds_display = ""
+    if request_obj.on_meds:
+        if request_obj.meds_category == 'Others':
+            meds_display = request_obj.meds_custom
+        else:
+            meds_display = request_obj.get_meds_category_display()
+    else:
+        meds_display = "No medications"
+
+    duration_display = f"{request_obj.duration_value} {request_obj.get_duration_unit_display()}"
+
+    # Data for Clinical Table
+    clinical_data = [
+        [Paragraph("<b>Patient ID:</b>", normal_style), Paragraph(request_obj.patient_id, normal_style),
+         Paragraph("<b>Centre:</b>", normal_style), Paragraph(request_obj.centre_name, normal_style)],
+        
+        [Paragraph("<b>Eye:</b>", normal_style), Paragraph(request_obj.get_eye_display(), normal_style),
+         Paragraph("<b>Date Submitted:</b>", normal_style), Paragraph(request_obj.timestamp.strftime('%Y-%m-%d'), normal_style)],
+        
+        [Paragraph("<b>Sample:</b>", normal_style), Paragraph(request_obj.get_sample_display(), normal_style),
+         Paragraph("<b>Duration:</b>", normal_style), Paragraph(duration_display, normal_style)],
+        
+        [Paragraph("<b>Medications:</b>", normal_style), Paragraph(meds_display, normal_style),
+         Paragraph("<b>Stain Used:</b>", normal_style), Paragraph(request_obj.stain or "N/A", normal_style)],
+        
+        [Paragraph("<b>Clinical Impression:</b>", normal_style), Paragraph(request_obj.get_impression_display(), normal_style),
+         "", ""]
+    ]
+
+    # Table Style
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dddddd')),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('PADDING', (0, 0), (-1, -1), 8),
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')), # Light gray for labels col 1
+        ('BACKGROUND', (2, 0), (2, -1), colors.HexColor('#f8f9fa')), # Light gray for labels col 3
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ])
+
+    col_widths = [1.2*inch, 2.3*inch, 1.2*inch, 2.3*inch]
+    clinical_table = Table(clinical_data, colWidths=col_widths)
+    clinical_table.setStyle(table_style)
+    
+    story.append(clinical_table)
+    story.append(Spacer(1, 0.2 * inch))
+
+    # --- 3. TABLE 2: Laboratory Interpretation ---
+    story.append(Paragraph("LABORATORY INTERPRETATION", section_header_style))
+    
+    report_quality = report_obj.quality if report_obj.quality else "N/A"
+    report_suitability = "Yes" if report_obj.sample_suitability else "No"
+    reason_display = report_obj.suitability_reason if not report_obj.sample_suitability and report_obj.suitability_reason else "N/A"
+
+    lab_data = [
+        [Paragraph("<b>Lab ID:</b>", normal_style), Paragraph(report_obj.lab_id, normal_style),
+         Paragraph("<b>RC Code:</b>", normal_style), Paragraph(report_obj.rc_code, normal_style)],
+        
+        [Paragraph("<b>Sample Quality:</b>", normal_style), Paragraph(report_quality, normal_style),
+         Paragraph("<b>Suitability:</b>", normal_style), Paragraph(report_suitability, normal_style)],
+        
+        [Paragraph("<b>Suitability Reason:</b>", normal_style), Paragraph(reason_display, normal_style),
+         "", ""]
+    ]
+    
+    lab_table = Table(lab_data, colWidths=col_widths)
+    lab_table.setStyle(table_style)
+    
+    story.append(lab_table)
+    story.append(Spacer(1, 0.2 * inch))
+
+    # --- 4. Microbiology Report Section ---
+    story.append(Paragraph("MICROBIOLOGY REPORT", section_header_style))
+    
+    # Use a box for the report text
+    report_content = [
+        [Paragraph(report_obj.report_text.replace('\n', '<br/>'), normal_style)]
+    ]
+    
+    report_table = Table(report_content, colWidths=[7*inch])
+    report_table.setStyle(TableStyle([
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#003366')),
+        ('PADDING', (0, 0), (-1, -1), 10),
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#fcfcfc')),
+    ]))
+    story.append(report_table)
+    story.append(Spacer(1, 0.1 * inch))
+
+    if report_obj.comments:
+        story.append(Paragraph("<b>Additional Comments:</b>", styles['Heading4']))
+        story.append(Paragraph(report_obj.comments.replace('\n', '<br/>'), normal_style))
+        story.append(Spacer(1, 0.1 * inch))
+
+    # --- 5. Microscopy Image ---
+    # Print-sized derivative when available, original upload otherwise
+    image_path = image_for_pdf(request_obj)
+    if image_path:
+        story.append(Spacer(1, 0.1 * inch))
+        story.append(Paragraph("MICROSCOPY IMAGE", section_header_style))
+        try:
+            img = Image(image_path, width=4*inch, height=3*inch, kind='proportional')
+            story.append(img)
+        except Exception:
+            story.append(Paragraph("<i>[Image could not be loaded]</i>", normal_style))
+        story.append(Spacer(1, 0.2 * inch))
+
+    # --- 6. Footer & Signature ---
+    story.append(Spacer(1, 0.3 * inch))
+    
+    # Signature Block
+    sig_data = [
+        ["", Paragraph(f"<b>Authorized By:</b> {report_obj.auth_by}", normal_style)],
+        ["", Paragraph(f"<b>Date:</b> {(request_obj.completed_at or timezone.now()).strftime('%Y-%m-%d %H:%M')}", normal_style)],
+        ["", Paragraph("__________________________________", normal_style)],
+        ["", Paragraph("Signature", styles['Normal'])]
+    ]
+    
+    sig_table = Table(sig_data, colWidths=[4*inch, 3*inch])
+    sig_table.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+    ]))
+    story.append(sig_table)
+    
+    # Disclaimer
+    story.append(Spacer(1, 0.3 * inch))
+    disclaimer_style = styles['Normal'].clone('Disclaimer')
+    disclaimer_style.fontSize = 8
+    disclaimer_style.textColor = colors.gray
+    disclaimer_style.alignment = 1 # Center
+    
+    disclaimer_text = """
+    DISCLAIMER: This report is generated based on images provided by the clinician and may be subject to change upon review of the entire slide at the reading centre. 
+    This report acts solely as a guide for clinical correlation. The reading centre is not responsible for any complications arising during patient treatment.
+    """
+    story.append(Paragraph(disclaimer_text, disclaimer_style))
+
+    # Build PDF
+    doc.build(story)
+    pdf = buffer.getvalue()
+    buffer.close()
+    
+    return pdf
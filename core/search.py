@@ -0,0 +1,173 @@
+# core/search.py
+"""
+Indexed search over Requests for the ``q`` filter of the list views.
+
+Matching keeps the old ``icontains`` semantics (case-insensitive substring)
+but is served from an index:
+
+* PostgreSQL - ``pg_trgm`` GIN indexes on ``UPPER(patient_id)``,
+  ``UPPER(centre_name)`` and ``UPPER(full_name)``, which Django's
+  ``icontains`` lookups use directly.
+* SQLite - an FTS5 table with the trigram tokenizer (``core_request_fts``),
+  kept in sync by the signals in ``core/signals.py``.
+
+Status and doctor names are resolved to value lists first (few rows), so every
+arm of the OR stays index-friendly. Queries shorter than three characters fall
+back to plain ``icontains`` because trigrams need three characters.
+
+The list views and the JSON API show matches best first (``rank_by_relevance``):
+trigram similarity on PostgreSQL, FTS5 bm25 on SQLite. Relevance has no
+stable cursor, so ranked searches page by offset rather than by keyset.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'core_request_fts'
+TEXT_FIELDS = ('patient_id', 'centre_name')
+DEFAULT_FIELDS = ('patient_id', 'centre_name', 'status', 'doctor')
+RANK = 'search_rank'
+
+_fts_ready = {}
+
+
+def fts_available(alias='default'):
+    """True if the SQLite FTS5 shadow table exists on connection ``alias``."""
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        return False
+    if alias not in _fts_ready:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts_ready[alias] = cursor.fetchone() is not None
+    return _fts_ready[alias]
+
+
+def fts_match_expression(query, fields):
+    """FTS5 MATCH string searching ``query`` as one phrase in ``fields``."""
+    phrase = query.replace('"', '""')
+    return f'{{{" ".join(fields)}}} : "{phrase}"'
+
+
+def _text_match(qs, query, fields):
+    if len(query) >= 3 and fts_available(qs.db):
+        return Q(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [fts_match_expression(query, fields)],
+        ))
+    return reduce(or_, (Q(**{f'{field}__icontains': query}) for field in fields))
+
+
+def search_filter(qs, query, fields=DEFAULT_FIELDS):
+    """Q object matching ``query`` in any of ``fields`` (substring, case-insensitive)."""
+    from .models import PortalUser, Request
+
+    needle = query.lower()
+    clauses = []
+
+    text_fields = [f for f in fields if f in TEXT_FIELDS]
+    if text_fields:
+        clauses.append(_text_match(qs, query, text_fields))
+
+    if 'status' in fields:
+        statuses = [value for value, _ in Request.STATUS_CHOICES if needle in value.lower()]
+        if statuses:
+            clauses.append(Q(status__in=statuses))
+
+    if 'doctor' in fields:
+        doctor_ids = list(
+            PortalUser.objects.filter(role='Doctor', full_name__icontains=query).values_list('pk', flat=True)
+        )
+        if doctor_ids:
+            clauses.append(Q(doctor_id__in=doctor_ids))
+
+    return reduce(or_, clauses) if clauses else Q(pk__in=[])
+
+
+def filter_search(qs, query, fields=DEFAULT_FIELDS):
+    """Restrict ``qs`` to rows matching ``query``; ordering is left untouched."""
+    query = (query or '').strip()
+    if not query:
+        return qs
+    return qs.filter(search_filter(qs, query, fields))
+
+
+def rank_by_relevance(qs, query, fields=DEFAULT_FIELDS):
+    """Order ``qs`` (already narrowed by ``filter_search``) best match first.
+
+    The queryset's own ordering breaks ties, so rows that only match on status
+    or doctor name keep it. ``qs`` comes back unchanged where there is nothing
+    to rank by (no text fields, or a short query on SQLite).
+    """
+    from .models import Request
+
+    query = (query or '').strip()
+    text_fields = [f for f in fields if f in TEXT_FIELDS]
+    if not query or not text_fields:
+        return qs
+
+    vendor = connections[qs.db].vendor
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        from django.db.models.functions import Greatest
+
+        similarities = [TrigramSimilarity(f, query) for f in text_fields]
+        rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        return qs.annotate(**{RANK: rank}).order_by(F(RANK).desc(), *qs.query.order_by)
+
+    if len(query) >= 3 and fts_available(qs.db):
+        # bm25() is lower-is-better; unmatched rows get NULL
+        rank = RawSQL(
+            f"SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = {Request._meta.db_table}.id",
+            [fts_match_expression(query, text_fields)],
+        )
+        return qs.annotate(**{RANK: rank}).order_by(F(RANK).asc(nulls_last=True), *qs.query.order_by)
+
+    return qs
+
+
+def is_ranked(qs):
+    """Whether ``qs`` is ordered by ``rank_by_relevance`` (and so is paged by offset, not keyset)."""
+    return RANK in qs.query.annotations
+
+
+def ranked_search(qs, query, fields=DEFAULT_FIELDS):
+    """The ``q`` filter of the list views: ``filter_search``, then ``rank_by_relevance``."""
+    return rank_by_relevance(filter_search(qs, query, fields), query, fields)
+
+
+def search_requests(query, queryset=None, fields=DEFAULT_FIELDS, limit=50):
+    """Best-matching requests for ``query``, most relevant first (then newest first)."""
+    from .models import Request
+
+    qs = queryset if queryset is not None else Request.objects.order_by('-timestamp')
+    return ranked_search(qs, query, fields)[:limit]
+
+
+# ==========================================
+# FTS5 SHADOW TABLE MAINTENANCE (SQLite)
+# ==========================================
+def index_requests(requests, alias='default'):
+    """Insert or refresh the FTS rows for ``requests``."""
+    if not fts_available(alias):
+        return
+    rows = [(r.pk, r.patient_id, r.centre_name) for r in requests]
+    if not rows:
+        return
+    with connections[alias].cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk, _, _ in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE}(rowid, patient_id, centre_name) VALUES (%s, %s, %s)", rows
+        )
+
+
+def unindex_requests(pks, alias='default'):
+    """Remove the FTS rows for the given request ids."""
+    if not fts_available(alias) or not pks:
+        return
+    with connections[alias].cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in pks])
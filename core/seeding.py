@@ -0,0 +1,193 @@
+# core/seeding.py
+"""
+Deterministic synthetic data for benchmarks and query-budget tests.
+
+``seed_cases(total)`` tops the benchmark data set up to ``total`` requests:
+doctors, lab techs, requests with their history, reports for the completed
+ones and a small pool of synthetic slide images shared by all requests.
+Row ``i`` is generated from ``Random(seed, i)`` alone, so growing a data set
+from 1k to 100k rows gives the same first 1k rows as seeding 1k directly,
+and the same seed always gives the same data.
+
+Everything is written with ``bulk_create`` in batches; the search index,
+tech workload counters and counter cache are brought up to date at the end
+because no ``post_save`` handlers run.
+"""
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Q
+
+from . import counters
+from .history import ensure_partitions
+from .models import PortalUser, Report, Request, RequestHistory
+from .search import index_requests
+
+CENTRES = ['North Eye Clinic', 'South Vision Centre', 'East Cornea Unit', 'West Retina Hospital', 'Central Eye Care']
+DOCTOR_PREFIX = 'bench_doc_'
+TECH_PREFIX = 'bench_tech_'
+IMAGE_DIR = 'slides/bench'
+PASSWORD = 'benchmark'
+# Row i is submitted i minutes after this (1M rows cover about two years)
+EPOCH = datetime(2024, 1, 1, 8, 0, tzinfo=dt_timezone.utc)
+
+EYES = [code for code, _ in Request.EYE_CHOICES]
+SAMPLES = [code for code, _ in Request.SAMPLE_CHOICES]
+IMPRESSIONS = [code for code, _ in Request.IMPRESSION_CHOICES]
+UNITS = [code for code, _ in Request.DURATION_UNIT_CHOICES]
+STAINS = ['Grams', 'KOH-CFW', 'Grams, KOH-CFW']
+FINDINGS = [
+    'Gram-positive cocci in clusters seen.',
+    'Fungal filaments seen on KOH-CFW.',
+    'No organisms seen.',
+    'Gram-negative bacilli seen, moderate pus cells.',
+    'Acanthamoeba cysts seen.',
+]
+
+
+@contextmanager
+def manual_timestamps():
+    """Let bulk_create keep the generated ``timestamp`` / ``updated_at`` values."""
+    fields = [Request._meta.get_field('timestamp'), Request._meta.get_field('updated_at'),
+              RequestHistory._meta.get_field('timestamp')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def seed_users(doctors, techs):
+    """The benchmark doctors and techs (created once); returns ``(doctors, techs)`` ordered by username."""
+    password = make_password(PASSWORD)
+    wanted = [(f'{DOCTOR_PREFIX}{i:03d}', 'Doctor', f'Dr. Bench {i:03d}') for i in range(doctors)]
+    wanted += [(f'{TECH_PREFIX}{i:03d}', 'Lab', f'Tech Bench {i:03d}') for i in range(techs)]
+    PortalUser.objects.bulk_create(
+        [PortalUser(username=username, role=role, full_name=name, password=password) for username, role, name in wanted],
+        ignore_conflicts=True,
+    )
+    users = PortalUser.objects.filter(username__in=[username for username, _, _ in wanted]).order_by('username')
+    return [u for u in users if u.is_doctor()], [u for u in users if u.is_lab()]
+
+
+def seed_images(count, seed):
+    """``count`` small noise PNGs shared by the benchmark requests; returns their storage names."""
+    from PIL import Image
+
+    names = []
+    for k in range(count):
+        name = f'{IMAGE_DIR}/slide_{seed}_{k:03d}.png'
+        if not default_storage.exists(name):
+            rng = random.Random(f'{seed}:image:{k}')
+            image = Image.effect_noise((96, 72), 40 + rng.randint(0, 60)).convert('RGB')
+            buf = BytesIO()
+            image.save(buf, 'PNG')
+            name = default_storage.save(name, ContentFile(buf.getvalue()))
+        names.append(name)
+    return names
+
+
+def bench_requests():
+    return Request.objects.filter(doctor__username__startswith=DOCTOR_PREFIX)
+
+
+def build_case(i, rng, doctors, techs, images, completed_ratio):
+    """Unsaved Request, its history and (if completed) report for row ``i``."""
+    submitted = EPOCH + timedelta(minutes=i, seconds=rng.randint(0, 59))
+    doctor = doctors[rng.randrange(len(doctors))]
+    roll = rng.random()
+    if roll < completed_ratio:
+        status, tech = 'Completed', techs[rng.randrange(len(techs))]
+    elif roll < completed_ratio + (1 - completed_ratio) * 0.9:
+        status, tech = 'Pending', techs[rng.randrange(len(techs))]
+    else:
+        status, tech = 'Pending', None  # unassigned, for the "assign to me" flow
+    assigned = submitted + timedelta(minutes=rng.randint(1, 120)) if tech else None
+    completed = assigned + timedelta(hours=rng.randint(2, 96)) if status == 'Completed' else None
+
+    case = Request(
+        timestamp=submitted,
+        updated_at=completed or assigned or submitted,
+        doctor=doctor,
+        centre_name=rng.choice(CENTRES),
+        patient_id=f'BP{i:07d}',
+        eye=rng.choice(EYES),
+        sample=rng.choice(SAMPLES),
+        duration_value=rng.randint(1, 30),
+        duration_unit=rng.choice(UNITS),
+        impression=rng.choice(IMPRESSIONS),
+        stain=rng.choice(STAINS),
+        image=images[i % len(images)],
+        status=status,
+        assigned_to=tech,
+        assignment_status='Completed' if completed else ('Assigned' if tech else 'Unassigned'),
+        assigned_date=assigned,
+        completed_at=completed,
+    )
+    history = [RequestHistory(request=case, user=doctor, action='Submitted', timestamp=submitted,
+                              note=f'Submitted by {doctor.full_name}')]
+    report = None
+    if completed:
+        report = Report(
+            request=case,
+            rc_code=f'RC{rng.randint(100, 999)}',
+            lab_id=f'L{i:07d}',
+            quality=rng.choice(['Good', 'Moderate', 'Bad']),
+            sample_suitability=rng.random() > 0.1,
+            report_text=rng.choice(FINDINGS),
+            auth_by=tech.full_name,
+        )
+        history.append(RequestHistory(request=case, user=tech, action='Report Completed', timestamp=completed,
+                                      note=f'Report authored by {tech.full_name}'))
+    return case, history, report
+
+
+def seed_cases(total, doctors=20, techs=5, images=12, seed=42, completed_ratio=0.6, batch_size=5000,
+               progress=None):
+    """Add benchmark requests until there are ``total``; returns how many were created."""
+    doctor_users, tech_users = seed_users(doctors, techs)
+    image_names = seed_images(images, seed)
+    start = bench_requests().count()
+
+    with manual_timestamps():
+        for offset in range(start, total, batch_size):
+            rows = [
+                build_case(i, random.Random(seed * 1_000_003 + i), doctor_users, tech_users, image_names,
+                           completed_ratio)
+                for i in range(offset, min(offset + batch_size, total))
+            ]
+            with transaction.atomic():
+                cases = Request.objects.bulk_create([case for case, _, _ in rows])
+                # bulk_create filled in the pks; point the children at them
+                Report.objects.bulk_create([report for _, _, report in rows if report is not None])
+                RequestHistory.objects.bulk_create([entry for _, history, _ in rows for entry in history])
+                index_requests(cases)
+            if progress:
+                progress(offset + len(rows), total)
+
+    created = max(total - start, 0)
+    if created:
+        sync_workloads(tech_users)
+        ensure_partitions()  # backdated history landed in the default partition
+        counters.invalidate(*(u.pk for u in doctor_users + tech_users))
+    return created
+
+
+def sync_workloads(techs):
+    """Set ``pending_workload`` from the rows (bulk_create bypassed core/workload.py)."""
+    pending = dict(
+        PortalUser.objects.filter(pk__in=[t.pk for t in techs])
+        .annotate(n=Count('assigned_requests', filter=Q(assigned_requests__status='Pending')))
+        .values_list('pk', 'n')
+    )
+    for tech in techs:
+        PortalUser.objects.filter(pk=tech.pk).update(pending_workload=pending[tech.pk])
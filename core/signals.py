@@ -0,0 +1,94 @@
+# core/signals.py
+"""
+Model signal handlers. Connected in CoreConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, pdf_cache
+from .models import PortalUser, Report, Request
+from .search import index_requests, unindex_requests
+
+SEARCH_FIELDS = {'patient_id', 'centre_name'}
+COUNTER_FIELDS = {'doctor', 'assigned_to', 'status', 'assignment_status'}
+
+
+# ==========================================
+# SEARCH INDEX SYNC
+# ==========================================
+@receiver(post_save, sender=Request, dispatch_uid='core_request_search_index')
+def update_search_index(sender, instance, created, update_fields=None, using='default', **kwargs):
+    if update_fields and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    index_requests([instance], alias=using)
+
+
+@receiver(post_delete, sender=Request, dispatch_uid='core_request_search_unindex')
+def remove_from_search_index(sender, instance, using='default', **kwargs):
+    unindex_requests([instance.pk], alias=using)
+
+
+# ==========================================
+# REPORT PDF CACHE
+# ==========================================
+@receiver(post_save, sender=Request, dispatch_uid='core_request_pdf_cache')
+@receiver(post_delete, sender=Request, dispatch_uid='core_request_pdf_cache_delete')
+def invalidate_request_pdf(sender, instance, **kwargs):
+    pdf_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Report, dispatch_uid='core_report_pdf_cache')
+@receiver(post_delete, sender=Report, dispatch_uid='core_report_pdf_cache_delete')
+def invalidate_report_pdf(sender, instance, **kwargs):
+    pdf_cache.invalidate(instance.request_id)
+
+
+# ==========================================
+# PER-USER COUNTERS
+# ==========================================
+@receiver(post_init, sender=Request, dispatch_uid='core_request_counter_owners')
+def remember_counter_owners(sender, instance, **kwargs):
+    # Loaded owners, so a reassignment also refreshes the previous tech
+    instance._counter_owners = (instance.doctor_id, instance.assigned_to_id)
+
+
+@receiver(post_save, sender=Request, dispatch_uid='core_request_counters')
+def invalidate_request_counters(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not COUNTER_FIELDS.intersection(update_fields):
+        return
+    counters.invalidate(instance.doctor_id, instance.assigned_to_id, *instance._counter_owners)
+    instance._counter_owners = (instance.doctor_id, instance.assigned_to_id)
+
+
+@receiver(post_delete, sender=Request, dispatch_uid='core_request_counters_delete')
+def invalidate_deleted_request_counters(sender, instance, **kwargs):
+    counters.invalidate(instance.doctor_id, instance.assigned_to_id, *instance._counter_owners)
+
+
+@receiver(post_save, sender=Report, dispatch_uid='core_report_counters')
+@receiver(post_delete, sender=Report, dispatch_uid='core_report_counters_delete')
+def invalidate_report_counters(sender, instance, **kwargs):
+    if Report.request.is_cached(instance):
+        owners = (instance.request.doctor_id, instance.request.assigned_to_id)
+    else:
+        owners = Request.objects.filter(pk=instance.request_id).values_list('doctor_id', 'assigned_to_id').first()
+    if owners:
+        counters.invalidate(*owners)
+
+
+@receiver(post_save, sender=PortalUser, dispatch_uid='core_user_counters')
+def reset_new_user_counters(sender, instance, created, **kwargs):
+    # A recycled primary key must not inherit someone else's cached counts
+    if created:
+        counters.invalidate(instance.pk)
+
+
+# ==========================================
+# API ETAGS
+# ==========================================
+@receiver(post_save, sender=Report, dispatch_uid='core_report_touch_request')
+@receiver(post_delete, sender=Report, dispatch_uid='core_report_touch_request_delete')
+def touch_request(sender, instance, **kwargs):
+    # Report fields are part of the case's API representation
+    Request.objects.filter(pk=instance.request_id).update(updated_at=timezone.now())
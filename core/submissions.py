@@ -0,0 +1,46 @@
+# core/submissions.py
+"""
+Bulk submission of several samples in one transaction.
+
+``submit_batch`` assigns the whole batch with one workload read
+(``workload.assign_batch``) and writes the cases, their history (buffered by
+``history.writing()``) and the techs' ``assigned`` events with one
+``bulk_create`` each. ``bulk_create`` does not send ``post_save``, so the
+search index, counter cache and derivative generation that the signal
+handlers and ``doctor_submit_view`` take care of for a single submission
+are done here explicitly.
+"""
+from . import counters, events, history
+from .imaging import schedule_derivatives
+from .models import Request
+from .search import index_requests
+from .workload import assign_batch
+
+
+def _assignment_note(case, tech):
+    if tech is not None:
+        return f"assigned to {tech.full_name}"
+    return f"auto-assigned to {case.assigned_to.full_name} (least busy)"
+
+
+def submit_batch(doctor, cases, tech=None):
+    """Save the unsaved ``cases`` for ``doctor``; returns them, or None if no tech is available."""
+    for case in cases:
+        case.doctor = doctor
+        case.status = 'Pending'
+
+    with history.writing():
+        if not assign_batch(cases, tech):
+            return None
+        created = Request.objects.bulk_create(cases)
+
+        for case in created:
+            history.record(case, doctor, 'Submitted',
+                           f"Submitted by Dr. {doctor.full_name} in a batch of {len(created)} and "
+                           f"{_assignment_note(case, tech)}")
+        events.publish(*(events.case_event('assigned', case, case.assigned_to_id) for case in created))
+
+        index_requests(created)
+        counters.invalidate(doctor.pk, *{case.assigned_to_id for case in created})
+        schedule_derivatives(*(case.pk for case in created))
+    return created
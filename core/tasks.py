@@ -0,0 +1,68 @@
+# core/tasks.py
+"""
+Background job tasks (see core/jobs.py). Each takes the ``Job`` and its kwargs.
+"""
+import csv
+import io
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from . import pdf_cache
+from .imaging import generate_derivatives
+from .jobs import task
+from .models import PortalUser, Report, Request
+from .pdf_export import EXPORT_DIR, export_pdf_zip
+
+
+@task('generate_derivatives')
+def derivatives(job, request_id):
+    request_obj = Request.objects.filter(pk=request_id).first()
+    if request_obj is None:
+        return {'written': False}
+    return {'written': generate_derivatives(request_obj)}
+
+
+@task('render_report_pdf')
+def render_report_pdf(job, request_id):
+    """Fill the PDF cache so the first download of a finished report is a cache hit."""
+    report = Report.objects.select_related('request').filter(request_id=request_id).first()
+    if report is None:
+        return {'file': None}
+    return {'file': pdf_cache.ensure_pdf(report.request, report)}
+
+
+@task('export_csv')
+def export_csv(job, user_id):
+    """The user's CSV export, written to storage for ``download_job_file``."""
+    from .views import (
+        CSV_CHUNK_SIZE, DOCTOR_CSV_HEADER, LAB_CSV_HEADER, csv_filename, doctor_csv_cases, doctor_csv_row,
+        lab_csv_cases, lab_csv_row,
+    )
+
+    user = PortalUser.objects.get(pk=user_id)
+    if user.is_doctor():
+        prefix, header, cases, to_row = 'doctor_cases', DOCTOR_CSV_HEADER, doctor_csv_cases(user), doctor_csv_row
+    else:
+        prefix, header, cases, to_row = 'lab_cases', LAB_CSV_HEADER, lab_csv_cases(user), lab_csv_row
+
+    filename = csv_filename(prefix)
+    rows = 0
+    with tempfile.TemporaryFile() as fh:
+        text = io.TextIOWrapper(fh, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(header)
+        for values in cases.iterator(chunk_size=CSV_CHUNK_SIZE):
+            writer.writerow(to_row(values))
+            rows += 1
+        text.detach()  # flushes; storage reads the binary file
+        fh.seek(0)
+        name = default_storage.save(f"{EXPORT_DIR}/{job.pk}/{filename}", File(fh))
+    return {'file': name, 'filename': filename, 'rows': rows}
+
+
+@task('export_pdf_zip')
+def pdf_zip(job, **filters):
+    """ZIP of report PDFs for an audit (see core/pdf_export.py)."""
+    return export_pdf_zip(job, **filters)
@@ -1,3 +1,1830 @@
-from django.test import TestCase
+# core/tests.py
 
-# Create your tests here.
+import asyncio
+import importlib
+import shutil
+import tempfile
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, reverse
+
+from .models import PortalUser, Request, RequestHistory
+from .views import DoctorReportListView, LabQueueListView, LabReportListView
+
+
+# ==========================================
+# HELPERS
+# ==========================================
+def make_user(username, role, **extra):
+    extra.setdefault('full_name', username.title())
+    return PortalUser.objects.create_user(username=username, password='x', role=role, **extra)
+
+
+def make_request(doctor, tech=None, status='Pending', **extra):
+    fields = dict(
+        doctor=doctor,
+        centre_name='Centre A',
+        patient_id='P01',
+        stain='Grams',
+        image='slides/test.png',
+        status=status,
+        assigned_to=tech,
+        assignment_status='Assigned' if tech else 'Unassigned',
+    )
+    fields.update(extra)
+    return Request.objects.create(**fields)
+
+
+def clone_rows(instance, count, **vary):
+    """Insert ``count`` copies of the unsaved ``instance`` with one executemany.
+
+    ``vary`` maps a field name to ``callable(i)`` returning the DB value for
+    row ``i``. Much faster than bulk_create for building large fixtures.
+    """
+    model = type(instance)
+    fields = [f for f in model._meta.concrete_fields if not (f.primary_key and f.get_internal_type().endswith('AutoField'))]
+    base = [f.get_db_prep_save(f.pre_save(instance, True), connection) for f in fields]
+    position = {f.name: i for i, f in enumerate(fields)}
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join(connection.ops.quote_name(f.column) for f in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    rows = []
+    for i in range(count):
+        row = list(base)
+        for name, value in vary.items():
+            row[position[name]] = value(i)
+        rows.append(row)
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def tiny_png(name='slide.png'):
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new('RGB', (8, 8), 'purple').save(buf, 'PNG')
+    return SimpleUploadedFile(name, buf.getvalue(), content_type='image/png')
+
+
+def submission_data(**extra):
+    data = {
+        'patient_id': 'P100', 'centre_name': 'Centre A', 'eye': 'OD', 'sample': 'Corneal Scraping',
+        'duration_value': 3, 'duration_unit': 'Days', 'impression': 'Fungal', 'stain': 'Grams',
+        'image': tiny_png(),
+    }
+    data.update(extra)
+    return data
+
+
+class MediaRootMixin:
+    """Point MEDIA_ROOT at a throwaway directory for tests that upload files."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._media_root = tempfile.mkdtemp()
+        cls._media_override = override_settings(MEDIA_ROOT=cls._media_root)
+        cls._media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_override.disable()
+        shutil.rmtree(cls._media_root, ignore_errors=True)
+
+
+def explain(qs):
+    """The database's query plan for ``qs``, as text (PostgreSQL: with seq scans and sorts discouraged)."""
+    sql, params = qs.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+        else:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+
+def view_queryset(view_class, user, query=''):
+    """Build the queryset exactly as the list view would for ``user``."""
+    view = view_class()
+    view.setup(RequestFactory().get('/', {'q': query} if query else {}))
+    view.request.user = user
+    return view.get_queryset()
+
+
+# ==========================================
+# QUERY PLANS: HOT LIST QUERIES
+# ==========================================
+class QueryPlanTests(TestCase):
+    """Fails if a hot list query stops being served by an index.
+
+    SQLite reports full scans as ``SCAN <table>`` and filesorts as
+    ``USE TEMP B-TREE FOR ORDER BY``. On PostgreSQL the planner is pushed
+    away from seq scans and sorts so that only a missing index produces them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        for i in range(30):
+            req = make_request(cls.doctor, cls.tech, status='Completed' if i % 3 else 'Pending',
+                               patient_id=f'P{i:03d}')
+            RequestHistory.objects.create(request=req, user=cls.doctor, action='Submitted')
+
+    def assertIndexed(self, qs, table):
+        plan = explain(qs)
+        if connection.vendor == 'sqlite':
+            self.assertNotRegex(plan, rf'\bSCAN {table}\b', plan)
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+        elif connection.vendor == 'postgresql':
+            self.assertNotIn(f'Seq Scan on {table}', plan)
+            self.assertNotRegex(plan, r'(?m)^\s*(->\s*)?Sort\b', plan)
+
+    def test_doctor_reports_plan(self):
+        self.assertIndexed(view_queryset(DoctorReportListView, self.doctor), 'core_request')
+
+    def test_lab_queue_plan(self):
+        self.assertIndexed(view_queryset(LabQueueListView, self.tech), 'core_request')
+
+    def test_lab_reports_plan(self):
+        self.assertIndexed(view_queryset(LabReportListView, self.tech), 'core_request')
+
+    def test_keyset_page_plan(self):
+        from .pagination import keyset_filter
+
+        last = Request.objects.filter(doctor=self.doctor).order_by('-timestamp', '-id')[10]
+        qs = view_queryset(DoctorReportListView, self.doctor).filter(keyset_filter(last.timestamp, last.pk, True))
+        self.assertIndexed(qs[:26], 'core_request')
+
+    def test_request_history_plan(self):
+        req = Request.objects.first()
+        self.assertIndexed(req.history_entries.all()[:20], 'core_requesthistory')
+
+    def test_latest_history_prefetch_plan(self):
+        ids = list(Request.objects.values_list('pk', flat=True)[:10])
+        qs = RequestHistory.objects.latest_per_request(20).filter(request__in=ids)
+        # The window is fed from the index; only the final, bounded result is re-sorted.
+        plan = explain(qs)
+        self.assertNotIn('Seq Scan on core_requesthistory', plan)
+        self.assertNotRegex(plan, r'\bSCAN core_requesthistory\b')
+        if connection.vendor == 'sqlite':
+            self.assertIn('USING INDEX reqhist_request_ts_idx', plan)
+
+    def test_api_etag_version_plan(self):
+        from django.db.models import Count, Max
+
+        qs = (Request.objects.filter(assigned_to=self.tech, status='Pending').values('assigned_to')
+              .annotate(last=Max('updated_at'), count=Count('pk')).order_by())
+        plan = explain(qs)
+        self.assertIndexed(qs, 'core_request')
+        if connection.vendor == 'sqlite':
+            self.assertIn('COVERING INDEX req_tech_status_upd_idx', plan)
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+    def test_postgres_uses_composite_indexes(self):
+        plan = explain(view_queryset(LabQueueListView, self.tech))
+        self.assertIn('req_tech_status_ts_idx', plan)
+
+
+# ==========================================
+# LIST VIEWS: CONSTANT QUERY COUNT
+# ==========================================
+class ListViewQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+
+    def add_cases(self, n, status):
+        for i in range(n):
+            req = make_request(self.doctor, self.tech, status=status)
+            for action in ('Submitted', 'Assigned'):
+                RequestHistory.objects.create(request=req, user=self.doctor, action=action)
+
+    def query_count(self, user, url_name):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def assertConstantQueries(self, user, url_name, status):
+        self.add_cases(2, status)
+        small = self.query_count(user, url_name)
+        self.add_cases(20, status)
+        self.assertEqual(self.query_count(user, url_name), small)
+
+    def test_doctor_reports(self):
+        self.assertConstantQueries(self.doctor, 'doctor_reports', 'Completed')
+
+    def test_lab_queue(self):
+        self.assertConstantQueries(self.tech, 'lab_queue', 'Pending')
+
+    def test_lab_reports(self):
+        self.assertConstantQueries(self.tech, 'lab_reports', 'Completed')
+
+
+# ==========================================
+# KEYSET PAGINATION
+# ==========================================
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from django.utils import timezone
+
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        for i in range(60):
+            make_request(cls.doctor, cls.tech, patient_id=f'P{i:03d}', centre_name='North' if i % 2 else 'South')
+        # Force timestamp ties so the id tie-breaker is exercised
+        Request.objects.update(timestamp=timezone.now())
+
+    def walk(self, url_name, user, params=None):
+        self.client.force_login(user)
+        seen, query = [], None
+        while True:
+            response = self.client.get(reverse(url_name) + (f'?{query}' if query else ''), params if not query else None)
+            seen.extend(r.pk for r in response.context['object_list'])
+            query = response.context['next_page_query']
+            if not query:
+                return seen, response
+
+    def test_doctor_pages_cover_every_row_once(self):
+        seen, _ = self.walk('doctor_reports', self.doctor)
+        expected = list(Request.objects.filter(doctor=self.doctor).order_by('-timestamp', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_lab_queue_pages_oldest_first(self):
+        seen, _ = self.walk('lab_queue', self.tech)
+        expected = list(Request.objects.filter(assigned_to=self.tech).order_by('timestamp', 'id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_search_filter_is_kept_across_pages(self):
+        seen, response = self.walk('doctor_reports', self.doctor, {'q': 'North'})
+        self.assertEqual(len(seen), 30)
+        self.assertTrue(all(Request.objects.get(pk=pk).centre_name == 'North' for pk in seen))
+
+    def test_previous_page_returns_same_rows(self):
+        self.client.force_login(self.doctor)
+        first = self.client.get(reverse('doctor_reports'))
+        second = self.client.get(reverse('doctor_reports') + '?' + first.context['next_page_query'])
+        back = self.client.get(reverse('doctor_reports') + '?' + second.context['prev_page_query'])
+        self.assertEqual([r.pk for r in back.context['object_list']], [r.pk for r in first.context['object_list']])
+        self.assertIsNone(back.context['prev_page_query'])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse('doctor_reports'), {'after': 'not-a-cursor'})
+        self.assertEqual(len(response.context['object_list']), 25)
+
+
+# ==========================================
+# WORKLOAD COUNTER & AUTO-ASSIGNMENT
+# ==========================================
+class WorkloadTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.busy = make_user('busy', 'Lab', pending_workload=3)
+        cls.idle = make_user('idle', 'Lab', pending_workload=1)
+
+    def refresh(self):
+        self.busy.refresh_from_db()
+        self.idle.refresh_from_db()
+
+    def test_auto_assign_picks_least_busy_in_one_query(self):
+        from .workload import pick_least_busy_tech
+
+        with self.assertNumQueries(1):
+            self.assertEqual(pick_least_busy_tech(), self.idle)
+
+    def test_submit_increments_counter(self):
+        self.client.force_login(self.doctor)
+        self.client.post(reverse('doctor_submit'), submission_data())
+        case = Request.objects.get()
+        self.assertEqual(case.assigned_to, self.idle)
+        self.refresh()
+        self.assertEqual(self.idle.pending_workload, 2)
+
+    def test_completion_decrements_counter(self):
+        case = make_request(self.doctor, self.idle)
+        self.client.force_login(self.idle)
+        self.client.post(reverse('lab_process', args=[case.pk]), {
+            'rc_code': 'RC', 'lab_id': 'L1', 'quality': 'Good', 'sample_suitability': 'on',
+            'report_text': 'Fungal filaments seen', 'auth_by': 'Idle',
+        })
+        case.refresh_from_db()
+        self.assertEqual(case.status, 'Completed')
+        self.assertIsNotNone(case.completed_at)
+        self.refresh()
+        self.assertEqual(self.idle.pending_workload, 0)
+
+    def test_racing_assign_and_complete_move_counter_once(self):
+        from unittest import mock
+
+        from . import views
+
+        unassigned = make_request(self.doctor, patient_id='P02')
+        assigned = make_request(self.doctor, self.idle, patient_id='P03')
+        report = {'rc_code': 'RC', 'lab_id': 'L1', 'quality': 'Good', 'sample_suitability': 'on',
+                  'report_text': 'ok', 'auth_by': 'Idle'}
+        for tech, case, view, data in ((self.busy, unassigned, 'assign_case', {}),
+                                       (self.idle, assigned, 'lab_process', report)):
+            url = reverse(view, args=[case.pk])
+            self.client.force_login(tech)
+            # Both requests read the case before either one wrote it
+            reads = [Request.objects.get(pk=case.pk), Request.objects.get(pk=case.pk)]
+            with mock.patch.object(views, 'get_object_or_404', side_effect=lambda *a, **kw: reads.pop(0)):
+                self.client.post(url, data)
+                self.refresh()
+                before = (self.busy.pending_workload, self.idle.pending_workload)
+                response = self.client.post(url, data)
+            self.assertRedirects(response, reverse('lab_queue'), fetch_redirect_response=False)
+            self.refresh()
+            self.assertEqual((self.busy.pending_workload, self.idle.pending_workload), before)
+        self.assertEqual((self.busy.pending_workload, self.idle.pending_workload), (4, 0))
+
+    def test_reassignment_moves_counter(self):
+        from .workload import assign_to_tech
+
+        case = make_request(self.doctor, self.busy)
+        assign_to_tech(case, self.idle)
+        self.refresh()
+        self.assertEqual((self.busy.pending_workload, self.idle.pending_workload), (2, 2))
+
+    def test_reconcile_fixes_drift(self):
+        make_request(self.doctor, self.busy)
+        call_command('reconcile_workload', stdout=StringIO())
+        self.refresh()
+        self.assertEqual((self.busy.pending_workload, self.idle.pending_workload), (1, 0))
+
+
+# ==========================================
+# COMPLETION TIMESTAMP
+# ==========================================
+class CompletedAtTests(MediaRootMixin, TestCase):
+    def test_doctors_cannot_set_it(self):
+        doctor = make_user('doc', 'Doctor')
+        make_user('tech', 'Lab')
+        self.client.force_login(doctor)
+        self.client.post(reverse('doctor_submit'), submission_data(completed_at='2020-01-01 00:00'))
+        self.assertIsNone(Request.objects.get().completed_at)
+
+    def test_backfill_uses_latest_completion_event(self):
+        from datetime import timedelta
+        from importlib import import_module
+
+        from django.apps import apps
+        from django.utils import timezone
+
+        migration = import_module('core.migrations.0011_request_completed_at')
+        doctor = make_user('doc', 'Doctor')
+        done = make_request(doctor, status='Completed')
+        pending = make_request(doctor)
+        first = RequestHistory.objects.create(request=done, action='Report Completed')
+        again = RequestHistory.objects.create(request=done, action='Report Completed')
+        RequestHistory.objects.filter(pk=first.pk).update(timestamp=timezone.now() - timedelta(days=2))
+        RequestHistory.objects.create(request=done, action='Comment')
+
+        migration.backfill_completed_at(apps, None)
+
+        done.refresh_from_db()
+        pending.refresh_from_db()
+        self.assertEqual(done.completed_at, RequestHistory.objects.get(pk=again.pk).timestamp)
+        self.assertIsNone(pending.completed_at)
+
+
+# ==========================================
+# SEARCH
+# ==========================================
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor', full_name='Meera Rao')
+        cls.tech = make_user('tech', 'Lab')
+        cls.a = make_request(cls.doctor, cls.tech, patient_id='XP0123', centre_name='North Eye Clinic')
+        cls.b = make_request(cls.doctor, cls.tech, patient_id='P9999', centre_name='South Cornea Unit',
+                             status='Completed')
+
+    def search(self, query, fields=('patient_id', 'centre_name', 'status', 'doctor')):
+        from .search import filter_search
+
+        return set(filter_search(Request.objects.all(), query, fields).values_list('pk', flat=True))
+
+    def test_substring_and_case_insensitive(self):
+        self.assertEqual(self.search('p012'), {self.a.pk})
+        self.assertEqual(self.search('CORNEA'), {self.b.pk})
+
+    def test_short_query_falls_back_to_icontains(self):
+        self.assertEqual(self.search('99'), {self.b.pk})
+
+    def test_status_and_doctor_name(self):
+        self.assertEqual(self.search('complet'), {self.b.pk})
+        self.assertEqual(self.search('meera'), {self.a.pk, self.b.pk})
+        self.assertEqual(self.search('meera', fields=('patient_id', 'centre_name')), set())
+
+    def test_index_follows_updates_and_deletes(self):
+        case = make_request(self.doctor, patient_id='QQ777')
+        self.assertEqual(self.search('QQ777'), {case.pk})
+        case.patient_id = 'ZZ888'
+        case.save()
+        self.assertEqual(self.search('QQ777'), set())
+        self.assertEqual(self.search('ZZ888'), {case.pk})
+        case.delete()
+        self.assertEqual(self.search('ZZ888'), set())
+
+    def test_ranked_results(self):
+        from .search import search_requests
+
+        exact = make_request(self.doctor, patient_id='CLIN', centre_name='Clin')
+        results = list(search_requests('clin', fields=('patient_id', 'centre_name')))
+        self.assertEqual(results[0], exact)
+        self.assertIn(self.a, results)
+
+    def test_list_views_and_api_show_best_matches_first(self):
+        exact = make_request(self.doctor, self.tech, patient_id='CLIN', centre_name='Clin')
+        self.client.force_login(self.tech)
+        # The queue is oldest first, so without ranking self.a would lead
+        response = self.client.get(reverse('lab_queue'), {'q': 'clin'})
+        self.assertEqual([r.pk for r in response.context['pending_requests']], [exact.pk, self.a.pk])
+
+        page = self.client.get(reverse('api_queue'), {'q': 'clin', 'fields': 'id', 'limit': 1}).json()
+        self.assertEqual(page['results'], [{'id': exact.pk}])
+        rest = self.client.get(page['next']).json()
+        self.assertEqual((rest['results'], rest['next']), ([{'id': self.a.pk}], None))
+
+    def test_search_uses_index(self):
+        plan = explain(view_queryset(LabQueueListView, self.tech, 'north'))
+        self.assertNotRegex(plan, r'\bSCAN core_request\b')
+
+
+# ==========================================
+# STREAMING CSV EXPORTS
+# ==========================================
+class CSVExportTests(TestCase):
+    ROWS = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Report
+
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        clone_rows(
+            Request(doctor=cls.doctor, assigned_to=cls.tech, centre_name='Centre A', stain='Grams',
+                    image='slides/test.png', assignment_status='Assigned'),
+            cls.ROWS,
+            patient_id=lambda i: f'P{i:06d}',
+            status=lambda i: 'Completed' if i % 2 else 'Pending',
+        )
+        completed = list(Request.objects.filter(status='Completed').values_list('pk', flat=True))
+        clone_rows(
+            Report(rc_code='RC', lab_id='L1', quality='Good', report_text='x' * 500, auth_by='Tech'),
+            len(completed),
+            request=lambda i: completed[i],
+        )
+
+    def stream(self, user, url_name, trace_memory=False):
+        """Return (queries, peak bytes or None, line count) for downloading the export."""
+        import tracemalloc
+
+        self.client.force_login(user)
+        peak = None
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name))
+            if trace_memory:
+                tracemalloc.start()
+            lines = sum(chunk.count(b'\n') for chunk in response.streaming_content)
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        return len(ctx), peak, lines
+
+    def test_doctor_export_streams_in_constant_queries_and_memory(self):
+        queries, peak, lines = self.stream(self.doctor, 'export_doctor_csv', trace_memory=True)
+        self.assertEqual(lines, self.ROWS + 1)
+        self.assertLessEqual(queries, 3)  # session, user, export
+        self.assertLess(peak, 16 * 1024 * 1024)
+
+    def test_lab_export_streams_in_constant_queries(self):
+        queries, _, lines = self.stream(self.tech, 'export_lab_csv')
+        self.assertEqual(lines, self.ROWS + 1)
+        self.assertLessEqual(queries, 3)
+
+    def test_doctor_export_columns(self):
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse('export_doctor_csv'))
+        header, first, second = b''.join(response.streaming_content).decode().splitlines()[:3]
+        pending, completed = sorted([first, second], key=lambda line: 'N/A' not in line)
+        self.assertTrue(header.startswith('Patient ID,Centre,Eye'))
+        self.assertIn('Right Eye (OD)', pending)
+        self.assertIn(',Pending,Tech,N/A,N/A,', pending)
+        self.assertIn(',Yes,' + 'x' * 200 + ',Tech,', completed)
+
+
+# ==========================================
+# REPORT PDF CACHE
+# ==========================================
+class ReportPDFCacheTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Report
+
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.case = make_request(cls.doctor, status='Completed')
+        cls.report = Report.objects.create(request=cls.case, rc_code='RC', lab_id='L1', quality='Good',
+                                           report_text='No organisms seen', auth_by='Tech')
+
+    def setUp(self):
+        self.client.force_login(self.doctor)
+        self.url = reverse('generate_report_pdf', args=[self.case.pk])
+
+    def download(self, **headers):
+        from unittest import mock
+        from . import rendering
+
+        with mock.patch.object(rendering, 'render_report_pdf', wraps=rendering.render_report_pdf) as render:
+            response = self.client.get(self.url, headers=headers)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body, render.call_count
+
+    def test_second_download_is_served_from_cache(self):
+        first, body, renders = self.download()
+        self.assertEqual((first.status_code, renders), (200, 1))
+        self.assertTrue(body.startswith(b'%PDF'))
+        second, cached_body, renders = self.download()
+        self.assertEqual((second.status_code, renders), (200, 0))
+        self.assertEqual(cached_body, body)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('Last-Modified', second)
+
+    def test_matching_etag_returns_304(self):
+        first, _, _ = self.download()
+        response, _, renders = self.download(if_none_match=first['ETag'])
+        self.assertEqual((response.status_code, renders), (304, 0))
+
+    def test_report_change_invalidates(self):
+        first, _, _ = self.download()
+        self.report.report_text = 'Fungal hyphae seen'
+        self.report.save()
+        response, _, renders = self.download(if_none_match=first['ETag'])
+        self.assertEqual((response.status_code, renders), (200, 1))
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+# ==========================================
+# SLIDE IMAGE DERIVATIVES
+# ==========================================
+@override_settings(JOBS_INLINE=True)
+class ImageDerivativeTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+
+    def upload_case(self):
+        self.client.force_login(self.doctor)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('doctor_submit'), submission_data())
+        return Request.objects.get()
+
+    def test_submission_writes_derivatives(self):
+        from PIL import Image
+
+        case = self.upload_case()
+        for field in ('image_thumbnail', 'image_preview', 'image_print'):
+            self.assertTrue(getattr(case, field), field)
+        with Image.open(case.image_preview.path) as preview:
+            self.assertEqual(preview.format, 'WEBP')
+
+    def test_pdf_embeds_print_derivative(self):
+        from .imaging import image_for_pdf
+
+        case = self.upload_case()
+        self.assertEqual(image_for_pdf(case), case.image_print.path)
+
+    def test_backfill_command(self):
+        case = make_request(self.doctor, image=tiny_png())
+        self.assertFalse(case.image_thumbnail)
+        call_command('generate_derivatives', stdout=StringIO())
+        case.refresh_from_db()
+        self.assertTrue(case.image_thumbnail and case.image_preview and case.image_print)
+
+
+# ==========================================
+# MEDIA GATEWAY
+# ==========================================
+class MediaGatewayTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.other = make_user('other', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        cls.case = make_request(cls.doctor, cls.tech, image=tiny_png())
+        with cls.case.image.open('rb') as fh:
+            cls.image_bytes = fh.read()
+
+    def get(self, user, **headers):
+        self.client.force_login(user)
+        return self.client.get(reverse('serve_slide', args=[self.case.pk]), headers=headers)
+
+    def test_owner_and_lab_can_view(self):
+        for user in (self.doctor, self.tech):
+            response = self.get(user)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), self.image_bytes)
+            self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_other_doctor_is_refused(self):
+        self.assertEqual(self.get(self.other).status_code, 404)
+
+    def test_range_request(self):
+        response = self.get(self.doctor, range='bytes=2-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 2-9/{len(self.image_bytes)}')
+        self.assertEqual(b''.join(response.streaming_content), self.image_bytes[2:10])
+        self.assertEqual(self.get(self.doctor, range='bytes=99999-').status_code, 416)
+
+    def test_if_none_match(self):
+        etag = self.get(self.doctor)['ETag']
+        self.assertEqual(self.get(self.doctor, if_none_match=etag).status_code, 304)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect_handoff(self):
+        response = self.get(self.doctor)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.case.image.name)
+        self.assertEqual(response.content, b'')
+
+
+# ==========================================
+# ASGI MODE: ASYNC VIEWS
+# ==========================================
+class AsyncViewTests(MediaRootMixin, TestCase):
+    """The async variants wired in when ASYNC_VIEWS is on (SERVER_MODE=asgi)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Report
+
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        for i in range(30):
+            make_request(cls.doctor, cls.tech, patient_id=f'P{i:02d}', status='Completed' if i % 3 else 'Pending')
+        cls.case = Request.objects.filter(status='Completed').first()
+        cls.pdf_bytes = b'%PDF-1.4 ' + bytes(range(256)) * 400
+        Report.objects.create(request=cls.case, rc_code='RC', lab_id='L1', report_text='ok', auth_by='Tech',
+                              microbiology_pdf=SimpleUploadedFile('lab.pdf', cls.pdf_bytes))
+
+    def use_async_views(self, enabled):
+        """Rebuild the URLconf as it would be with SERVER_MODE=asgi (or back again)."""
+        from django.conf import settings
+
+        from . import urls
+
+        with override_settings(ASYNC_VIEWS=enabled):
+            importlib.reload(urls)
+            importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    def fetch_all(self, user, url_name, context_key):
+        self.client.force_login(user)
+        response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return response, [r.pk for r in response.context[context_key]]
+
+    def compare(self, user, url_name, context_key):
+        sync_response, sync_rows = self.fetch_all(user, url_name, context_key)
+        self.use_async_views(True)
+        self.addCleanup(self.use_async_views, False)
+        async_response, async_rows = self.fetch_all(user, url_name, context_key)
+        self.assertEqual(async_rows, sync_rows)
+        return sync_response, async_response
+
+    def test_list_views_match_sync(self):
+        self.compare(self.doctor, 'doctor_reports', 'requests')
+        _, response = self.compare(self.tech, 'lab_queue', 'pending_requests')
+        self.assertEqual(response.context['total_cases'], 30)
+        self.assertEqual(response.context['pending_count'], 10)
+        _, response = self.compare(self.tech, 'lab_reports', 'reports')
+        self.assertEqual(response.context['total_reports'], 20)
+
+    async def read(self, response):
+        self.assertTrue(response.is_async)
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    async def async_download(self, url):
+        return await self.read(await self.async_client.get(url))
+
+    def test_csv_exports_stream_asynchronously(self):
+        for user, url_name in ((self.doctor, 'export_doctor_csv'), (self.tech, 'export_lab_csv')):
+            self.client.force_login(user)
+            self.async_client.force_login(user)
+            expected = b''.join(self.client.get(reverse(url_name)).streaming_content)
+            self.use_async_views(True)
+            try:
+                self.assertEqual(async_to_sync(self.async_download)(reverse(url_name)), expected)
+            finally:
+                self.use_async_views(False)
+
+    async def test_lab_pdf_download(self):
+        self.use_async_views(True)
+        self.addCleanup(self.use_async_views, False)
+        await self.async_client.aforce_login(self.doctor)
+        url = reverse('download_lab_pdf', args=[self.case.pk])
+
+        response = await self.async_client.get(url)
+        self.assertEqual(await self.read(response), self.pdf_bytes)
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+        response = await self.async_client.get(url, headers={'range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(await self.read(response), self.pdf_bytes[100:200])
+
+        await self.async_client.aforce_login(self.tech)
+        self.assertEqual((await self.async_client.get(url)).status_code, 302)
+
+
+# ==========================================
+# COLD START
+# ==========================================
+class StartupProfileTests(TestCase):
+    def test_boot_skips_pdf_and_image_stacks(self):
+        out = StringIO()
+        call_command('startup_profile', budget_ms=60_000, top=5, stdout=out)
+        self.assertIn('Within startup budget', out.getvalue())
+        self.assertIn('microbio_portal.wsgi', out.getvalue())
+
+    def test_over_budget_fails(self):
+        from django.core.management import CommandError
+
+        with self.assertRaisesMessage(CommandError, 'budget is 0 ms'):
+            call_command('startup_profile', budget_ms=0, top=0, stdout=StringIO())
+
+    @override_settings(STARTUP_FORBIDDEN_MODULES=['django.contrib.auth'])
+    def test_eager_import_fails(self):
+        from django.core.management import CommandError
+
+        with self.assertRaisesMessage(CommandError, 'imported at boot: django.contrib.auth'):
+            call_command('startup_profile', budget_ms=60_000, top=0, stdout=StringIO())
+
+
+# ==========================================
+# PER-USER COUNTERS
+# ==========================================
+class CounterCacheTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        cls.other_tech = make_user('other', 'Lab', pending_workload=5)
+        make_request(cls.doctor, cls.tech)
+        make_request(cls.doctor, cls.tech, status='Completed')
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+
+    def counts(self, user):
+        from .counters import user_counts
+
+        return user_counts(user)
+
+    def test_toolbar_counts_cost_no_sql_once_cached(self):
+        self.client.force_login(self.doctor)
+        self.client.get(reverse('doctor_submit'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('doctor_submit'))
+        self.assertEqual((response.context['total_cases'], response.context['pending_cases']), (2, 1))
+        self.assertFalse([q for q in ctx.captured_queries if 'core_request' in q['sql']])
+
+    def test_submission_and_completion_refresh_counts(self):
+        self.assertEqual(self.counts(self.doctor), {'total': 2, 'pending': 1, 'completed': 1, 'assigned': 1})
+        self.client.force_login(self.doctor)
+        self.client.post(reverse('doctor_submit'), submission_data(assigned_to=self.tech.pk))
+        self.assertEqual(self.counts(self.doctor)['pending'], 2)
+        self.assertEqual(self.counts(self.tech)['pending'], 2)
+
+        case = Request.objects.filter(status='Pending').first()
+        self.client.force_login(self.tech)
+        self.client.post(reverse('lab_process', args=[case.pk]), {
+            'rc_code': 'RC', 'lab_id': 'L1', 'quality': 'Good', 'sample_suitability': 'on',
+            'report_text': 'Fungal filaments seen', 'auth_by': 'Tech',
+        })
+        self.assertEqual(self.counts(self.doctor)['completed'], 2)
+        self.assertEqual(self.counts(self.tech)['pending'], 1)
+
+    def test_reassignment_refreshes_previous_tech(self):
+        from .workload import assign_to_tech
+
+        self.assertEqual(self.counts(self.tech)['total'], 2)
+        assign_to_tech(Request.objects.filter(status='Pending').get(), self.other_tech)
+        self.assertEqual(self.counts(self.tech)['total'], 1)
+        self.assertEqual(self.counts(self.other_tech)['total'], 1)
+
+
+# ==========================================
+# BATCH SUBMISSION
+# ==========================================
+def batch_data(samples, **extra):
+    data = {
+        'samples-TOTAL_FORMS': len(samples),
+        'samples-INITIAL_FORMS': 0,
+        'samples-MIN_NUM_FORMS': 0,
+        'samples-MAX_NUM_FORMS': 50,
+    }
+    for i, sample in enumerate(samples):
+        data.update({f'samples-{i}-{key}': value for key, value in submission_data(**sample).items()})
+    data.update(extra)
+    return data
+
+
+class BatchSubmissionTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.busy = make_user('busy', 'Lab', pending_workload=3)
+        cls.idle = make_user('idle', 'Lab', pending_workload=1)
+
+    def setUp(self):
+        self.client.force_login(self.doctor)
+
+    def submit(self, count, **extra):
+        samples = [{'patient_id': f'B{i:03d}'} for i in range(count)]
+        return self.client.post(reverse('doctor_batch_submit'), batch_data(samples, **extra),
+                                headers={'accept': 'application/json'})
+
+    def test_auto_assign_spreads_by_workload(self):
+        response = self.submit(3)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['submitted']), 3)
+        assigned = sorted(Request.objects.values_list('assigned_to__username', flat=True))
+        self.assertEqual(assigned, ['busy', 'idle', 'idle'])
+        self.busy.refresh_from_db()
+        self.idle.refresh_from_db()
+        self.assertEqual((self.busy.pending_workload, self.idle.pending_workload), (4, 3))
+        self.assertEqual(RequestHistory.objects.filter(action='Submitted').count(), 3)
+
+    def test_queries_do_not_grow_with_batch_size(self):
+        from .search import search_requests
+
+        with CaptureQueriesContext(connection) as small:
+            self.submit(2)
+        Request.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.submit(8).status_code, 201)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(len(search_requests('B007')), 1)
+
+    def test_explicit_tech_and_html_redirect(self):
+        page = self.client.get(reverse('doctor_batch_submit'), {'rows': 8})
+        self.assertEqual(page.context['formset'].total_form_count(), 8)
+        samples = [{'patient_id': 'X1'}, {'patient_id': 'X2'}]
+        response = self.client.post(reverse('doctor_batch_submit'), batch_data(samples, assigned_to=self.busy.pk))
+        self.assertRedirects(response, reverse('doctor_reports'))
+        self.assertEqual(set(Request.objects.values_list('assigned_to', flat=True)), {self.busy.pk})
+
+    def test_rows_cannot_pick_their_own_tech(self):
+        from .forms import BatchSampleFormSet
+
+        formset = BatchSampleFormSet(queryset=Request.objects.none(), prefix='samples')
+        self.assertNotIn('assigned_to', formset.forms[0].fields)
+        samples = [{'patient_id': 'R1', 'assigned_to': self.doctor.pk}, {'patient_id': 'R2', 'assigned_to': 'x'}]
+        response = self.client.post(reverse('doctor_batch_submit'), batch_data(samples),
+                                    headers={'accept': 'application/json'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(Request.objects.values_list('assigned_to__username', flat=True)), ['idle', 'idle'])
+
+    def test_batch_is_validated_together(self):
+        samples = [{'patient_id': 'D1'}, {'patient_id': 'D1'}]
+        response = self.client.post(reverse('doctor_batch_submit'), batch_data(samples),
+                                    headers={'accept': 'application/json'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('same eye and sample', response.json()['errors']['batch'][0])
+        self.assertFalse(Request.objects.exists())
+
+
+# ==========================================
+# JSON API
+# ==========================================
+class JSONAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Report
+
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        for i in range(30):
+            make_request(cls.doctor, cls.tech, patient_id=f'Q{i:02d}')
+        cls.done = make_request(cls.doctor, cls.tech, patient_id='DONE', status='Completed')
+        Report.objects.create(request=cls.done, rc_code='RC', lab_id='L9', report_text='ok', auth_by='Tech')
+        RequestHistory.objects.create(request=cls.done, user=cls.tech, action='Report Completed')
+
+    def get(self, user, url_name, *args, headers=None, **params):
+        self.client.force_login(user)
+        return self.client.get(reverse(url_name, args=args), params, headers=headers or {})
+
+    def test_queue_pages_with_sparse_fields(self):
+        response = self.get(self.tech, 'api_queue', fields='id,patient_id', limit=20)
+        data = response.json()
+        self.assertEqual(data['count'], 30)
+        self.assertEqual(list(data['results'][0]), ['id', 'patient_id'])
+        self.assertEqual(data['results'][0]['patient_id'], 'Q00')
+        rest = self.client.get(data['next']).json()
+        self.assertEqual([r['patient_id'] for r in rest['results']], [f'Q{i:02d}' for i in range(20, 30)])
+        self.assertIsNone(rest['next'])
+
+    def test_unchanged_poll_is_304_in_one_query(self):
+        etag = self.get(self.tech, 'api_queue')['ETag']
+        self.client.force_login(self.tech)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('api_queue'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'core_request' in q['sql']]), 1)
+
+    def test_etag_changes_with_rows_and_reports(self):
+        etag = self.get(self.tech, 'api_reports')['ETag']
+        self.done.report.lab_id = 'L10'
+        self.done.report.save()
+        response = self.get(self.tech, 'api_reports', headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['lab_id'], 'L10')
+
+        etag = self.get(self.tech, 'api_queue')['ETag']
+        Request.objects.filter(patient_id='Q05').delete()
+        self.assertEqual(self.get(self.tech, 'api_queue', headers={'if-none-match': etag}).status_code, 200)
+
+    def test_case_detail(self):
+        response = self.get(self.doctor, 'api_case', self.done.pk, fields='patient_id,auth_by,history')
+        data = response.json()
+        self.assertEqual((data['patient_id'], data['auth_by']), ('DONE', 'Tech'))
+        self.assertEqual(data['history'][0]['action'], 'Report Completed')
+        again = self.get(self.doctor, 'api_case', self.done.pk, fields='patient_id,auth_by,history',
+                         headers={'if-none-match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+    def test_errors_are_json(self):
+        other = make_user('other', 'Doctor')
+        self.assertEqual(self.get(other, 'api_case', self.done.pk).status_code, 404)
+        self.assertEqual(self.get(self.doctor, 'api_queue').status_code, 403)
+        self.assertEqual(self.get(self.tech, 'api_queue', fields='nope').status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_queue')).status_code, 401)
+
+
+# ==========================================
+# LIVE UPDATES (SERVER-SENT EVENTS)
+# ==========================================
+class CaseEventTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+
+    def kinds(self, user):
+        from .models import CaseEvent
+
+        return list(CaseEvent.objects.filter(recipient=user).order_by('id').values_list('kind', flat=True))
+
+    def test_published_where_history_is_written(self):
+        self.client.force_login(self.doctor)
+        self.client.post(reverse('doctor_submit'), submission_data(assigned_to=self.tech.pk))
+        self.assertEqual(self.kinds(self.tech), ['assigned'])
+
+        case = Request.objects.get()
+        self.client.force_login(self.tech)
+        self.client.post(reverse('lab_process', args=[case.pk]), {
+            'rc_code': 'RC', 'lab_id': 'L1', 'quality': 'Good', 'sample_suitability': 'on',
+            'report_text': 'Fungal filaments seen', 'auth_by': 'Tech',
+            'microbiology_pdf': SimpleUploadedFile('lab.pdf', b'%PDF-1.4'),
+        })
+        self.assertEqual(self.kinds(self.doctor), ['completed', 'pdf_uploaded'])
+        self.assertEqual(self.kinds(self.tech), ['assigned'])
+
+    async def read_stream(self, **headers):
+        response = await self.async_client.get(reverse('case_events'), headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    def test_wsgi_stream_returns_pending_events_and_closes(self):
+        from . import events
+
+        first = make_request(self.doctor, self.tech, status='Completed', patient_id='P1')
+        with self.captureOnCommitCallbacks(execute=True):
+            events.publish(events.case_event('completed', first, self.doctor.pk))
+        self.async_client.force_login(self.doctor)
+
+        # A fresh page starts from the newest event and only records its id
+        body = async_to_sync(self.read_stream)()
+        self.assertNotIn('event:', body)
+        last_id = int(body.split('id: ')[1].split()[0])
+
+        second = make_request(self.doctor, self.tech, status='Completed', patient_id='P2')
+        events.publish(events.case_event('completed', second, self.doctor.pk))
+        body = async_to_sync(self.read_stream)(**{'last-event-id': str(last_id)})
+        self.assertIn('retry: 15000', body)
+        self.assertIn('event: completed', body)
+        self.assertIn('"patient_id": "P2"', body)
+        self.assertNotIn('"patient_id": "P1"', body)
+
+        self.async_client.force_login(make_user('admin', 'Admin'))
+        self.assertEqual(async_to_sync(self.async_client.get)(reverse('case_events')).status_code, 302)
+
+    async def test_broker_wakes_open_stream(self):
+        from asgiref.sync import sync_to_async
+
+        from . import events
+
+        stream = events.stream(self.tech.pk, 0, follow=True)
+        self.assertIn('retry: 3000', await anext(stream))
+        waiting = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        self.assertFalse(waiting.done())
+
+        case = await sync_to_async(make_request)(self.doctor, self.tech, patient_id='P9')
+        await sync_to_async(events.publish)(events.case_event('assigned', case, self.tech.pk))
+        # What the on-commit hook does, from another thread like a sync view
+        await asyncio.to_thread(events.broker.notify, [self.tech.pk])
+        chunk = await asyncio.wait_for(waiting, timeout=5)
+        self.assertIn('event: assigned', chunk)
+        await stream.aclose()
+        self.assertFalse(events.broker._waiters)
+
+    async def test_streams_past_the_limit_poll_instead(self):
+        from . import events
+
+        with self.settings(EVENTS_MAX_STREAMS=1):
+            held = events.stream(self.tech.pk, 0, follow=True)
+            self.assertIn('retry: 3000', await anext(held))
+            extra = [chunk async for chunk in events.stream(self.doctor.pk, 0, follow=True)]
+            self.assertIn('retry: 15000', extra[0])  # ended at once, like a WSGI response
+            await held.aclose()
+        self.assertFalse(events.broker._waiters)
+
+
+# ==========================================
+# BACKGROUND JOBS
+# ==========================================
+class JobQueueTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+
+    def register(self, name, func):
+        from . import jobs
+
+        jobs.task(name)(func)
+        self.addCleanup(jobs.TASKS.pop, name)
+
+    def test_export_job_status_and_download(self):
+        for i in range(3):
+            make_request(self.doctor, self.tech, patient_id=f'P{i}')
+        self.client.force_login(self.doctor)
+        response = self.client.post(reverse('api_export_csv'))
+        self.assertEqual(response.status_code, 202)
+        status_url = response['Location']
+        self.assertEqual(self.client.get(status_url).json()['status'], 'queued')
+
+        out = StringIO()
+        call_command('run_worker', once=True, stdout=out)
+        self.assertIn('ran 1 job(s)', out.getvalue())
+        status = self.client.get(status_url).json()
+        self.assertEqual((status['status'], status['result']['rows']), ('done', 3))
+
+        body = b''.join(self.client.get(status['download']).streaming_content).decode()
+        self.assertEqual(body.count('\n'), 4)
+        self.assertTrue(body.startswith('Patient ID,'))
+
+        self.client.force_login(self.tech)
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+        self.assertEqual(self.client.get(status['download']).status_code, 404)
+
+    def test_failures_retry_with_backoff(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from . import jobs
+        from .models import Job
+
+        self.register('flaky', lambda job: 1 / 0)
+        job = jobs.enqueue('flaky', max_attempts=2)
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertFalse(jobs.run(jobs.claim('w1')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=20))
+        self.assertIn('ZeroDivisionError', job.error)
+        self.assertIsNone(jobs.claim('w1'))  # not due yet
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.work('w1'), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_each_job_is_claimed_once_and_stale_locks_expire(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from . import jobs
+        from .models import Job
+
+        self.register('noop', lambda job, value: value)
+        job = jobs.enqueue('noop', value=7)
+        claimed = jobs.claim('w1')
+        self.assertEqual((claimed.pk, claimed.locked_by), (job.pk, 'w1'))
+        self.assertIsNone(jobs.claim('w2'))
+
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), (1, 0))
+        self.assertTrue(jobs.run(jobs.claim('w2')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.attempts), ('done', 7, 2))
+
+        with self.assertRaises(LookupError):
+            jobs.enqueue('missing')
+
+    def test_heartbeats_keep_long_jobs_and_dead_workers_run_out_of_attempts(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from . import jobs
+        from .models import Job
+
+        self.register('noop', lambda job: None)
+        long_ago = timezone.now() - timedelta(hours=1)
+
+        job = jobs.enqueue('noop', max_attempts=2)
+        claimed = jobs.claim('w1')
+        Job.objects.filter(pk=job.pk).update(started_at=long_ago)
+        jobs.set_progress(claimed, 5, 10)
+        self.assertEqual(jobs.requeue_stale(), (0, 0))  # running for an hour, but alive
+
+        # The worker dies on every attempt: requeued once, then failed for good
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=long_ago)
+        self.assertEqual(jobs.requeue_stale(), (1, 0))
+        jobs.claim('w2')
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=long_ago)
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.requeue_stale(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIn('no heartbeat', job.error)
+        self.assertIsNone(jobs.claim('w3'))
+
+    @override_settings(JOBS_INLINE=True)
+    def test_completed_report_pdf_is_prerendered(self):
+        from . import pdf_cache
+
+        case = make_request(self.doctor, self.tech)
+        self.client.force_login(self.tech)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('lab_process', args=[case.pk]), {
+                'rc_code': 'RC', 'lab_id': 'L1', 'quality': 'Good', 'sample_suitability': 'on',
+                'report_text': 'Fungal filaments seen', 'auth_by': 'Tech',
+            })
+        case.refresh_from_db()
+        name = pdf_cache.cached_pdf_name(case.pk, pdf_cache.report_fingerprint(case, case.report))
+        self.assertIsNotNone(pdf_cache.modified_time(name))
+
+
+# ==========================================
+# BATCH PDF EXPORT
+# ==========================================
+class PDFExportTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from django.utils import timezone
+
+        from .models import Report
+
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        cls.cases = []
+        for i, centre in enumerate(['Centre A', 'Centre A', 'Centre A', 'Centre B']):
+            case = make_request(cls.doctor, cls.tech, status='Completed', patient_id=f'P{i}', centre_name=centre,
+                                completed_at=timezone.now())
+            Report.objects.create(request=case, rc_code='RC', lab_id=f'L{i}', report_text='ok', auth_by='Tech')
+            cls.cases.append(case)
+        make_request(cls.doctor, cls.tech, patient_id='PENDING', centre_name='Centre A')
+
+    @override_settings(PDF_EXPORT_PROCESSES=2)
+    def test_zip_reuses_cache_and_renders_the_rest_in_a_pool(self):
+        import zipfile
+
+        from django.core.files.storage import default_storage
+
+        from . import pdf_cache
+        from .models import Job
+
+        first = Request.objects.select_related('report').get(pk=self.cases[0].pk)
+        with default_storage.open(pdf_cache.ensure_pdf(first, first.report), 'rb') as fh:
+            cached = fh.read()
+
+        self.client.force_login(self.tech)
+        response = self.client.post(reverse('lab_report_export'), {'centre_name': 'centre a'})
+        job = Job.objects.get(task='export_pdf_zip')
+        self.assertRedirects(response, f"{reverse('lab_report_export')}?job={job.pk}")
+        call_command('run_worker', once=True, stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done', job.error)
+        self.assertEqual((job.progress, job.total), (3, 3))
+        self.assertEqual((job.result['cached'], job.result['rendered']), (1, 2))
+        status = self.client.get(reverse('api_job', args=[job.pk])).json()
+        self.assertEqual(status['progress'], 3)
+
+        body = b''.join(self.client.get(status['download']).streaming_content)
+        with zipfile.ZipFile(BytesIO(body)) as archive:
+            names = sorted(archive.namelist())
+            self.assertEqual(names, [f'P{i}_{self.cases[i].pk}.pdf' for i in range(3)])
+            self.assertEqual(archive.read(names[0]), cached)
+            self.assertTrue(archive.read(names[2]).startswith(b'%PDF'))
+        # Rendered PDFs went into the cache for single downloads too
+        last = Request.objects.select_related('report').get(pk=self.cases[2].pk)
+        self.assertIsNotNone(pdf_cache.modified_time(
+            pdf_cache.cached_pdf_name(last.pk, pdf_cache.report_fingerprint(last, last.report))))
+
+    @override_settings(PDF_EXPORT_PROCESSES=1)
+    def test_cases_are_streamed_not_loaded_up_front(self):
+        from unittest import mock
+
+        from django.db.models import QuerySet
+
+        from . import pdf_export
+        from .models import Job
+
+        streams = []
+        write_zip = pdf_export.write_zip
+
+        def spy(archive, cases, progress, processes):
+            streams.append(cases)
+            return write_zip(archive, cases, progress, processes)
+
+        job = Job.objects.create(task='export_pdf_zip')
+        with mock.patch.object(pdf_export, 'write_zip', spy):
+            result = pdf_export.export_pdf_zip(job, centre_name='Centre B')
+        self.assertNotIsInstance(streams[0], (list, QuerySet))
+        self.assertEqual((result['reports'], result['cached'], result['rendered']), (1, 0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.progress, job.total), (1, 1))
+
+    def test_filters_are_validated(self):
+        from .models import Job
+
+        self.client.force_login(self.tech)
+        response = self.client.post(reverse('lab_report_export'), {'date_from': '2026-02-01', 'date_to': '2026-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        self.assertFalse(Job.objects.exists())
+
+        self.client.force_login(self.doctor)
+        self.assertEqual(self.client.get(reverse('lab_report_export')).status_code, 302)
+
+
+# ==========================================
+# PERFORMANCE INSTRUMENTATION
+# ==========================================
+@override_settings(PERF_INSTRUMENTATION=True)
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        for i in range(5):
+            make_request(cls.doctor, cls.tech, patient_id=f'P{i}')
+
+    def setUp(self):
+        from . import instrumentation
+
+        instrumentation.reset()
+        self.client.force_login(self.doctor)
+
+    def test_server_timing_header_and_log_line(self):
+        import json
+
+        with self.assertLogs('core.performance', 'INFO') as logs:
+            response = self.client.get(reverse('doctor_reports'))
+        timing = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'db', 'tpl', 'view', 'total'})
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['view'], line['status']), ('doctor_reports', 200))
+        self.assertGreater(line['queries'], 0)
+        self.assertIn(f'desc="{line["queries"]} queries"', timing['db'])
+        self.assertGreater(line['template_ms'], 0)
+        self.assertEqual(line['bytes'], len(response.content))
+
+    def test_staff_percentiles(self):
+        from . import instrumentation
+
+        with self.assertLogs('core.performance', 'INFO'):
+            for _ in range(3):
+                self.client.get(reverse('doctor_reports'))
+            self.assertEqual(self.client.get(reverse('performance_stats')).status_code, 403)
+            self.client.force_login(make_user('ops', 'Lab', is_staff=True))
+            stats = self.client.get(reverse('performance_stats')).json()
+        self.assertEqual(stats['views']['doctor_reports']['count'], 3)
+        self.assertEqual(set(stats['views']['doctor_reports']['total_ms']), {'p50', 'p90', 'p95', 'p99', 'max'})
+        self.assertEqual(instrumentation.percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 90), 9)
+
+    async def test_asgi_counts_queries_run_in_threads(self):
+        await self.async_client.aforce_login(self.doctor)
+        with self.assertLogs('core.performance', 'INFO'):
+            response = await self.async_client.get(reverse('api_reports'))
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+    @override_settings(PERF_INSTRUMENTATION=False)
+    def test_off_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('doctor_reports')))
+
+
+# ==========================================
+# SYNTHETIC DATA AND VIEW BENCHMARKS
+# ==========================================
+class BenchmarkDataTests(MediaRootMixin, TestCase):
+    def test_seeding_is_deterministic_and_incremental(self):
+        from . import seeding
+
+        self.assertEqual(seeding.seed_cases(40, doctors=3, techs=2, images=2, batch_size=15), 40)
+        self.assertEqual(seeding.seed_cases(60, doctors=3, techs=2, images=2, batch_size=15), 20)
+        self.assertEqual(seeding.seed_cases(60, doctors=3, techs=2, images=2), 0)
+        first = list(seeding.bench_requests().order_by('patient_id')
+                     .values_list('patient_id', 'doctor__username', 'status', 'centre_name', 'timestamp')[:40])
+        completed = seeding.bench_requests().filter(status='Completed')
+        self.assertEqual(completed.filter(report__isnull=False).count(), completed.count())
+        for tech in PortalUser.objects.filter(username__startswith=seeding.TECH_PREFIX):
+            self.assertEqual(tech.pending_workload, tech.assigned_requests.filter(status='Pending').count())
+
+        Request.objects.all().delete()
+        seeding.seed_cases(40, doctors=3, techs=2, images=2, batch_size=7)
+        again = list(seeding.bench_requests().order_by('patient_id')
+                     .values_list('patient_id', 'doctor__username', 'status', 'centre_name', 'timestamp'))
+        self.assertEqual(again, first)
+
+    def test_benchmark_views_writes_results(self):
+        import json
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as fh:
+            call_command('benchmark_views', sizes=[120], repeat=1, output=fh.name, only=['lab_queue', 'doctor_submit POST'],
+                         stdout=StringIO())
+            results = json.load(open(fh.name))['results']
+        self.assertEqual([r['scenario'] for r in results], ['doctor_submit POST', 'lab_queue', 'lab_queue ?q='])
+        self.assertTrue(all(r['status'] in (200, 302) and r['queries'] > 0 for r in results))
+        # the submit was rolled back
+        self.assertEqual(Request.objects.count(), 120)
+
+
+# ==========================================
+# QUERY BUDGETS AND N+1 DETECTION
+# ==========================================
+class QueryBudgetTests(MediaRootMixin, TestCase):
+    """Each core URL runs as many queries at 360 rows as at 120, and never repeats a query shape."""
+
+    def test_every_url_has_a_scenario(self):
+        from .benchmarks import uncovered_url_names
+
+        self.assertEqual(uncovered_url_names(), [])
+
+    def test_query_count_independent_of_row_count(self):
+        from .benchmarks import SCENARIOS, build_context, run_scenario
+        from .nplusone import detect_repeated_queries
+        from .seeding import seed_cases
+
+        counts = {}
+        for size in (120, 360):
+            seed_cases(size, doctors=3, techs=2, images=2)
+            ctx = build_context()
+            for scenario in SCENARIOS:
+                with self.subTest(scenario=scenario.name, rows=size), detect_repeated_queries(label=scenario.name):
+                    result = run_scenario(scenario, ctx, repeat=1)
+                    self.assertLess(result['status'], 400)
+                    counts.setdefault(scenario.name, []).append(result['queries'])
+        for name, (small, large) in counts.items():
+            with self.subTest(scenario=name):
+                self.assertEqual(large, small)
+
+
+class NPlusOneDetectorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        for i in range(6):
+            make_request(cls.doctor, cls.tech, patient_id=f'P{i}')
+
+    def test_query_shape(self):
+        from .nplusone import query_shape
+
+        self.assertEqual(query_shape("SELECT * FROM t WHERE id = 12 AND name = 'it''s'"),
+                         "SELECT * FROM t WHERE id = %s AND name = %s")
+        self.assertEqual(query_shape('SELECT * FROM t WHERE id IN (%s, %s,\n %s)'),
+                         query_shape('SELECT * FROM t WHERE id IN (%s)'))
+
+    def test_per_row_access_raises_with_stack(self):
+        from .nplusone import RepeatedQueryError, detect_repeated_queries
+
+        with self.assertRaises(RepeatedQueryError) as ctx, detect_repeated_queries(threshold=3):
+            [req.doctor.full_name for req in Request.objects.all()]
+        self.assertIn('core_portaluser', str(ctx.exception))
+        self.assertIn('test_per_row_access_raises_with_stack', str(ctx.exception))
+
+        with detect_repeated_queries(threshold=3) as detector:
+            [req.doctor.full_name for req in Request.objects.select_related('doctor')]
+        self.assertEqual(detector.reported, [])
+
+    @override_settings(NPLUSONE_DETECTION=True)
+    def test_middleware_logs(self):
+        from .nplusone import NPlusOneMiddleware
+
+        def view(request):
+            [req.assigned_to.full_name for req in Request.objects.all()]
+            return HttpResponse()
+
+        with self.assertLogs('core.nplusone', 'WARNING') as logs:
+            NPlusOneMiddleware(view)(RequestFactory().get('/lab/queue/'))
+        self.assertIn('GET /lab/queue/', logs.output[0])
+
+    @override_settings(NPLUSONE_DETECTION=True, PERF_INSTRUMENTATION=True)
+    async def test_async_middlewares_share_the_sql_hooks(self):
+        from asgiref.sync import sync_to_async
+
+        from django.core.signals import request_started
+        from django.db import connection as default_connection
+
+        from .instrumentation import ServerTimingMiddleware
+        from .nplusone import NPlusOneMiddleware
+
+        async def view(request):
+            await sync_to_async(lambda: [req.assigned_to.full_name for req in Request.objects.all()])()
+            return HttpResponse()
+
+        stack = ServerTimingMiddleware(NPlusOneMiddleware(view))
+        await request_started.asend(sender=None)  # as the ASGI handler does
+        with self.assertLogs('core.nplusone', 'WARNING'), self.assertLogs('core.performance', 'INFO'):
+            response = await stack(RequestFactory().get('/lab/queue/'))
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+        wrappers = await sync_to_async(lambda: [w.__module__ for w in default_connection.execute_wrappers])()
+        self.assertEqual(sorted(wrappers), ['core.instrumentation', 'core.nplusone'])
+
+
+# ==========================================
+# CASE ARCHIVE
+# ==========================================
+class ArchiveTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from .models import Report
+
+        cls.doctor = make_user('doc', 'Doctor', full_name='Dr. Old')
+        cls.other = make_user('other', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        long_ago = timezone.now() - timedelta(days=400)
+        cls.old = []
+        for i in range(5):
+            case = make_request(cls.doctor, cls.tech, status='Completed', patient_id=f'OLD{i}',
+                                completed_at=long_ago, assignment_status='Completed')
+            Report.objects.create(request=case, rc_code='RC', lab_id=f'LAB{i}', quality='Good',
+                                  report_text='Fungal filaments', auth_by='Tech')
+            RequestHistory.objects.create(request=case, user=cls.doctor, action='Submitted')
+            cls.old.append(case)
+        cls.recent = make_request(cls.doctor, cls.tech, status='Completed', patient_id='NEW1',
+                                  completed_at=timezone.now())
+        cls.pending = make_request(cls.doctor, cls.tech, patient_id='PEND1')
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+
+    def archive(self, **kwargs):
+        from .archive import archive_cases, cutoff
+
+        return archive_cases(cutoff(365), **kwargs)
+
+    def test_archive_models_mirror_live_columns(self):
+        from .models import ArchivedReport, ArchivedRequest, ArchivedRequestHistory, Report
+
+        for live, archived in ((Request, ArchivedRequest), (Report, ArchivedReport),
+                               (RequestHistory, ArchivedRequestHistory)):
+            live_columns = {f.attname for f in live._meta.concrete_fields}
+            archived_columns = {f.attname for f in archived._meta.concrete_fields} - {'archived_at'}
+            self.assertEqual(archived_columns, live_columns, archived.__name__)
+
+    def test_archive_deletes_every_table_that_references_cases(self):
+        from .archive import CASE_CHILDREN
+
+        references = {(rel.related_model, rel.field.column) for rel in Request._meta.related_objects}
+        self.assertEqual(set(CASE_CHILDREN), references)
+
+    def test_moves_old_completed_cases_in_batches(self):
+        from .counters import user_counts
+        from .models import ArchivedRequest, ArchivedRequestHistory, Report
+
+        self.assertEqual(user_counts(self.doctor)['total'], 7)  # now cached
+
+        seen = []
+        self.assertEqual(self.archive(batch_size=2, progress=seen.append), 5)
+        self.assertEqual(seen, [2, 4, 5])
+        self.assertEqual(set(Request.objects.values_list('patient_id', flat=True)), {'NEW1', 'PEND1'})
+        self.assertFalse(Report.objects.filter(request_id__in=[c.pk for c in self.old]).exists())
+
+        archived = ArchivedRequest.objects.get(pk=self.old[0].pk)
+        self.assertEqual((archived.patient_id, archived.report.lab_id), ('OLD0', 'LAB0'))
+        self.assertEqual(archived.timestamp, self.old[0].timestamp)
+        self.assertEqual(ArchivedRequestHistory.objects.filter(request__in=[c.pk for c in self.old]).count(), 5)
+        self.assertEqual(user_counts(self.doctor)['total'], 2)
+        self.assertFalse(view_queryset(DoctorReportListView, self.doctor, 'OLD1').exists())
+        self.assertEqual(self.archive(), 0)
+
+    def test_archive_views(self):
+        self.archive()
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse('case_archive'), {'q': 'lab3'})
+        self.assertEqual([case.patient_id for case in response.context['cases']], ['OLD3'])
+
+        csv_body = b''.join(self.client.get(reverse('export_archive_csv')).streaming_content).decode()
+        self.assertEqual(csv_body.count('OLD'), 5)
+        self.assertNotIn('NEW1', csv_body)
+
+        response = self.client.get(reverse('archive_report_pdf', args=[self.old[0].pk]))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(reverse('archive_report_pdf', args=[self.old[0].pk])).status_code, 404)
+        self.assertEqual(list(self.client.get(reverse('case_archive')).context['cases']), [])
+
+    def test_archive_list_query_count_is_constant(self):
+        from .archive import archive_batch, cutoff
+
+        self.client.force_login(self.tech)
+        archive_batch(cutoff(365), batch_size=2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('case_archive'))
+        self.archive()
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(len(self.client.get(reverse('case_archive')).context['cases']), 5)
+        self.assertEqual(len(large), len(small))
+
+
+# ==========================================
+# CASE HISTORY
+# ==========================================
+class HistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user('doc', 'Doctor')
+        cls.tech = make_user('tech', 'Lab')
+        cls.case = make_request(cls.doctor)
+
+    def test_writing_inserts_entries_together_before_commit(self):
+        from . import history
+
+        with CaptureQueriesContext(connection) as ctx:
+            with history.writing():
+                for action in ('Submitted', 'Assigned', 'Note'):
+                    history.record(self.case, self.doctor, action)
+                self.assertFalse(RequestHistory.objects.exists())
+        self.assertEqual(RequestHistory.objects.count(), 3)
+        self.assertEqual(sum('INSERT' in q['sql'] for q in ctx.captured_queries), 1)
+
+    def test_entries_roll_back_with_the_block(self):
+        from . import history
+
+        with self.assertRaises(RuntimeError), history.writing():
+            history.record(self.case, self.doctor, 'Submitted')
+            raise RuntimeError
+        with history.writing():
+            history.record(self.case, self.doctor, 'Kept')
+            try:
+                with history.writing():
+                    history.record(self.case, self.doctor, 'Dropped')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(list(RequestHistory.objects.values_list('action', flat=True)), ['Kept'])
+
+    def test_entries_are_append_only(self):
+        from . import history
+
+        entry = history.record(self.case, self.doctor, 'Submitted')  # outside writing(): saved at once
+        entry.note = 'edited'
+        with self.assertRaises(ValueError):
+            entry.save()
+
+    def test_assign_case_records_history(self):
+        case = make_request(self.doctor, patient_id='P02')
+        self.client.force_login(self.tech)
+        self.client.post(reverse('assign_case', args=[case.pk]))
+        self.assertEqual(list(case.history_entries.values_list('action', 'user')), [('Assigned', self.tech.pk)])
+
+    def test_prune_and_compact(self):
+        from datetime import datetime, timezone as dt_timezone
+
+        from . import history
+
+        with history.writing():
+            for i in range(5):
+                history.record(self.case, self.doctor, f'Step {i}')
+        RequestHistory.objects.filter(action__in=['Step 0', 'Step 1']).update(
+            timestamp=datetime(2020, 1, 15, tzinfo=dt_timezone.utc))
+
+        with self.assertNumQueries(9):  # per batch: id lookup, savepoint, DELETE, release; then an empty lookup
+            self.assertEqual(history.prune(datetime(2021, 1, 1, tzinfo=dt_timezone.utc), batch_size=1), 2)
+        self.assertEqual(history.compact(keep_latest=2), 1)
+        self.assertEqual(RequestHistory.objects.count(), 2)
+        self.assertEqual(history.add_months(datetime(2026, 11, 1, tzinfo=dt_timezone.utc), 3).date().isoformat(),
+                         '2027-02-01')
+
+        out = StringIO()
+        call_command('compact_history', months=1, keep_latest=1, stdout=out)
+        self.assertIn('Trimmed 1 entry', out.getvalue())
+
+    def test_compact_works_through_requests_in_batches(self):
+        from . import history
+
+        cases = [self.case, make_request(self.doctor), make_request(self.doctor)]
+        for case in cases:
+            for i in range(3):
+                history.record(case, self.doctor, f'Step {i}')
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(history.compact(keep_latest=1, batch_size=2), 6)
+        rankings = [q for q in ctx.captured_queries if 'ROW_NUMBER' in q['sql'].upper()]
+        self.assertEqual(len(rankings), 2)  # cases 1-2, then case 3
+        self.assertEqual(sorted(RequestHistory.objects.values_list('request_id', 'action')),
+                         [(case.pk, 'Step 2') for case in cases])
+
+
+# ==========================================
+# PIN SIGN-IN
+# ==========================================
+@override_settings(PIN_MAX_FAILURES=3, PIN_MAX_FAILURES_PER_IP=10, PIN_LOCKOUT_SECONDS=30, TRUSTED_PROXY_COUNT=0)
+class PINAuthTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .auth import make_pin
+
+        cls.user = make_user('doc', 'Doctor', pin_code=make_pin('1234'))
+
+    def setUp(self):
+        from . import throttle
+
+        throttle.get_cache().clear()
+        self.request = RequestFactory().post('/login/', REMOTE_ADDR='10.0.0.1')
+
+    @contextmanager
+    def assertNoUserLookup(self):
+        """The lockout check may read the throttle cache table, but never the users."""
+        with CaptureQueriesContext(connection) as queries:
+            yield
+        self.assertEqual([q['sql'] for q in queries if 'core_portaluser' in q['sql']], [])
+
+    def login(self, pin, username='doc', ip='10.0.0.1'):
+        from django.contrib.auth import authenticate
+
+        self.request.META['REMOTE_ADDR'] = ip
+        return authenticate(self.request, username=username, pin=pin)
+
+    def test_pins_are_stored_hashed(self):
+        from django.conf import settings
+
+        from .auth import check_pin, make_pin
+
+        self.assertNotIn('1234', self.user.pin_code)
+        self.assertNotEqual(make_pin('1234'), make_pin('1234'))  # salted
+        self.assertTrue(check_pin('1234', self.user.pin_code))
+        self.assertFalse(check_pin('1235', self.user.pin_code))
+        self.assertFalse(check_pin('1234', ''))
+        with override_settings(SECRET_KEY='rotated', SECRET_KEY_FALLBACKS=[settings.SECRET_KEY]):
+            self.assertTrue(check_pin('1234', self.user.pin_code))
+
+    def test_migration_hashes_plain_pins_in_the_current_format(self):
+        from importlib import import_module
+
+        from django.apps import apps
+
+        from .auth import check_pin
+
+        migration = import_module('core.migrations.0020_portaluser_hashed_pin')
+        plain = make_user('tech', 'Lab', pin_code='4321')
+        hashed = self.user.pin_code
+
+        migration.hash_pins(apps, None)
+
+        plain.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertTrue(check_pin('4321', plain.pin_code))
+        self.assertEqual(self.user.pin_code, hashed)  # already hashed, left alone
+
+    def test_lockout_rejects_before_any_query_and_doubles(self):
+        from unittest import mock
+
+        from . import throttle
+
+        self.assertEqual(self.login('1234'), self.user)
+        with self.assertLogs('core.auth', 'WARNING'):
+            for _ in range(3):
+                self.assertIsNone(self.login('0000'))
+        with self.assertNoUserLookup():
+            self.assertIsNone(self.login('1234'))  # right PIN, but locked out
+        self.assertIsNone(self.login('1234', ip='10.0.0.2'))  # the username is locked from any client
+
+        later = throttle.time.time() + 31
+        with mock.patch.object(throttle.time, 'time', return_value=later):
+            self.assertEqual(throttle.retry_after(self.request, 'doc'), 0)
+            with self.assertLogs('core.auth', 'WARNING'):
+                for _ in range(3):
+                    self.login('0000')
+            self.assertEqual(throttle.retry_after(self.request, 'doc'), 60)
+        self.assertEqual([throttle.lockout_seconds(n) for n in (1, 4, 20)], [30, 240, 3600])
+
+    def test_ip_limit_covers_many_usernames(self):
+        from . import throttle
+
+        with self.assertLogs('core.auth', 'WARNING'):
+            for i in range(10):
+                self.login('0000', username=f'guess{i}')
+        self.assertGreater(throttle.retry_after(self.request, 'doc'), 0)
+        self.request.META['REMOTE_ADDR'] = '10.0.0.9'
+        self.assertEqual(throttle.retry_after(self.request, 'doc'), 0)
+
+    def test_client_ip_behind_proxies(self):
+        from . import throttle
+
+        self.request.META['HTTP_X_FORWARDED_FOR'] = '6.6.6.6, 10.0.0.5'  # client-supplied, then our proxy's entry
+        with override_settings(TRUSTED_PROXY_COUNT=1):
+            self.assertEqual(throttle.client_ip(self.request), '10.0.0.5')
+        with override_settings(TRUSTED_PROXY_COUNT=3):
+            self.assertEqual(throttle.client_ip(self.request), '')
+
+        # Unknown deployment: failures from one address never lock out other usernames
+        with override_settings(TRUSTED_PROXY_COUNT=None):
+            self.assertEqual(throttle.client_ip(self.request), '')
+            for i in range(10):
+                self.login('0000', username=f'guess{i}')
+            self.assertEqual(throttle.retry_after(self.request, 'doc'), 0)
+            self.assertEqual(self.login('1234'), self.user)
+
+    def test_throttle_cache_is_shared_between_workers(self):
+        from django.core.cache.backends.db import DatabaseCache
+
+        from . import throttle
+
+        self.assertIsInstance(throttle.get_cache(), DatabaseCache)
+        self.assertEqual(throttle.check_shared_cache(), [])
+        with override_settings(THROTTLE_CACHE='default'):  # LocMemCache
+            self.assertEqual([w.id for w in throttle.check_shared_cache()], ['core.W001'])
+
+    def test_password_login_pages_lock_out(self):
+        from django.urls import reverse
+
+        with self.assertLogs('core.auth', 'WARNING'):
+            for _ in range(3):
+                response = self.client.post('/login/', {'username': 'doc', 'password': 'wrong'})
+        self.assertContains(response, 'Too many attempts')
+        with self.assertNoUserLookup():
+            response = self.client.post('/login/', {'username': 'doc', 'password': 'x'})  # right password, locked out
+        self.assertContains(response, 'Too many attempts')
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+        # LOGIN_URL, from any client
+        response = self.client.post(reverse('login'), {'username': 'doc', 'password': 'x'}, REMOTE_ADDR='10.0.0.2')
+        self.assertContains(response, 'Too many attempts')
+
+    def test_metrics_and_login_form(self):
+        from . import throttle
+        from .forms_login import PINLoginForm
+
+        self.assertTrue(PINLoginForm({'username': 'doc', 'pin': '1234'}, request=self.request).is_valid())
+        with self.assertLogs('core.auth', 'WARNING'):
+            for _ in range(3):
+                form = PINLoginForm({'username': 'doc', 'pin': '9999'}, request=self.request)
+                self.assertFalse(form.is_valid())
+        self.assertIn('Too many attempts', str(form.errors))
+        self.assertIn('Too many attempts', str(PINLoginForm({'username': 'doc', 'pin': '1234'},
+                                                            request=self.request).errors))
+
+        stats = throttle.metrics()['last_5m']
+        self.assertEqual((stats['success'], stats['failure'], stats['lockout'], stats['throttled']), (1, 2, 1, 1))
+        self.assertEqual(stats['failure_rate'], 0.75)
@@ -0,0 +1,175 @@
+# core/throttle.py
+"""
+Throttling and lockout for sign-in, kept entirely in the ``THROTTLE_CACHE``
+cache alias, which every worker process must share (Redis, or the database
+cache table without it; a system check warns about process-local backends).
+
+A 4-digit PIN has 10,000 values, so guessing has to be stopped online.
+Passwords (``/login/`` and the admin) go through the same counters, so one
+lockout covers both. Failed attempts are counted per username and per
+client IP within ``PIN_FAILURE_WINDOW`` seconds. Reaching
+``PIN_MAX_FAILURES`` (per username) or ``PIN_MAX_FAILURES_PER_IP`` locks
+that username / IP out for ``PIN_LOCKOUT_SECONDS``, doubled for every
+further lockout within a day, up to ``PIN_LOCKOUT_MAX_SECONDS``. A
+successful sign-in clears the username's count.
+
+The client IP is only known when ``TRUSTED_PROXY_COUNT`` says how the app
+is reached: 0 for ``REMOTE_ADDR`` (no proxy), N for the address the
+outermost of N trusted proxies put in ``X-Forwarded-For``. Left unset, every
+client may share a proxy's address, so there is no per-IP lock at all (one
+would let anyone lock everybody out); the per-username lock still applies.
+
+``retry_after()`` is one ``get_many`` and runs before the backend looks the
+user up, so a locked-out burst never reaches the user table or the
+password hasher.
+
+Every outcome is counted in per-minute buckets in that same cache;
+``metrics()`` sums them over the last 1, 5 and 60 minutes (served to staff
+at ``/perf/stats/``). Lockouts are also logged on ``core.auth``.
+"""
+import hashlib
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger('core.auth')
+
+CACHE_VERSION = 1
+OUTCOMES = ('success', 'failure', 'throttled', 'lockout')
+METRIC_WINDOWS = (1, 5, 60)  # minutes
+STRIKE_MEMORY = 86400  # seconds a lockout counts towards the next one's length
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_cache():
+    return caches[_setting('THROTTLE_CACHE', 'default')]
+
+
+def check_shared_cache(**kwargs):
+    """System check: counters in a per-process cache multiply the attempt budget by the worker count."""
+    if isinstance(get_cache(), LocMemCache) and not settings.DEBUG:
+        return [checks.Warning(
+            "The sign-in throttle's cache is local to each process, so every worker keeps its own "
+            "failure counts and lockouts.",
+            hint="Point THROTTLE_CACHE at a shared cache (Redis, or DatabaseCache).",
+            id='core.W001',
+        )]
+    return []
+
+
+def _limits():
+    return {'user': _setting('PIN_MAX_FAILURES', 5), 'ip': _setting('PIN_MAX_FAILURES_PER_IP', 20)}
+
+
+def _key(kind, scope, subject):
+    digest = hashlib.sha256(subject.encode()).hexdigest()[:32]  # usernames may hold any character
+    return f"core:login:v{CACHE_VERSION}:{kind}:{scope}:{digest}"
+
+
+def client_ip(request):
+    """The client's address per ``TRUSTED_PROXY_COUNT``; '' when it cannot be told."""
+    proxies = _setting('TRUSTED_PROXY_COUNT', None)
+    if request is None or proxies is None:
+        return ''
+    if proxies == 0:
+        return request.META.get('REMOTE_ADDR', '')
+    # Entries left of the ones our proxies appended are whatever the client sent
+    forwarded = [addr.strip() for addr in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if addr.strip()]
+    return forwarded[-proxies] if len(forwarded) >= proxies else ''
+
+
+def _subjects(request, username):
+    subjects = [('user', username or '')]
+    ip = client_ip(request)
+    if ip:
+        subjects.append(('ip', ip))
+    return subjects
+
+
+def _incr(key, timeout):
+    """Counter that expires ``timeout`` seconds after it was started (atomic on Redis)."""
+    cache = get_cache()
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:  # expired between add() and incr()
+        cache.set(key, 1, timeout)
+        return 1
+
+
+def lockout_seconds(strikes):
+    """Length of the ``strikes``-th lockout in a row."""
+    base = _setting('PIN_LOCKOUT_SECONDS', 30)
+    return min(base * 2 ** (strikes - 1), _setting('PIN_LOCKOUT_MAX_SECONDS', 3600))
+
+
+# ==========================================
+# ATTEMPTS
+# ==========================================
+def retry_after(request, username):
+    """Seconds until ``username`` may try again from this client; 0 if not locked out."""
+    locks = get_cache().get_many([_key('lock', scope, subject) for scope, subject in _subjects(request, username)])
+    remaining = max(locks.values(), default=0) - time.time()
+    return math.ceil(remaining) if remaining > 0 else 0
+
+
+def register_failure(request, username):
+    """Count a failed attempt; returns the lockout it triggered in seconds (0 if none)."""
+    window = _setting('PIN_FAILURE_WINDOW', 900)
+    limits = _limits()
+    lockout = 0
+    for scope, subject in _subjects(request, username):
+        failures_key = _key('fail', scope, subject)
+        if _incr(failures_key, window) < limits[scope]:
+            continue
+        seconds = lockout_seconds(_incr(_key('strikes', scope, subject), STRIKE_MEMORY))
+        get_cache().set(_key('lock', scope, subject), time.time() + seconds, seconds)
+        get_cache().delete(failures_key)
+        lockout = max(lockout, seconds)
+        logger.warning("Sign-in locked for %ss after %s failures (%s %s)", seconds, limits[scope], scope,
+                       subject if scope == 'ip' else repr(username))
+    record('lockout' if lockout else 'failure')
+    return lockout
+
+
+def register_success(request, username):
+    get_cache().delete_many([_key('fail', 'user', username), _key('strikes', 'user', username)])
+    record('success')
+
+
+# ==========================================
+# METRICS
+# ==========================================
+def _metric_key(outcome, minute):
+    return f"core:login:v{CACHE_VERSION}:stats:{outcome}:{minute}"
+
+
+def record(outcome):
+    _incr(_metric_key(outcome, int(time.time() // 60)), (max(METRIC_WINDOWS) + 1) * 60)
+
+
+def metrics():
+    """Sign-in outcomes over the last 1, 5 and 60 minutes, with the failed-attempt rate."""
+    now = int(time.time() // 60)
+    minutes = range(now - max(METRIC_WINDOWS) + 1, now + 1)
+    counts = get_cache().get_many([_metric_key(outcome, minute) for outcome in OUTCOMES for minute in minutes])
+    summary = {}
+    for window in METRIC_WINDOWS:
+        totals = {
+            outcome: sum(counts.get(_metric_key(outcome, minute), 0) for minute in range(now - window + 1, now + 1))
+            for outcome in OUTCOMES
+        }
+        failed = totals['failure'] + totals['lockout']
+        attempts = failed + totals['success']
+        totals['failed_per_minute'] = round(failed / window, 2)
+        totals['failure_rate'] = round(failed / attempts, 3) if attempts else None
+        summary[f'last_{window}m'] = totals
+    return summary
@@ -1,30 +1,50 @@
 # core/urls.py
 
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth.views import LoginView, LogoutView
 from django.views.generic.base import RedirectView
-from . import views
+from . import api, async_views, views
+from .forms_login import ThrottledAuthenticationForm
 from .views import DoctorReportListView, LabQueueListView, LabReportListView
 
+# Under ASGI the list views, CSV exports and lab PDF download use their async variants
+if settings.ASYNC_VIEWS:
+    doctor_reports = async_views.doctor_reports
+    lab_queue = async_views.lab_queue
+    lab_reports = async_views.lab_reports
+    export_doctor_csv = async_views.export_doctor_csv
+    export_lab_csv = async_views.export_lab_csv
+    download_lab_pdf = async_views.download_lab_pdf
+else:
+    doctor_reports = DoctorReportListView.as_view()
+    lab_queue = LabQueueListView.as_view()
+    lab_reports = LabReportListView.as_view()
+    export_doctor_csv = views.export_doctor_csv
+    export_lab_csv = views.export_lab_csv
+    download_lab_pdf = views.download_lab_pdf
+
 urlpatterns = [
     # Root Redirect: Handles the empty path (/) and redirects to login
     path('', RedirectView.as_view(pattern_name='login', permanent=False), name='root_redirect'),
 
-    # Authentication - Using Django's built-in LoginView
-    path('login/', LoginView.as_view(template_name='core/login.html'), name='login'),
+    # Authentication - Django's built-in LoginView, with failed passwords throttled (core/throttle.py)
+    path('login/', LoginView.as_view(template_name='core/login.html',
+                                     authentication_form=ThrottledAuthenticationForm), name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('dashboard/', views.dashboard_view, name='dashboard'), 
     
     # --- DOCTOR VIEWS ---
     # 1. Submission Form
     path('doctor/submit/', views.doctor_submit_view, name='doctor_submit'),
+    path('doctor/submit/batch/', views.doctor_batch_submit_view, name='doctor_batch_submit'),
     
     # 2. Reports Tracking
-    path('doctor/reports/', DoctorReportListView.as_view(), name='doctor_reports'),
+    path('doctor/reports/', doctor_reports, name='doctor_reports'),
 
     # --- LAB VIEWS ---
     # 1. Pending Queue (List)
-    path('lab/queue/', LabQueueListView.as_view(), name='lab_queue'),
+    path('lab/queue/', lab_queue, name='lab_queue'),
     
     # 2. Process Request (Detail/Creation)
     path('lab/process/<int:pk>/', views.lab_process_request, name='lab_process'), 
@@ -33,15 +53,37 @@ urlpatterns = [
     path('lab/assign/<int:pk>/', views.assign_case, name='assign_case'),
     
     # 4. CSV Export
-    path('doctor/export-csv/', views.export_doctor_csv, name='export_doctor_csv'),
-    path('lab/export-csv/', views.export_lab_csv, name='export_lab_csv'),
+    path('doctor/export-csv/', export_doctor_csv, name='export_doctor_csv'),
+    path('lab/export-csv/', export_lab_csv, name='export_lab_csv'),
     
     # 5. Generate PDF Report
     path('report/pdf/<int:pk>/', views.generate_report_pdf, name='generate_report_pdf'),
     
     # 6. Download Lab Uploaded PDF
-    path('report/download-pdf/<int:pk>/', views.download_lab_pdf, name='download_lab_pdf'),
+    path('report/download-pdf/<int:pk>/', download_lab_pdf, name='download_lab_pdf'),
     
     # 7. Lab reports (for lab users)
-    path('lab/reports/', LabReportListView.as_view(), name='lab_reports'),
+    path('lab/reports/', lab_reports, name='lab_reports'),
+    path('lab/reports/export/', views.lab_report_export, name='lab_report_export'),
+
+    # 8. Slide images (authenticated; original or derivative)
+    path('slides/<int:pk>/', views.serve_slide, name='serve_slide'),
+    path('slides/<int:pk>/<slug:variant>/', views.serve_slide, name='serve_slide_variant'),
+
+    # 9. JSON API (sparse fields, ETag / 304)
+    path('api/queue/', api.queue, name='api_queue'),
+    path('api/reports/', api.reports, name='api_reports'),
+    path('api/cases/<int:pk>/', api.case_detail, name='api_case'),
+    path('api/exports/', api.export_csv, name='api_export_csv'),
+    path('api/jobs/<int:pk>/', api.job_status, name='api_job'),
+    path('jobs/<int:pk>/download/', views.download_job_file, name='download_job_file'),
+    path('perf/stats/', api.performance_stats, name='performance_stats'),
+
+    # 10. Live updates (server-sent events; held open under ASGI only)
+    path('events/', async_views.case_events, name='case_events'),
+
+    # 11. Archive (completed cases moved out of the working tables)
+    path('archive/', views.CaseArchiveListView.as_view(), name='case_archive'),
+    path('archive/export-csv/', views.export_archive_csv, name='export_archive_csv'),
+    path('archive/<int:pk>/pdf/', views.archive_report_pdf, name='archive_report_pdf'),
 ]
@@ -4,25 +4,29 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.contrib.auth import authenticate, login, logout
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 from django.views.generic import ListView
 from django.views import View
-from django.http import HttpResponse
-from io import BytesIO
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.db.models.functions import Substr
 import os
 import csv
 from django.utils import timezone
 
-# ReportLab PDF Imports
-from reportlab.lib import colors 
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
-from reportlab.lib.units import inch
-
-from .models import Request, PortalUser, Report, RequestHistory
-from .forms import DoctorRequestForm, LabReportForm
+from . import counters, events, history, jobs, pdf_cache
+from .imaging import schedule_derivatives
+from .media import serve_file
+from .archive import archived_cases_for, search_archive
+from .models import ArchivedReport, ArchivedRequest, Job, Request, PortalUser, Report
+from .forms import (
+    BATCH_MAX_SAMPLES, BatchOptionsForm, BatchSampleFormSet, DoctorRequestForm, LabReportForm, ReportExportForm,
+)
+from .pagination import KeysetPaginationMixin
+from .search import ranked_search
+from .submissions import submit_batch
+from .workload import assign_to_tech, pick_least_busy_tech, release_case
 
 
 # ==========================================
@@ -40,6 +44,28 @@ class LabRequiredMixin(UserPassesTestMixin):
         return self.request.user.is_authenticated and self.request.user.is_lab()
 
 
+class SummaryCountsMixin:
+    """Header counts for the list views, read from the per-user counter cache.
+
+    ``summary_counts`` maps context names to ``counters.user_counts`` keys.
+    """
+    summary_counts = {}
+
+    def _pick_summary(self, counts):
+        return {name: counts[key] for name, key in self.summary_counts.items()}
+
+    def get_summary(self):
+        return self._pick_summary(counters.user_counts(self.request.user))
+
+    async def aget_summary(self):
+        return self._pick_summary(await counters.auser_counts(self.request.user))
+
+    def get_context_data(self, *, summary=None, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx.update(self.get_summary() if summary is None else summary)
+        return ctx
+
+
 # ==========================================
 # LOGIN & DASHBOARD
 # ==========================================
@@ -76,71 +102,115 @@ def doctor_submit_view(request):
             
             # Handle lab tech assignment
             assigned_to = form.cleaned_data.get('assigned_to')
-            lab_techs = PortalUser.objects.filter(role='Lab', is_active=True)
-            
-            if not lab_techs.exists():
-                # No lab techs available
-                messages.error(request, "Cannot submit request: No lab technicians available. Please contact administrator.")
-                return render(request, 'core/doctor_submit.html', {
-                    'form': form,
-                    'page_title': 'New Sample Submission',
-                    'total_cases': Request.objects.filter(doctor=request.user).count(),
-                    'pending_cases': Request.objects.filter(doctor=request.user, status='Pending').count(),
-                })
-            
-            if assigned_to:
-                # Doctor explicitly selected a lab tech
-                new_request.assigned_to = assigned_to
-                new_request.assignment_status = 'Assigned'
-                new_request.assigned_date = timezone.now()
-                assignment_msg = f"assigned to {assigned_to.full_name}"
-            else:
-                # Auto-assign to the least busy lab tech (fewest assigned pending cases)
-                least_busy = min(
-                    lab_techs,
-                    key=lambda tech: tech.assigned_requests.filter(
-                        status='Pending'
-                    ).count()
-                )
-                new_request.assigned_to = least_busy
-                new_request.assignment_status = 'Assigned'
-                new_request.assigned_date = timezone.now()
-                assignment_msg = f"auto-assigned to {least_busy.full_name} (least busy)"
-            
-            new_request.save()
 
-            # Record history entry for the new submission
-            try:
-                assignment_note = f"Submitted by Dr. {request.user.full_name} and {assignment_msg}"
-                RequestHistory.objects.create(
-                    request=new_request,
-                    user=request.user,
-                    action='Submitted',
-                    note=assignment_note
-                )
-            except Exception:
-                pass
+            with history.writing():
+                if assigned_to:
+                    # Doctor explicitly selected a lab tech
+                    tech = assigned_to
+                    assignment_msg = f"assigned to {assigned_to.full_name}"
+                else:
+                    # Auto-assign to the least busy lab tech (fewest assigned pending cases)
+                    tech = pick_least_busy_tech()
+                    assignment_msg = f"auto-assigned to {tech.full_name} (least busy)" if tech else ""
+
+                if tech is None:
+                    # No lab techs available
+                    messages.error(request, "Cannot submit request: No lab technicians available. Please contact administrator.")
+                    counts = counters.user_counts(request.user)
+                    return render(request, 'core/doctor_submit.html', {
+                        'form': form,
+                        'page_title': 'New Sample Submission',
+                        'total_cases': counts['total'],
+                        'pending_cases': counts['pending'],
+                    })
+
+                assign_to_tech(new_request, tech)
+                schedule_derivatives(new_request.pk)
+
+                # History and the tech's live update commit with the submission
+                history.record(new_request, request.user, 'Submitted',
+                               f"Submitted by Dr. {request.user.full_name} and {assignment_msg}")
+                events.publish(events.case_event('assigned', new_request, tech.pk))
 
             messages.success(request, f"Request for Patient {new_request.patient_id} submitted successfully and {assignment_msg}!")
             return redirect('doctor_reports')
     else:
         form = DoctorRequestForm()
 
-    # Compute summary counts for the toolbar
-    total_cases = Request.objects.filter(doctor=request.user).count()
-    pending_cases = Request.objects.filter(doctor=request.user, status='Pending').count()
+    # Summary counts for the toolbar (cached, see core/counters.py)
+    counts = counters.user_counts(request.user)
 
     return render(request, 'core/doctor_submit.html', {
         'form': form,
         'page_title': f'Welcome, {request.user.full_name}',
-        'total_cases': total_cases,
-        'pending_cases': pending_cases,
+        'total_cases': counts['total'],
+        'pending_cases': counts['pending'],
     })
 
 
 # ==========================================
-# DOCTOR: REPORT LIST
+# DOCTOR: BATCH SUBMISSION
 # ==========================================
+def _wants_json(request):
+    return 'application/json' in request.headers.get('Accept', '')
+
+
+@login_required
+@user_passes_test(lambda u: u.is_doctor(), login_url='login')
+def doctor_batch_submit_view(request):
+    """Submit several samples (each with its image) in one POST.
+
+    The form fields use the ``samples`` formset prefix (``samples-TOTAL_FORMS``,
+    ``samples-0-patient_id``, ``samples-0-image``, ...). API clients sending
+    ``Accept: application/json`` get JSON back instead of a redirect.
+    """
+    if request.method == 'POST':
+        options = BatchOptionsForm(request.POST)
+        formset = BatchSampleFormSet(request.POST, request.FILES, queryset=Request.objects.none(), prefix='samples')
+        if options.is_valid() and formset.is_valid():
+            cases = [form.save(commit=False) for form in formset.forms if form.has_changed()]
+            tech = options.cleaned_data.get('assigned_to')
+            created = submit_batch(request.user, cases, tech)
+            if created is None:
+                error = "Cannot submit batch: No lab technicians available. Please contact administrator."
+                if _wants_json(request):
+                    return JsonResponse({'error': error}, status=503)
+                messages.error(request, error)
+            else:
+                if _wants_json(request):
+                    return JsonResponse({'submitted': [
+                        {'id': case.pk, 'patient_id': case.patient_id, 'assigned_to': case.assigned_to.full_name}
+                        for case in created
+                    ]}, status=201)
+                messages.success(request, f"{len(created)} samples submitted successfully.")
+                return redirect('doctor_reports')
+        elif _wants_json(request):
+            return JsonResponse({
+                'errors': {
+                    'options': options.errors,
+                    'samples': formset.errors,
+                    'batch': formset.non_form_errors(),
+                },
+            }, status=400)
+    else:
+        options = BatchOptionsForm()
+        formset = BatchSampleFormSet(queryset=Request.objects.none(), prefix='samples')
+        rows = request.GET.get('rows', '')
+        if rows.isdigit():
+            # "More rows": render that many blank samples (capped)
+            formset.extra = max(1, min(int(rows), BATCH_MAX_SAMPLES))
+
+    counts = counters.user_counts(request.user)
+    return render(request, 'core/doctor_batch_submit.html', {
+        'options': options,
+        'formset': formset,
+        'max_samples': BATCH_MAX_SAMPLES,
+        'page_title': 'Batch Sample Submission',
+        'total_cases': counts['total'],
+        'pending_cases': counts['pending'],
+    })
+
+
 # ==========================================
 # DOCTOR: REPORT LIST
 # ==========================================
@@ -151,22 +221,18 @@ from django.db.models import Q
 # ==========================================
 # DOCTOR: REPORT LIST
 # ==========================================
-class DoctorReportListView(DoctorRequiredMixin, ListView):
+class DoctorReportListView(DoctorRequiredMixin, KeysetPaginationMixin, ListView):
     model = Request
     template_name = 'core/doctor_reports.html'
     context_object_name = 'requests'
 
     def get_queryset(self):
-        qs = Request.objects.filter(doctor=self.request.user).order_by('-timestamp')
+        qs = Request.objects.with_case_details().filter(doctor=self.request.user).order_by('-timestamp', '-id')
         
-        # Search Filter
+        # Search Filter (best matches first, see core/search.py)
         query = self.request.GET.get('q')
         if query:
-            qs = qs.filter(
-                Q(patient_id__icontains=query) | 
-                Q(centre_name__icontains=query) |
-                Q(status__icontains=query)
-            )
+            qs = ranked_search(qs, query, fields=('patient_id', 'centre_name', 'status'))
         return qs
 
     def get_context_data(self, **kwargs):
@@ -176,51 +242,37 @@ class DoctorReportListView(DoctorRequiredMixin, ListView):
                 r.report_data = r.report
             except Report.DoesNotExist:
                 r.report_data = None
-            # Attach history entries (latest first) - don't assign to related set
-            r.history_list = list(r.history_entries.all()[:20])
-            
-            # Find completion date from history
-            completion_event = next((h for h in r.history_list if h.action == 'Report Completed'), None)
-            r.completion_date = completion_event.timestamp if completion_event else None
+            # history_list (latest first) is prefetched by with_case_details()
         return ctx
 
 
 # ==========================================
 # LAB: PENDING QUEUE
 # ==========================================
-class LabQueueListView(LabRequiredMixin, ListView):
+class LabQueueListView(LabRequiredMixin, SummaryCountsMixin, KeysetPaginationMixin, ListView):
     model = Request
     template_name = 'core/lab_queue.html'
     context_object_name = 'pending_requests'
+    keyset_descending = False  # oldest first
 
     def get_queryset(self):
         # Show ONLY cases assigned to THIS lab tech
-        qs = Request.objects.filter(
+        qs = Request.objects.with_case_details().filter(
             status='Pending',
             assigned_to=self.request.user
-        ).order_by('timestamp')
+        ).order_by('timestamp', 'id')
         
-        # Search Filter
+        # Search Filter (best matches first, see core/search.py)
         query = self.request.GET.get('q')
         if query:
-            qs = qs.filter(
-                Q(patient_id__icontains=query) | 
-                Q(centre_name__icontains=query) |
-                Q(doctor__full_name__icontains=query)
-            )
+            qs = ranked_search(qs, query, fields=('patient_id', 'centre_name', 'doctor'))
         return qs
 
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        for r in ctx['pending_requests']:
-            r.history_list = list(r.history_entries.all()[:20])
-        # Summary counts for header
-        ctx['total_cases'] = Request.objects.filter(assigned_to=self.request.user).count()
-        ctx['pending_count'] = len(ctx['pending_requests'])
-        return ctx
+    # Summary counts for header
+    summary_counts = {'total_cases': 'total', 'pending_count': 'pending'}
 
 
-class LabReportListView(LabRequiredMixin, ListView):
+class LabReportListView(LabRequiredMixin, SummaryCountsMixin, KeysetPaginationMixin, ListView):
     """List of completed reports for lab users - only those assigned to them."""
     model = Request
     template_name = 'core/lab_reports.html'
@@ -228,20 +280,19 @@ class LabReportListView(LabRequiredMixin, ListView):
 
     def get_queryset(self):
         # Show ONLY completed cases assigned to THIS lab tech
-        qs = Request.objects.filter(
+        qs = Request.objects.with_case_details().filter(
             status='Completed',
             assigned_to=self.request.user
-        ).order_by('-timestamp')
+        ).order_by('-timestamp', '-id')
         
-        # Search Filter
+        # Search Filter (best matches first, see core/search.py)
         query = self.request.GET.get('q')
         if query:
-            qs = qs.filter(
-                Q(patient_id__icontains=query) | 
-                Q(centre_name__icontains=query)
-            )
+            qs = ranked_search(qs, query, fields=('patient_id', 'centre_name'))
         return qs
 
+    summary_counts = {'total_reports': 'completed'}
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         # attach report object where present
@@ -250,8 +301,6 @@ class LabReportListView(LabRequiredMixin, ListView):
                 r.report_data = r.report
             except Report.DoesNotExist:
                 r.report_data = None
-            r.history_list = list(r.history_entries.all()[:20])
-        ctx['total_reports'] = len(ctx['reports'])
         return ctx
 
 
@@ -315,25 +364,29 @@ def lab_process_request(request, pk):
                 report.microbiology_pdf = request.FILES['microbiology_pdf']
                 report.pdf_uploaded_date = timezone.now()
             
-            report.save()
-
-            request_obj.status = 'Completed'
-            request_obj.assignment_status = 'Completed'
-            request_obj.save()
-
-            # Record history entry for completion
-            try:
-                pdf_note = ""
+            with history.writing():
+                # Claim the case: of two concurrent completions only one changes the row
+                claimed = Request.objects.filter(pk=request_obj.pk, status='Pending').update(status='Completed')
+                if not claimed:
+                    messages.error(request, f"Case {request_obj.patient_id} has already been completed.")
+                    return redirect('lab_queue')
+                report.save()
+
+                request_obj.status = 'Completed'
+                request_obj.assignment_status = 'Completed'
+                request_obj.completed_at = timezone.now()
+                request_obj.save()
+                release_case(request_obj)
+                # Render the report PDF off the request path, ready for the first download
+                jobs.enqueue('render_report_pdf', request_id=request_obj.pk)
+
+                pdf_note = " (with PDF)" if report.microbiology_pdf else ""
+                history.record(request_obj, request.user, 'Report Completed',
+                               f"Report authored by {report.auth_by}{pdf_note}")
+                updates = [events.case_event('completed', request_obj, request_obj.doctor_id)]
                 if report.microbiology_pdf:
-                    pdf_note = " (with PDF)"
-                RequestHistory.objects.create(
-                    request=request_obj,
-                    user=request.user,
-                    action='Report Completed',
-                    note=f"Report authored by {report.auth_by}{pdf_note}"
-                )
-            except Exception:
-                pass
+                    updates.append(events.case_event('pdf_uploaded', request_obj, request_obj.doctor_id))
+                events.publish(*updates)
 
             messages.success(request, f"Report for {request_obj.patient_id} completed!")
             return redirect('lab_queue')
@@ -365,9 +418,9 @@ def logout_view(request):
 @login_required
 @user_passes_test(lambda user: user.is_doctor() or user.is_lab(), login_url='login')
 def generate_report_pdf(request, pk):
-    """Generates a professional PDF report with official layout."""
+    """Serves the report PDF, rendering it only when the cached copy is stale."""
     
-    request_obj = get_object_or_404(Request, pk=pk)
+    request_obj = get_object_or_404(Request.objects.select_related('report'), pk=pk)
     try:
         report_obj = request_obj.report
     except Report.DoesNotExist:
@@ -376,193 +429,26 @@ def generate_report_pdf(request, pk):
             return redirect('doctor_reports')
         return redirect('lab_queue')
 
-    response = HttpResponse(content_type='application/pdf')
-    filename = f"Microbio_Report_{request_obj.patient_id}_{request_obj.id}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    fingerprint = pdf_cache.report_fingerprint(request_obj, report_obj)
+    etag = f'"{fingerprint}"'
+    name = pdf_cache.cached_pdf_name(request_obj.pk, fingerprint)
+    last_modified = pdf_cache.modified_time(name)
 
-    # Create PDF buffer
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, 
-                            leftMargin=0.5*inch, rightMargin=0.5*inch, 
-                            topMargin=0.5*inch, bottomMargin=0.5*inch)
-    
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Define official fonts and styles
-    # Title
-    title_style = styles['Heading1'].clone('OfficialTitle')
-    title_style.fontName = 'Helvetica-Bold'
-    title_style.fontSize = 18
-    title_style.textColor = colors.HexColor('#003366')
-    title_style.alignment = 1  # CENTER
-    title_style.spaceAfter = 20
-    
-    # Section Header
-    section_header_style = styles['Heading2'].clone('SectionHeader')
-    section_header_style.fontName = 'Helvetica-Bold'
-    section_header_style.fontSize = 12
-    section_header_style.textColor = colors.white
-    section_header_style.backColor = colors.HexColor('#003366')
-    section_header_style.padding = 6
-    section_header_style.borderPadding = 6
-    section_header_style.spaceBefore = 12
-    section_header_style.spaceAfter = 10
-    
-    # Normal Text
-    normal_style = styles['Normal']
-    normal_style.fontSize = 10
-    normal_style.leading = 14
-
-    # --- 1. Report Title ---
-    story.append(Paragraph("OCULAR MICROBIOLOGY LABORATORY REPORT", title_style))
-    story.append(Spacer(1, 0.2 * inch))
-
-    # --- 2. TABLE 1: Patient & Clinical Details ---
-    story.append(Paragraph("PATIENT & CLINICAL DETAILS", section_header_style))
-    
-    # Format medications
-    meds_display = ""
-    if request_obj.on_meds:
-        if request_obj.meds_category == 'Others':
-            meds_display = request_obj.meds_custom
-        else:
-            meds_display = request_obj.get_meds_category_display()
-    else:
-        meds_display = "No medications"
-
-    duration_display = f"{request_obj.duration_value} {request_obj.get_duration_unit_display()}"
-
-    # Data for Clinical Table
-    clinical_data = [
-        [Paragraph("<b>Patient ID:</b>", normal_style), Paragraph(request_obj.patient_id, normal_style),
-         Paragraph("<b>Centre:</b>", normal_style), Paragraph(request_obj.centre_name, normal_style)],
-        
-        [Paragraph("<b>Eye:</b>", normal_style), Paragraph(request_obj.get_eye_display(), normal_style),
-         Paragraph("<b>Date Submitted:</b>", normal_style), Paragraph(request_obj.timestamp.strftime('%Y-%m-%d'), normal_style)],
-        
-        [Paragraph("<b>Sample:</b>", normal_style), Paragraph(request_obj.get_sample_display(), normal_style),
-         Paragraph("<b>Duration:</b>", normal_style), Paragraph(duration_display, normal_style)],
-        
-        [Paragraph("<b>Medications:</b>", normal_style), Paragraph(meds_display, normal_style),
-         Paragraph("<b>Stain Used:</b>", normal_style), Paragraph(request_obj.stain or "N/A", normal_style)],
-        
-        [Paragraph("<b>Clinical Impression:</b>", normal_style), Paragraph(request_obj.get_impression_display(), normal_style),
-         "", ""]
-    ]
-
-    # Table Style
-    table_style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dddddd')),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('PADDING', (0, 0), (-1, -1), 8),
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')), # Light gray for labels col 1
-        ('BACKGROUND', (2, 0), (2, -1), colors.HexColor('#f8f9fa')), # Light gray for labels col 3
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-    ])
-
-    col_widths = [1.2*inch, 2.3*inch, 1.2*inch, 2.3*inch]
-    clinical_table = Table(clinical_data, colWidths=col_widths)
-    clinical_table.setStyle(table_style)
-    
-    story.append(clinical_table)
-    story.append(Spacer(1, 0.2 * inch))
+    # Repeat download of an unchanged report: nothing to send
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
 
-    # --- 3. TABLE 2: Laboratory Interpretation ---
-    story.append(Paragraph("LABORATORY INTERPRETATION", section_header_style))
-    
-    report_quality = report_obj.quality if report_obj.quality else "N/A"
-    report_suitability = "Yes" if report_obj.sample_suitability else "No"
-    reason_display = report_obj.suitability_reason if not report_obj.sample_suitability and report_obj.suitability_reason else "N/A"
+    if last_modified is None:
+        # ReportLab is only imported by the first PDF render in each worker
+        from .rendering import render_report_pdf
 
-    lab_data = [
-        [Paragraph("<b>Lab ID:</b>", normal_style), Paragraph(report_obj.lab_id, normal_style),
-         Paragraph("<b>RC Code:</b>", normal_style), Paragraph(report_obj.rc_code, normal_style)],
-        
-        [Paragraph("<b>Sample Quality:</b>", normal_style), Paragraph(report_quality, normal_style),
-         Paragraph("<b>Suitability:</b>", normal_style), Paragraph(report_suitability, normal_style)],
-        
-        [Paragraph("<b>Suitability Reason:</b>", normal_style), Paragraph(reason_display, normal_style),
-         "", ""]
-    ]
-    
-    lab_table = Table(lab_data, colWidths=col_widths)
-    lab_table.setStyle(table_style)
-    
-    story.append(lab_table)
-    story.append(Spacer(1, 0.2 * inch))
+        name = pdf_cache.store_pdf(request_obj.pk, fingerprint, render_report_pdf(request_obj, report_obj))
 
-    # --- 4. Microbiology Report Section ---
-    story.append(Paragraph("MICROBIOLOGY REPORT", section_header_style))
-    
-    # Use a box for the report text
-    report_content = [
-        [Paragraph(report_obj.report_text.replace('\n', '<br/>'), normal_style)]
-    ]
-    
-    report_table = Table(report_content, colWidths=[7*inch])
-    report_table.setStyle(TableStyle([
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#003366')),
-        ('PADDING', (0, 0), (-1, -1), 10),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#fcfcfc')),
-    ]))
-    story.append(report_table)
-    story.append(Spacer(1, 0.1 * inch))
-
-    if report_obj.comments:
-        story.append(Paragraph("<b>Additional Comments:</b>", styles['Heading4']))
-        story.append(Paragraph(report_obj.comments.replace('\n', '<br/>'), normal_style))
-        story.append(Spacer(1, 0.1 * inch))
-
-    # --- 5. Microscopy Image ---
-    if request_obj.image and os.path.exists(request_obj.image.path):
-        story.append(Spacer(1, 0.1 * inch))
-        story.append(Paragraph("MICROSCOPY IMAGE", section_header_style))
-        try:
-            img = Image(request_obj.image.path, width=4*inch, height=3*inch, kind='proportional')
-            story.append(img)
-        except Exception:
-            story.append(Paragraph("<i>[Image could not be loaded]</i>", normal_style))
-        story.append(Spacer(1, 0.2 * inch))
-
-    # --- 6. Footer & Signature ---
-    story.append(Spacer(1, 0.3 * inch))
-    
-    # Signature Block
-    sig_data = [
-        ["", Paragraph(f"<b>Authorized By:</b> {report_obj.auth_by}", normal_style)],
-        ["", Paragraph(f"<b>Date:</b> {timezone.now().strftime('%Y-%m-%d %H:%M')}", normal_style)],
-        ["", Paragraph("__________________________________", normal_style)],
-        ["", Paragraph("Signature", styles['Normal'])]
-    ]
-    
-    sig_table = Table(sig_data, colWidths=[4*inch, 3*inch])
-    sig_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('ALIGN', (1, 0), (1, -1), 'CENTER'),
-    ]))
-    story.append(sig_table)
-    
-    # Disclaimer
-    story.append(Spacer(1, 0.3 * inch))
-    disclaimer_style = styles['Normal'].clone('Disclaimer')
-    disclaimer_style.fontSize = 8
-    disclaimer_style.textColor = colors.gray
-    disclaimer_style.alignment = 1 # Center
-    
-    disclaimer_text = """
-    DISCLAIMER: This report is generated based on images provided by the clinician and may be subject to change upon review of the entire slide at the reading centre. 
-    This report acts solely as a guide for clinical correlation. The reading centre is not responsible for any complications arising during patient treatment.
-    """
-    story.append(Paragraph(disclaimer_text, disclaimer_style))
+    filename = f"Microbio_Report_{request_obj.patient_id}_{request_obj.id}.pdf"
+    return serve_file(request, name, filename=filename, as_attachment=True,
+                      content_type='application/pdf', etag=fingerprint)
 
-    # Build PDF
-    doc.build(story)
-    response.write(buffer.getvalue())
-    buffer.close()
-    
-    return response
 
 # ==========================================
 # LOGOUT
@@ -584,21 +470,16 @@ def assign_case(request, pk):
     case = get_object_or_404(Request, pk=pk, status='Pending', assignment_status='Unassigned')
     
     if request.method == 'POST':
-        case.assigned_to = request.user
-        case.assignment_status = 'Assigned'
-        case.assigned_date = timezone.now()
-        case.save()
-        
-        # Record history
-        try:
-            RequestHistory.objects.create(
-                request=case,
-                user=request.user,
-                action='Assigned',
-                note=f"Assigned to {request.user.full_name}"
-            )
-        except Exception:
-            pass
+        with history.writing():
+            # Claim the case: of two techs assigning at once only one changes the row
+            unassigned = Request.objects.filter(pk=case.pk, status='Pending', assignment_status='Unassigned')
+            claimed = unassigned.update(assignment_status='Assigned')
+            if not claimed:
+                messages.error(request, f"Case {case.patient_id} has already been taken.")
+                return redirect('lab_queue')
+            assign_to_tech(case, request.user)
+            history.record(case, request.user, 'Assigned', f"Assigned to {request.user.full_name}")
+            events.publish(events.case_event('assigned', case, request.user.pk))
         
         messages.success(request, f"Case {case.patient_id} assigned to you.")
         return redirect('lab_queue')
@@ -609,94 +490,148 @@ def assign_case(request, pk):
 # ==========================================
 # CSV EXPORT
 # ==========================================
+CSV_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer: write() hands the line back instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def stream_csv(filename, header, rows):
+    """StreamingHttpResponse that writes ``rows`` as CSV one line at a time.
+
+    ``rows`` may be an async iterable, in which case the response streams
+    asynchronously (ASGI).
+    """
+    writer = csv.writer(Echo())
+
+    if hasattr(rows, '__aiter__'):
+        async def lines():
+            yield writer.writerow(header)
+            async for row in rows:
+                yield writer.writerow(row)
+    else:
+        def lines():
+            yield writer.writerow(header)
+            for row in rows:
+                yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _fmt_dt(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+EYE_LABELS = dict(Request.EYE_CHOICES)
+SAMPLE_LABELS = dict(Request.SAMPLE_CHOICES)
+DURATION_UNIT_LABELS = dict(Request.DURATION_UNIT_CHOICES)
+IMPRESSION_LABELS = dict(Request.IMPRESSION_CHOICES)
+
+# Enhanced headers with lab details
+DOCTOR_CSV_HEADER = [
+    'Patient ID', 'Centre', 'Eye', 'Sample Type', 'Duration', 'Impression', 'Stain',
+    'Status', 'Assigned Lab Tech', 'Lab ID', 'RC Code', 'Quality', 'Suitability',
+    'Report Text', 'Authorized By', 'Submitted Date'
+]
+LAB_CSV_HEADER = ['Patient ID', 'Doctor', 'Centre', 'Eye', 'Sample Type', 'Duration', 'Impression', 'Stain', 'Status', 'Assigned Date', 'Status']
+
+
+def doctor_csv_cases(user, model=Request):
+    """values_list rows for the doctor export (fed to ``doctor_csv_row``); ``model`` may be ArchivedRequest."""
+    return (
+        model.objects.filter(doctor=user)
+        .order_by('-timestamp')
+        .annotate(report_excerpt=Substr('report__report_text', 1, 200))  # First 200 chars
+        .values_list(
+            'patient_id', 'centre_name', 'eye', 'sample', 'duration_value', 'duration_unit',
+            'impression', 'stain', 'status', 'assigned_to__full_name', 'report__request',
+            'report__lab_id', 'report__rc_code', 'report__quality', 'report__sample_suitability',
+            'report_excerpt', 'report__auth_by', 'timestamp',
+        )
+    )
+
+
+def doctor_csv_row(values):
+    (patient_id, centre, eye_code, sample_code, duration_value, duration_unit, impression_code,
+     stain, status, tech_name, report_id, lab_id, rc_code, quality, suitable, excerpt, auth_by,
+     timestamp) = values
+    if report_id is None:
+        lab_id = rc_code = quality = suitability = excerpt = auth_by = 'N/A'
+    else:
+        suitability = "Yes" if suitable else "No"
+    return [
+        patient_id,
+        centre,
+        EYE_LABELS.get(eye_code, eye_code),
+        SAMPLE_LABELS.get(sample_code, sample_code),
+        f"{duration_value} {DURATION_UNIT_LABELS.get(duration_unit, duration_unit)}",
+        IMPRESSION_LABELS.get(impression_code, impression_code),
+        stain or 'N/A',
+        status,
+        tech_name or 'Unassigned',
+        lab_id,
+        rc_code,
+        quality,
+        suitability,
+        excerpt,
+        auth_by,
+        _fmt_dt(timestamp),
+    ]
+
+
+def lab_csv_cases(user, model=Request):
+    """values_list rows for the lab export (fed to ``lab_csv_row``); ``model`` may be ArchivedRequest."""
+    return (
+        model.objects.filter(assigned_to=user)
+        .order_by('-timestamp')
+        .values_list(
+            'patient_id', 'doctor__full_name', 'centre_name', 'eye', 'sample', 'duration_value',
+            'duration_unit', 'impression', 'stain', 'status', 'assigned_date', 'assignment_status',
+        )
+    )
+
+
+def lab_csv_row(values):
+    (patient_id, doctor_name, centre, eye_code, sample_code, duration_value, duration_unit,
+     impression_code, stain, status, assigned_date, assignment_status) = values
+    return [
+        patient_id,
+        doctor_name or 'Unknown',
+        centre,
+        EYE_LABELS.get(eye_code, eye_code),
+        SAMPLE_LABELS.get(sample_code, sample_code),
+        f"{duration_value} {DURATION_UNIT_LABELS.get(duration_unit, duration_unit)}",
+        IMPRESSION_LABELS.get(impression_code, impression_code),
+        stain or 'N/A',
+        status,
+        _fmt_dt(assigned_date) or 'N/A',
+        assignment_status,
+    ]
+
+
+def csv_filename(prefix):
+    return f'{prefix}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv'
+
+
 @login_required
 @user_passes_test(lambda u: u.is_doctor(), login_url='login')
 def export_doctor_csv(request):
     """Export all cases submitted by the doctor to CSV with lab details for completed ones."""
-    cases = Request.objects.filter(doctor=request.user).order_by('-timestamp')
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="doctor_cases_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-    
-    writer = csv.writer(response)
-    # Enhanced headers with lab details
-    writer.writerow([
-        'Patient ID', 'Centre', 'Eye', 'Sample Type', 'Duration', 'Impression', 'Stain', 
-        'Status', 'Assigned Lab Tech', 'Lab ID', 'RC Code', 'Quality', 'Suitability', 
-        'Report Text', 'Authorized By', 'Submitted Date'
-    ])
-    
-    for case in cases:
-        # Get lab report if available
-        try:
-            report = case.report
-            lab_id = report.lab_id
-            rc_code = report.rc_code
-            quality = report.quality
-            suitability = "Yes" if report.sample_suitability else "No"
-            report_text = report.report_text[:200]  # First 200 chars
-            auth_by = report.auth_by
-        except Report.DoesNotExist:
-            lab_id = 'N/A'
-            rc_code = 'N/A'
-            quality = 'N/A'
-            suitability = 'N/A'
-            report_text = 'N/A'
-            auth_by = 'N/A'
-        
-        assigned_tech = case.assigned_to.full_name if case.assigned_to else 'Unassigned'
-        
-        writer.writerow([
-            case.patient_id,
-            case.centre_name,
-            case.get_eye_display(),
-            case.get_sample_display(),
-            f"{case.duration_value} {case.get_duration_unit_display()}",
-            case.get_impression_display(),
-            case.stain or 'N/A',
-            case.status,
-            assigned_tech,
-            lab_id,
-            rc_code,
-            quality,
-            suitability,
-            report_text,
-            auth_by,
-            case.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-        ])
-    
-    return response
+    cases = doctor_csv_cases(request.user).iterator(chunk_size=CSV_CHUNK_SIZE)
+    return stream_csv(csv_filename('doctor_cases'), DOCTOR_CSV_HEADER, map(doctor_csv_row, cases))
 
 
 @login_required
 @user_passes_test(lambda u: u.is_lab(), login_url='login')
 def export_lab_csv(request):
     """Export all cases assigned to the lab technician to CSV."""
-    cases = Request.objects.filter(assigned_to=request.user).order_by('-timestamp')
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="lab_cases_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Patient ID', 'Doctor', 'Centre', 'Eye', 'Sample Type', 'Duration', 'Impression', 'Stain', 'Status', 'Assigned Date', 'Status'])
-    
-    for case in cases:
-        doctor_name = case.doctor.full_name if case.doctor else 'Unknown'
-        writer.writerow([
-            case.patient_id,
-            doctor_name,
-            case.centre_name,
-            case.get_eye_display(),
-            case.get_sample_display(),
-            f"{case.duration_value} {case.get_duration_unit_display()}",
-            case.get_impression_display(),
-            case.stain or 'N/A',
-            case.status,
-            case.assigned_date.strftime('%Y-%m-%d %H:%M:%S') if case.assigned_date else 'N/A',
-            case.assignment_status,
-        ])
-    
-    return response
+    cases = lab_csv_cases(request.user).iterator(chunk_size=CSV_CHUNK_SIZE)
+    return stream_csv(csv_filename('lab_cases'), LAB_CSV_HEADER, map(lab_csv_row, cases))
 
 
 # ==========================================
@@ -718,13 +653,127 @@ def download_lab_pdf(request, pk):
         messages.error(request, "No PDF has been uploaded for this report yet.")
         return redirect('doctor_reports')
     
-    # Serve the PDF file
-    if os.path.exists(report.microbiology_pdf.path):
-        with open(report.microbiology_pdf.path, 'rb') as f:
-            response = HttpResponse(f.read(), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="microbio_report_{case.patient_id}.pdf"'
-            return response
-    else:
+    # Serve the PDF file (proxy hand-off or chunked, range-capable response)
+    try:
+        return serve_file(request, report.microbiology_pdf.name, filename=f"microbio_report_{case.patient_id}.pdf",
+                          as_attachment=True, content_type='application/pdf')
+    except Http404:
         messages.error(request, "PDF file not found on server.")
         return redirect('doctor_reports')
 
+
+# ==========================================
+# LAB: BATCH PDF EXPORT (ZIP)
+# ==========================================
+@login_required
+@user_passes_test(lambda u: u.is_lab(), login_url='login')
+def lab_report_export(request):
+    """Queue a ZIP of report PDFs for a date range / centre / doctor / tech and show its progress."""
+    if request.method == 'POST':
+        form = ReportExportForm(request.POST)
+        if form.is_valid():
+            job = jobs.enqueue('export_pdf_zip', user=request.user, **form.job_filters())
+            return redirect(f"{reverse('lab_report_export')}?job={job.pk}")
+    else:
+        form = ReportExportForm()
+
+    job = None
+    if request.GET.get('job', '').isdigit():
+        job = Job.objects.filter(pk=request.GET['job'], created_by=request.user, task='export_pdf_zip').first()
+    return render(request, 'core/lab_report_export.html', {'form': form, 'job': job})
+
+
+# ==========================================
+# BACKGROUND JOB FILES (e.g. CSV exports queued via the API)
+# ==========================================
+@login_required
+def download_job_file(request, pk):
+    """The file a finished job produced, for the user who queued it."""
+    job = get_object_or_404(Job, pk=pk, created_by=request.user, status='done')
+    name = (job.result or {}).get('file')
+    if not name:
+        raise Http404("This job produced no file")
+    return serve_file(request, name, filename=job.result.get('filename') or os.path.basename(name),
+                      as_attachment=True)
+
+
+# ==========================================
+# SLIDE IMAGES
+# ==========================================
+SLIDE_VARIANTS = {
+    'original': 'image',
+    'thumbnail': 'image_thumbnail',
+    'preview': 'image_preview',
+    'print': 'image_print',
+}
+
+
+@login_required
+@user_passes_test(lambda user: user.is_doctor() or user.is_lab(), login_url='login')
+def serve_slide(request, pk, variant='original'):
+    """Serve a slide image (or one of its derivatives) to the submitting doctor or lab staff."""
+    if variant not in SLIDE_VARIANTS:
+        raise Http404("Unknown image variant")
+    case = get_object_or_404(Request, pk=pk)
+    if request.user.is_doctor() and case.doctor_id != request.user.pk:
+        raise Http404("Case not found")
+
+    # Fall back to the original until the derivative has been generated
+    image = getattr(case, SLIDE_VARIANTS[variant]) or case.image
+    if not image:
+        raise Http404("No image for this case")
+    return serve_file(request, image.name)
+
+
+# ==========================================
+# ARCHIVE (completed cases moved out by archive_cases)
+# ==========================================
+class CaseArchiveListView(UserPassesTestMixin, KeysetPaginationMixin, ListView):
+    """Archived cases of the doctor (submitted) or tech (assigned), searchable by ``q``."""
+    template_name = 'core/case_archive.html'
+    context_object_name = 'cases'
+
+    def test_func(self):
+        user = self.request.user
+        return user.is_authenticated and (user.is_doctor() or user.is_lab())
+
+    def get_queryset(self):
+        qs = archived_cases_for(self.request.user).order_by('-timestamp', '-id')
+        query = self.request.GET.get('q')
+        if query:
+            qs = search_archive(qs, query)
+        return qs
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        for case in ctx['cases']:
+            try:
+                case.report_data = case.report
+            except ArchivedReport.DoesNotExist:
+                case.report_data = None
+        return ctx
+
+
+@login_required
+@user_passes_test(lambda user: user.is_doctor() or user.is_lab(), login_url='login')
+def export_archive_csv(request):
+    """The user's archived cases as CSV, in the same format as the live export."""
+    if request.user.is_doctor():
+        cases = doctor_csv_cases(request.user, model=ArchivedRequest).iterator(chunk_size=CSV_CHUNK_SIZE)
+        return stream_csv(csv_filename('archived_doctor_cases'), DOCTOR_CSV_HEADER, map(doctor_csv_row, cases))
+    cases = lab_csv_cases(request.user, model=ArchivedRequest).iterator(chunk_size=CSV_CHUNK_SIZE)
+    return stream_csv(csv_filename('archived_lab_cases'), LAB_CSV_HEADER, map(lab_csv_row, cases))
+
+
+@login_required
+@user_passes_test(lambda user: user.is_doctor() or user.is_lab(), login_url='login')
+def archive_report_pdf(request, pk):
+    """Report PDF of an archived case (same layout and cache as ``generate_report_pdf``)."""
+    case = get_object_or_404(archived_cases_for(request.user), pk=pk)
+    try:
+        report = case.report
+    except ArchivedReport.DoesNotExist:
+        raise Http404("No report for this case")
+    name = pdf_cache.ensure_pdf(case, report)
+    return serve_file(request, name, filename=f"Microbio_Report_{case.patient_id}_{case.id}.pdf",
+                      as_attachment=True, content_type='application/pdf')
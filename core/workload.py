@@ -0,0 +1,113 @@
+# core/workload.py
+"""
+Lab tech workload tracking.
+
+``PortalUser.pending_workload`` holds the number of Pending cases assigned to
+each tech so that auto-assignment is one indexed query instead of a COUNT per
+tech. Every change goes through an F() expression inside the caller's
+transaction; ``manage.py reconcile_workload`` repairs any drift.
+"""
+import heapq
+from collections import Counter
+
+from django.db.models import Case, Count, F, Q, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import PortalUser
+
+
+def pick_least_busy_tech():
+    """Return the active lab tech with the fewest pending cases, locked for update.
+
+    Must be called inside ``transaction.atomic()``. Rows already locked by a
+    concurrent submission are skipped so simultaneous submissions spread out
+    instead of piling onto the same tech.
+    """
+    techs = PortalUser.objects.filter(role='Lab', is_active=True).order_by('pending_workload', 'id')
+    tech = techs.select_for_update(skip_locked=True).first()
+    if tech is None:
+        # Every tech is locked (or there are none) - wait for the least busy one
+        tech = techs.select_for_update().first()
+    return tech
+
+
+def adjust_workload(tech_id, delta):
+    """Atomically add ``delta`` to a tech's pending counter (never below zero)."""
+    if tech_id is None or not delta:
+        return
+    PortalUser.objects.filter(pk=tech_id).update(
+        pending_workload=Greatest(F('pending_workload') + delta, 0)
+    )
+
+
+def assign_to_tech(case, tech):
+    """Assign (or reassign) ``case`` to ``tech`` and move the workload counter.
+
+    Saves ``case``. Call inside ``transaction.atomic()``.
+    """
+    previous_id = case.assigned_to_id
+    case.assigned_to = tech
+    case.assignment_status = 'Assigned'
+    case.assigned_date = timezone.now()
+    case.save()
+
+    if case.status == 'Pending' and previous_id != tech.pk:
+        adjust_workload(previous_id, -1)
+        adjust_workload(tech.pk, 1)
+
+
+def add_workloads(deltas):
+    """Apply ``{tech_id: delta}`` to several counters in one UPDATE."""
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+    if not deltas:
+        return
+    PortalUser.objects.filter(pk__in=deltas).update(
+        pending_workload=Greatest(
+            F('pending_workload') + Case(*[When(pk=pk, then=delta) for pk, delta in deltas.items()]), 0
+        )
+    )
+
+
+def assign_batch(cases, tech=None):
+    """Assign the unsaved Pending ``cases`` with one workload read and one counter update.
+
+    With ``tech`` every case goes to that tech; otherwise each case goes to
+    whichever tech is least busy at that point, counting the cases already
+    handed out in this batch. Returns False (assigning nothing) when there
+    is no active tech. Call inside ``transaction.atomic()``.
+    """
+    if tech is None:
+        techs = PortalUser.objects.filter(role='Lab', is_active=True).order_by('pending_workload', 'id')
+        heap = [(t.pending_workload, t.pk, t) for t in techs.select_for_update()]
+        if not heap:
+            return False
+        heapq.heapify(heap)
+        picks = []
+        for _ in cases:
+            load, pk, least_busy = heapq.heappop(heap)
+            picks.append(least_busy)
+            heapq.heappush(heap, (load + 1, pk, least_busy))
+    else:
+        picks = [tech] * len(cases)
+
+    now = timezone.now()
+    for case, picked in zip(cases, picks):
+        case.assigned_to = picked
+        case.assignment_status = 'Assigned'
+        case.assigned_date = now
+    add_workloads(Counter(case.assigned_to_id for case in cases if case.status == 'Pending'))
+    return True
+
+
+def release_case(case):
+    """Drop a case that just left Pending from its tech's counter."""
+    adjust_workload(case.assigned_to_id, -1)
+
+
+def workload_drift():
+    """Return ``[(tech, stored, actual)]`` for every lab tech whose counter is off."""
+    techs = PortalUser.objects.filter(role='Lab').annotate(
+        actual=Count('assigned_requests', filter=Q(assigned_requests__status='Pending'))
+    )
+    return [(t, t.pending_workload, t.actual) for t in techs if t.pending_workload != t.actual]
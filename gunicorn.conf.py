@@ -0,0 +1,20 @@
+# gunicorn.conf.py
+"""
+Gunicorn settings for both deployment modes, picked by SERVER_MODE:
+
+* wsgi (default) - sync workers running microbio_portal.wsgi
+* asgi           - uvicorn workers running microbio_portal.asgi; the list
+                   views, CSV exports and lab PDF download switch to their
+                   async variants (core/async_views.py)
+
+Worker count and bind address keep gunicorn's defaults (WEB_CONCURRENCY, PORT).
+"""
+import os
+
+SERVER_MODE = os.environ.get("SERVER_MODE", "wsgi").lower()
+
+if SERVER_MODE == "asgi":
+    wsgi_app = "microbio_portal.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "microbio_portal.wsgi:application"
@@ -0,0 +1,257 @@
+# loadtests/locustfile.py
+"""
+Load test of the doctor and lab-tech workflows, for sizing web dynos.
+
+Seed the target database, start the server, then run Locust from the
+repository root (settings in loadtests/locust.conf):
+
+    python manage.py seed_benchmark_data --requests 100000
+    gunicorn -c gunicorn.conf.py                     # or: python manage.py runserver
+    pip install -r loadtests/requirements.txt
+    locust --config loadtests/locust.conf            # headless, writes loadtests/results/*
+
+Each simulated user logs in through the login form as one of the seeded
+accounts (core/seeding.py: ``bench_doc_000``..., ``bench_tech_000``...,
+password ``benchmark``) and then loops over its role's tasks:
+
+* doctor - submit a sample with a slide image, browse and search reports,
+  download a report PDF, export CSV, poll the JSON reports API
+* tech   - poll the queue page and the queue API (with ``If-None-Match``),
+  open and complete a case, browse lab reports, download a PDF, export CSV
+
+Requests on URLs with a case id are grouped under one name
+(``/report/pdf/[id]/``) so the per-endpoint statistics stay readable.
+Locust reports throughput and latency percentiles per endpoint (web UI,
+``--csv``, ``--html``); ``--summary-json`` additionally writes the final
+numbers in one JSON file that can be kept next to ``benchmark_views``
+results.
+
+Environment: ``BENCH_DOCTORS`` / ``BENCH_TECHS`` (accounts to spread users
+over; defaults match ``seed_benchmark_data``), ``BENCH_PASSWORD``,
+``SLIDE_SIZE`` (uploaded image side in pixels, default 512).
+"""
+import itertools
+import json
+import os
+import random
+import struct
+import zlib
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
+
+from locust import HttpUser, between, events, task
+
+DOCTOR_PREFIX = 'bench_doc_'  # core/seeding.py
+TECH_PREFIX = 'bench_tech_'
+DOCTORS = int(os.environ.get('BENCH_DOCTORS', 20))
+TECHS = int(os.environ.get('BENCH_TECHS', 5))
+PASSWORD = os.environ.get('BENCH_PASSWORD', 'benchmark')
+SLIDE_SIZE = int(os.environ.get('SLIDE_SIZE', 512))
+
+CENTRES = ['North Eye Clinic', 'South Vision Centre', 'East Cornea Unit', 'West Retina Hospital', 'Central Eye Care']
+SEARCHES = ['north', 'cornea', 'BP00001', 'retina']
+REPORT_TEXT = ['Gram-positive cocci in clusters seen.', 'Fungal filaments seen on KOH-CFW.', 'No organisms seen.']
+
+_doctor_ids = itertools.count()
+_tech_ids = itertools.count()
+
+
+def noise_png(size, seed=0):
+    """A ``size`` x ``size`` RGB PNG of random noise (incompressible, like a real slide photo)."""
+    rng = random.Random(seed)
+    rows = b''.join(b'\x00' + rng.randbytes(size * 3) for _ in range(size))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+
+SLIDE = noise_png(SLIDE_SIZE)
+
+
+def send_secure_cookies_over_http():
+    """Let the HTTP client send ``Secure`` cookies to an ``http://`` host.
+
+    Production sets SESSION_COOKIE_SECURE / CSRF_COOKIE_SECURE, which would
+    otherwise log every user out when testing against http://localhost.
+    requests builds a fresh cookie jar (with a default policy) for every
+    request, so the policy class itself is patched; this only affects the
+    Locust process.
+    """
+    DefaultCookiePolicy.return_ok_secure = lambda policy, cookie, request: True
+
+
+class PortalUser(HttpUser):
+    abstract = True
+    wait_time = between(1, 5)
+    username = None
+
+    def on_start(self):
+        if urlparse(self.host).scheme == 'http':
+            send_secure_cookies_over_http()
+        self.client.get('/login/', name='login (form)')
+        with self.client.post('/login/', {'username': self.username, 'password': PASSWORD},
+                              headers=self.csrf(), name='login', catch_response=True) as response:
+            if '/login/' in response.url:
+                response.failure(f"login failed for {self.username}")
+        self.etags = {}
+
+    def csrf(self):
+        return {'X-CSRFToken': self.client.cookies.get('csrftoken', ''), 'Referer': self.host}
+
+    def post(self, url, data=None, files=None, name=None):
+        """POST a form; a success redirects, so a re-rendered form (200, no redirect) counts as a failure."""
+        with self.client.post(url, data=data or {}, files=files, headers=self.csrf(), name=name,
+                              catch_response=True) as response:
+            if response.ok and not response.history:
+                response.failure("form re-rendered (validation error)")
+            elif '/login/' in response.url:
+                response.failure("redirected to login")
+        return response
+
+    def api(self, url, name):
+        """GET a JSON list the way a polling client would: conditional on the last ETag."""
+        headers = {'Accept': 'application/json'}
+        if url in self.etags:
+            headers['If-None-Match'] = self.etags[url]
+        response = self.client.get(url, headers=headers, name=name)
+        if response.status_code == 200:
+            self.etags[url] = response.headers.get('ETag', '')
+            return response.json()['results']
+        return None
+
+    def case_ids(self, url, status=None):
+        response = self.client.get(url, headers={'Accept': 'application/json'}, name=url.split('?')[0] + ' (ids)')
+        if response.status_code != 200:
+            return []
+        return [row['id'] for row in response.json()['results'] if status is None or row.get('status') == status]
+
+    def download_pdf(self, ids):
+        if ids:
+            self.client.get(f'/report/pdf/{random.choice(ids)}/', name='/report/pdf/[id]/')
+
+
+class Doctor(PortalUser):
+    weight = 4
+
+    def on_start(self):
+        self.username = f'{DOCTOR_PREFIX}{next(_doctor_ids) % DOCTORS:03d}'
+        super().on_start()
+
+    @task(2)
+    def submit_sample(self):
+        self.client.get('/doctor/submit/', name='doctor_submit (form)')
+        self.post('/doctor/submit/', {
+            'patient_id': f'LT{random.randrange(10 ** 7):07d}',
+            'centre_name': random.choice(CENTRES),
+            'eye': random.choice(['OD', 'OS']),
+            'sample': 'Corneal Scraping',
+            'duration_value': random.randint(1, 30),
+            'duration_unit': 'Days',
+            'impression': random.choice(['Bacterial', 'Fungal']),
+            'stain': random.choice(['Grams', 'KOH-CFW']),
+        }, files={'image': ('slide.png', SLIDE, 'image/png')}, name='doctor_submit')
+
+    @task(4)
+    def browse_reports(self):
+        self.client.get('/doctor/reports/', name='doctor_reports')
+
+    @task(2)
+    def search_reports(self):
+        self.client.get('/doctor/reports/', params={'q': random.choice(SEARCHES)}, name='doctor_reports ?q=')
+
+    @task(3)
+    def poll_reports_api(self):
+        self.api('/api/reports/', 'api_reports')
+
+    @task(2)
+    def download_report(self):
+        self.download_pdf(self.case_ids('/api/reports/?fields=id,status&limit=50', 'Completed'))
+
+    @task(1)
+    def export_csv(self):
+        self.client.get('/doctor/export-csv/', name='export_doctor_csv')
+
+
+class LabTech(PortalUser):
+    weight = 1
+
+    def on_start(self):
+        self.username = f'{TECH_PREFIX}{next(_tech_ids) % TECHS:03d}'
+        super().on_start()
+
+    @task(6)
+    def poll_queue(self):
+        self.client.get('/lab/queue/', name='lab_queue')
+        self.api('/api/queue/', 'api_queue')
+
+    @task(3)
+    def complete_case(self):
+        ids = self.case_ids('/api/queue/?fields=id&limit=10')
+        if not ids:
+            return
+        url = f'/lab/process/{random.choice(ids)}/'
+        self.client.get(url, name='lab_process (form)')
+        self.post(url, {
+            'rc_code': f'RC{random.randint(100, 999)}',
+            'lab_id': f'LT{random.randrange(10 ** 6):06d}',
+            'quality': 'Good',
+            'sample_suitability': 'on',
+            'report_text': random.choice(REPORT_TEXT),
+            'auth_by': self.username,
+        }, name='lab_process')
+
+    @task(2)
+    def browse_reports(self):
+        self.client.get('/lab/reports/', name='lab_reports')
+
+    @task(1)
+    def search_reports(self):
+        self.client.get('/lab/reports/', params={'q': random.choice(SEARCHES)}, name='lab_reports ?q=')
+
+    @task(1)
+    def download_report(self):
+        self.download_pdf(self.case_ids('/api/reports/?fields=id&limit=50'))
+
+    @task(1)
+    def export_csv(self):
+        self.client.get('/lab/export-csv/', name='export_lab_csv')
+
+
+# ==========================================
+# JSON SUMMARY
+# ==========================================
+@events.init_command_line_parser.add_listener
+def _add_arguments(parser):
+    parser.add_argument('--summary-json', default='', help="Write per-endpoint throughput and percentiles here")
+
+
+@events.quitting.add_listener
+def _write_summary(environment, **kwargs):
+    path = environment.parsed_options and environment.parsed_options.summary_json
+    if not path:
+        return
+    stats = environment.stats
+    endpoints = []
+    for entry in sorted([*stats.entries.values(), stats.total], key=lambda e: (e.name == 'Aggregated', e.name)):
+        endpoints.append({
+            'name': entry.name,
+            'method': entry.method,
+            'requests': entry.num_requests,
+            'failures': entry.num_failures,
+            'rps': round(entry.total_rps, 2),
+            **{f'p{pct}_ms': entry.get_response_time_percentile(pct / 100) for pct in (50, 90, 95, 99)},
+            'avg_ms': round(entry.avg_response_time, 1),
+            'max_ms': entry.max_response_time,
+        })
+    with open(path, 'w') as fh:
+        json.dump({
+            'host': environment.host,
+            'users': environment.runner.user_count if environment.runner else None,
+            'duration_s': round(stats.last_request_timestamp - stats.start_time, 1)
+            if stats.last_request_timestamp else 0,
+            'endpoints': endpoints,
+        }, fh, indent=2)
+
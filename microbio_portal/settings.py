@@ -65,6 +65,10 @@ INSTALLED_APPS = [
 # Middleware
 # -------------------------------------------------
 MIDDLEWARE = [
+    # First, so its "total" covers every other middleware; inactive unless PERF_INSTRUMENTATION
+    "core.instrumentation.ServerTimingMiddleware",
+    # Development only: warns about N+1 query patterns (core/nplusone.py)
+    "core.nplusone.NPlusOneMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
 
@@ -76,6 +80,32 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Per-request timing (core/instrumentation.py): Server-Timing headers, one JSON
+# line per request on the "core.performance" logger and per-view percentiles
+# at /perf/stats/ (staff only).
+PERF_INSTRUMENTATION = os.environ.get("PERF_INSTRUMENTATION", "0") == "1"
+PERF_SAMPLE_SIZE = 1000  # most recent requests kept per view
+
+# N+1 detection (core/nplusone.py): a query shape repeated NPLUSONE_THRESHOLD
+# times in one request is logged with its stack on "core.nplusone", or raised
+# as RepeatedQueryError with NPLUSONE_RAISE.
+NPLUSONE_DETECTION = os.environ.get("NPLUSONE_DETECTION", "1" if DEBUG else "0") == "1"
+NPLUSONE_THRESHOLD = 5
+NPLUSONE_RAISE = os.environ.get("NPLUSONE_RAISE", "0") == "1"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "core.performance": {"handlers": ["console"], "level": "INFO", "propagate": False},
+        "core.nplusone": {"handlers": ["console"], "level": "WARNING", "propagate": False},
+        "core.auth": {"handlers": ["console"], "level": "WARNING", "propagate": False},
+    },
+}
+
 
 # -------------------------------------------------
 # URLs & Templates
@@ -92,12 +122,34 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "core.context_processors.case_counts",
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = "microbio_portal.wsgi.application"
+ASGI_APPLICATION = "microbio_portal.asgi.application"
+
+# "wsgi" (sync gunicorn workers) or "asgi" (uvicorn workers, see gunicorn.conf.py).
+# ASGI mode also switches the I/O-bound views to core/async_views.py.
+SERVER_MODE = os.environ.get("SERVER_MODE", "wsgi").lower()
+ASYNC_VIEWS = SERVER_MODE == "asgi"
+
+# Worker boot budget enforced by `manage.py startup_profile`; the listed
+# packages are only needed for PDF/image work and must be imported lazily.
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "1500"))
+STARTUP_FORBIDDEN_MODULES = ["reportlab", "PIL"]
+
+# Live updates (core/events.py): an open event stream re-checks the database
+# for events published by other worker processes this often (seconds); under
+# WSGI it is the browser's reconnect interval instead.
+EVENTS_POLL_INTERVAL = float(os.environ.get("EVENTS_POLL_INTERVAL", "15"))
+EVENTS_RETENTION_DAYS = 7
+# Open (ASGI) streams per worker process. Each holds a request thread and
+# takes a database connection only while it polls; beyond this limit new
+# streams return pending events and reconnect after EVENTS_POLL_INTERVAL.
+EVENTS_MAX_STREAMS = int(os.environ.get("EVENTS_MAX_STREAMS", "100"))
 
 
 # -------------------------------------------------
@@ -118,9 +170,23 @@ AUTH_USER_MODEL = "core.PortalUser"
 
 AUTHENTICATION_BACKENDS = [
     "core.auth.PINAuthBackend",
-    "django.contrib.auth.backends.ModelBackend",
+    "core.auth.ThrottledModelBackend",  # passwords (/login/, admin)
 ]
 
+# Sign-in throttling (core/throttle.py) for PINs and passwords alike, counted
+# in THROTTLE_CACHE (see Cache below).
+PIN_MAX_FAILURES = 5  # per username within PIN_FAILURE_WINDOW
+PIN_MAX_FAILURES_PER_IP = 20
+PIN_FAILURE_WINDOW = 900  # seconds
+PIN_LOCKOUT_SECONDS = 30  # first lockout; doubles with each further one within a day
+PIN_LOCKOUT_MAX_SECONDS = 3600
+# How clients reach the app, for the per-IP lock: 0 = directly (REMOTE_ADDR),
+# N = through N proxies that each append to X-Forwarded-For.
+# Unset = unknown, so no per-IP lock (behind a proxy every client shares its address).
+TRUSTED_PROXY_COUNT = (
+    int(os.environ["TRUSTED_PROXY_COUNT"]) if os.environ.get("TRUSTED_PROXY_COUNT") else None
+)
+
 
 # -------------------------------------------------
 # Password validation
@@ -155,6 +221,75 @@ STATICFILES_STORAGE = (
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Generated report PDFs are cached here (relative to the default storage)
+REPORT_PDF_CACHE_DIR = "pdf_cache"
+
+# -------------------------------------------------
+# Background jobs (core/jobs.py)
+# -------------------------------------------------
+# Slide derivatives, report PDF pre-rendering and queued CSV exports run in
+# `manage.py run_worker` (see Procfile). JOBS_INLINE=1 runs them in the web
+# process right after commit instead, for setups without a worker.
+JOBS_INLINE = os.environ.get("JOBS_INLINE", "0") == "1"
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF = 30  # seconds, doubled on every further attempt
+JOB_LOCK_TIMEOUT = 900  # a running job without a heartbeat for this long is assumed dead
+# Render processes for batch PDF exports (core/pdf_export.py); 0 = one per CPU
+PDF_EXPORT_PROCESSES = int(os.environ.get("PDF_EXPORT_PROCESSES", "0"))
+
+# -------------------------------------------------
+# Case archive (core/archive.py)
+# -------------------------------------------------
+# `manage.py archive_cases` (run nightly) moves completed cases older than
+# this, with reports and history, out of the working tables.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 365))
+ARCHIVE_BATCH_SIZE = 500  # cases per transaction
+
+# -------------------------------------------------
+# Case history (core/history.py)
+# -------------------------------------------------
+# `manage.py compact_history` (run monthly) keeps monthly partitions ready on
+# PostgreSQL and drops history entries older than this; 0 keeps everything.
+HISTORY_RETENTION_MONTHS = int(os.environ.get("HISTORY_RETENTION_MONTHS", 0))
+HISTORY_PARTITIONS_AHEAD = 3  # months
+
+# -------------------------------------------------
+# Cache (per-user case counters, core/counters.py; sign-in throttle, core/throttle.py)
+# -------------------------------------------------
+# Set REDIS_URL (needs the redis package) to share the cache between workers.
+# The local-memory fallback is per process, so other workers only see a
+# change once their copy expires - hence the short counter timeout.
+# Lockouts cannot work per process (N workers = N times the attempts), so
+# without Redis the throttle uses a table in the database instead
+# (`manage.py createcachetable`, run by build.sh).
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+    THROTTLE_CACHE = "default"
+    COUNTER_CACHE_TIMEOUT = 3600
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        "throttle": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "core_throttle_cache",
+        },
+    }
+    THROTTLE_CACHE = "throttle"
+    COUNTER_CACHE_TIMEOUT = 30
+
+# Protected media hand-off to the front-end proxy (leave unset to stream from Django).
+# nginx: MEDIA_ACCEL_REDIRECT_PREFIX=/protected-media/ with an `internal` location aliased to MEDIA_ROOT.
+# Apache/lighttpd: MEDIA_SENDFILE_HEADER=X-Sendfile
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get("MEDIA_ACCEL_REDIRECT_PREFIX")
+MEDIA_SENDFILE_HEADER = os.environ.get("MEDIA_SENDFILE_HEADER")
+
 
 # -------------------------------------------------
 # Crispy Forms
@@ -4,7 +4,9 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from django.contrib.auth.views import LoginView
 from core import views as core_views
+from core.forms_login import ThrottledAuthenticationForm
 
 # Ensure imports are minimal and correct for the project level
 # Only import standard Django components needed for project configuration
@@ -15,6 +17,8 @@ urlpatterns = [
     path('', include('core.urls')),
     # Explicitly ensure /accounts/logout/ uses our logout_view to avoid 405s
     path('accounts/logout/', core_views.logout_view, name='accounts_logout'),
+    # ... and /accounts/login/ (where LOGIN_URL resolves) says when sign-in is locked out
+    path('accounts/login/', LoginView.as_view(authentication_form=ThrottledAuthenticationForm)),
     # Built-in Auth URLs (kept under /accounts/ for defaults) - placed after core to avoid name collisions
     path('accounts/', include('django.contrib.auth.urls')),
 ]